@@ -6,6 +6,7 @@ from flask_cors import CORS
 from backend.config import Config
 from backend.routes import register_routes
 from backend.database import get_database
+from backend.services.janitor import get_file_janitor
 
 
 def setup_logging():
@@ -46,6 +47,9 @@ def create_app():
     db = get_database()
     logger.info("✅ 数据库初始化完成")
 
+    # 继续删除上次运行时未完成的文件（已删除记录的图片目录等）
+    get_file_janitor().resume()
+
     # 检查是否存在前端构建产物（Docker 环境）
     frontend_dist = Path(__file__).parent.parent / 'frontend' / 'dist'
     if frontend_dist.exists():
@@ -1,4 +1,5 @@
 import logging
+import os
 import yaml
 from pathlib import Path
 
@@ -12,6 +13,15 @@ class Config:
     CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:3000']
     OUTPUT_DIR = 'output'
 
+    # 文件发送交给前置代理：'x-accel-redirect'（nginx）或 'x-sendfile'（Apache / lighttpd），默认由 Flask 发送
+    FILE_OFFLOAD = os.environ.get('REDINK_FILE_OFFLOAD', '').lower()
+    # X-Accel-Redirect 模式下 history/ 目录在 nginx 中对应的 internal location
+    FILE_OFFLOAD_PREFIX = os.environ.get('REDINK_FILE_OFFLOAD_PREFIX', '/_history/')
+    # Flask 的 send_file 按此配置发送 X-Sendfile 头
+    USE_X_SENDFILE = FILE_OFFLOAD == 'x-sendfile'
+    # 缩略图内存缓存大小（MB，0 表示关闭）
+    THUMBNAIL_CACHE_MB = float(os.environ.get('REDINK_THUMBNAIL_CACHE_MB', 64))
+
     _image_providers_config = None
     _text_providers_config = None
 
@@ -145,6 +155,50 @@ class Config:
         logger.info(f"图片服务商配置验证通过: {provider_name} (type={provider_type})")
         return provider_config
 
+    @classmethod
+    def get_image_provider_pool(cls, primary: str = None) -> list:
+        """
+        获取图片服务商池（按优先级排序的服务商名称列表）
+
+        主服务商（默认为 active_provider）始终排在第一位，
+        其余按 provider_pool 中的顺序作为备用服务商。
+
+        Args:
+            primary: 主服务商名称，为 None 时使用 active_provider
+
+        Returns:
+            服务商名称列表
+        """
+        config = cls.load_image_providers_config()
+        if primary is None:
+            primary = cls.get_active_image_provider()
+
+        pool = [primary]
+        for name in config.get('provider_pool') or []:
+            if name and name not in pool:
+                pool.append(name)
+
+        logger.debug(f"图片服务商池: {pool}")
+        return pool
+
+    @classmethod
+    def get_image_hedge_config(cls) -> dict:
+        """获取图片生成对冲请求配置（image_providers.yaml 中的 hedge 字段）"""
+        config = cls.load_image_providers_config()
+        return dict(config.get('hedge') or {})
+
+    @classmethod
+    def get_image_circuit_breaker_config(cls) -> dict:
+        """获取图片服务商熔断配置（image_providers.yaml 中的 circuit_breaker 字段）"""
+        config = cls.load_image_providers_config()
+        return dict(config.get('circuit_breaker') or {})
+
+    @classmethod
+    def get_image_renditions_config(cls) -> dict:
+        """获取多尺寸副本配置（image_providers.yaml 中的 renditions 字段）"""
+        config = cls.load_image_providers_config()
+        return dict(config.get('renditions') or {})
+
     @classmethod
     def reload_config(cls):
         """重新加载配置（清除缓存）"""
@@ -51,7 +51,8 @@ class Database:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     record_id TEXT NOT NULL,
                     tone_text TEXT,
-                    created_at TEXT NOT NULL
+                    created_at TEXT NOT NULL,
+                    staged INTEGER NOT NULL DEFAULT 0
                 )
             """)
             
@@ -70,7 +71,8 @@ class Database:
                     metadata_title TEXT,
                     metadata_content TEXT,
                     metadata_tags TEXT,
-                    created_at TEXT NOT NULL
+                    created_at TEXT NOT NULL,
+                    staged INTEGER NOT NULL DEFAULT 0
                 )
             """)
             
@@ -109,7 +111,11 @@ class Database:
                     record_id TEXT NOT NULL,
                     filename TEXT NOT NULL,
                     thumbnail_filename TEXT,
-                    created_at TEXT NOT NULL
+                    created_at TEXT NOT NULL,
+                    renditions_json TEXT,
+                    file_size INTEGER,
+                    sha256 TEXT,
+                    path TEXT
                 )
             """)
             
@@ -123,8 +129,130 @@ class Database:
                 ON images(filename)
             """)
             
+            # 旧数据库补充新增的列
+            self._ensure_column(cursor, 'images', 'renditions_json', 'TEXT')
+            self._ensure_column(cursor, 'images', 'file_size', 'INTEGER')
+            self._ensure_column(cursor, 'images', 'sha256', 'TEXT')
+            self._ensure_column(cursor, 'images', 'path', 'TEXT')
+            self._ensure_column(cursor, 'tones', 'staged', 'INTEGER NOT NULL DEFAULT 0')
+            self._ensure_column(cursor, 'outlines', 'staged', 'INTEGER NOT NULL DEFAULT 0')
+            
+            # 流式生成中的大纲（staged = 1）在服务重启后不会再完成，删除残留的部分
+            cursor.execute("""
+                DELETE FROM pages WHERE outline_id IN (
+                    SELECT id FROM outlines
+                    WHERE staged = 1 OR tone_id IN (SELECT id FROM tones WHERE staged = 1)
+                )
+            """)
+            cursor.execute("""
+                DELETE FROM outlines
+                WHERE staged = 1 OR tone_id IN (SELECT id FROM tones WHERE staged = 1)
+            """)
+            cursor.execute("DELETE FROM tones WHERE staged = 1")
+            
+            # 一次性迁移：按文件实际位置填写 images.path（用 user_version 记录已完成）
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] < 1:
+                self._backfill_image_paths(cursor)
+                cursor.execute("PRAGMA user_version = 1")
+            
+            # 6. text_cache 表 - 文本生成结果缓存（按请求内容哈希）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS text_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL,
+                    hit_count INTEGER DEFAULT 0
+                )
+            """)
+            
+            # 创建索引
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_text_cache_last_accessed 
+                ON text_cache(last_accessed)
+            """)
+            
+            # 7. dir_index 表 - history 下各目录的文件列表（按目录修改时间判断是否需要重新读取）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS dir_index (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    stable INTEGER NOT NULL,
+                    entries_json TEXT NOT NULL
+                )
+            """)
+            
+            # 8. pending_deletes 表 - 等待后台删除的文件和目录（记录已删除，重启后继续删除）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS pending_deletes (
+                    path TEXT PRIMARY KEY,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            
             conn.commit()
     
+    @staticmethod
+    def _ensure_column(cursor, table: str, column: str, definition: str) -> bool:
+        """
+        表中缺少某列时添加该列（CREATE TABLE IF NOT EXISTS 不会修改已存在的表）
+        
+        Args:
+            cursor: 数据库游标
+            table: 表名
+            column: 列名
+            definition: 列定义（类型和默认值）
+            
+        Returns:
+            是否新添加了该列
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column in {row['name'] for row in cursor.fetchall()}:
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    
+    def _backfill_image_paths(self, cursor) -> None:
+        """
+        填写图片原图相对于 history 目录的路径
+
+        新版本的图片都保存在 history/{record_id}/ 下；
+        旧版迁移来的图片可能在 history/task_*/ 目录中，这里只遍历一次这些目录，
+        之后删除记录时直接使用 images.path，不再查找文件。
+
+        Args:
+            cursor: 数据库游标
+        """
+        history_dir = os.path.dirname(os.path.abspath(self.db_path))
+        cursor.execute("SELECT id, record_id, filename, path FROM images")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+
+        legacy_paths = {}
+        for item in sorted(os.listdir(history_dir)):
+            task_dir = os.path.join(history_dir, item)
+            if item.startswith('task_') and os.path.isdir(task_dir):
+                for filename in os.listdir(task_dir):
+                    legacy_paths.setdefault(filename, f"{item}/{filename}")
+
+        updates = []
+        for row in rows:
+            path = row['path']
+            if path and os.path.exists(os.path.join(history_dir, *path.split('/'))):
+                continue
+            default_path = f"{row['record_id']}/{row['filename']}"
+            if os.path.exists(os.path.join(history_dir, row['record_id'], row['filename'])):
+                new_path = default_path
+            else:
+                new_path = legacy_paths.get(row['filename'], default_path)
+            if new_path != path:
+                updates.append((new_path, row['id']))
+
+        cursor.executemany("UPDATE images SET path = ? WHERE id = ?", updates)
+
     @contextmanager
     def get_connection(self):
         """
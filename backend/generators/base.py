@@ -1,6 +1,7 @@
 """图片生成器抽象基类"""
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional
+from .errors import is_failover_error
 
 
 class ImageGeneratorBase(ABC):
@@ -17,6 +18,26 @@ class ImageGeneratorBase(ABC):
         self.api_key = config.get('api_key')
         self.base_url = config.get('base_url')
 
+        # 以下两项由服务商池设置：
+        # attempt_listener 在每次 HTTP 请求失败后调用（用于熔断统计），返回 False 时停止内部重试
+        self.attempt_listener: Optional[Callable[[Exception], bool]] = None
+        # 有备用服务商时，可故障转移的错误不在内部重试，直接交给服务商池切换
+        self.fail_fast = False
+
+    def should_retry(self, error: Exception) -> bool:
+        """
+        一次请求失败后调用（在重试装饰器内），通知服务商池并判断是否还应在内部重试
+
+        Args:
+            error: 本次请求的异常
+
+        Returns:
+            是否可以继续内部重试（最终是否重试仍由各装饰器按错误类型和次数决定）
+        """
+        if self.attempt_listener is not None and self.attempt_listener(error) is False:
+            return False
+        return not (self.fail_fast and is_failover_error(error))
+
     @abstractmethod
     def generate_image(
         self,
@@ -35,6 +56,43 @@ class ImageGeneratorBase(ABC):
         """
         pass
 
+    def supports_batch(self) -> bool:
+        """
+        是否支持在一次请求中生成多张图片
+
+        默认不支持；支持的生成器需同时重写 get_max_batch_size 和 generate_images_batch
+
+        Returns:
+            是否支持批量生成
+        """
+        return False
+
+    def get_max_batch_size(self) -> int:
+        """
+        获取单次请求最多生成的图片数量
+
+        Returns:
+            最大批量大小（不支持批量时为 1）
+        """
+        return 1
+
+    def generate_images_batch(
+        self,
+        prompts: List[str],
+        **kwargs
+    ) -> List[bytes]:
+        """
+        批量生成图片（默认逐个调用 generate_image）
+
+        Args:
+            prompts: 提示词列表
+            **kwargs: 其他参数（与 generate_image 相同，所有图片共用）
+
+        Returns:
+            与 prompts 顺序一致的图片二进制数据列表
+        """
+        return [self.generate_image(prompt=prompt, **kwargs) for prompt in prompts]
+
     @abstractmethod
     def validate_config(self) -> bool:
         """
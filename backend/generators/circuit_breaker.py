@@ -0,0 +1,254 @@
+"""图片服务商熔断器"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Any, Optional
+from .errors import (
+    CircuitOpenError, classify_error,
+    ERROR_AUTH, ERROR_NOT_FOUND, ERROR_RATE_LIMIT, ERROR_SERVER, ERROR_TIMEOUT, ERROR_NETWORK,
+)
+
+logger = logging.getLogger(__name__)
+
+# 熔断状态
+STATE_CLOSED = 'closed'        # 正常
+STATE_OPEN = 'open'            # 熔断中，请求直接失败
+STATE_HALF_OPEN = 'half_open'  # 探测成功，放行一次真实请求
+
+# 计入熔断的错误类别（内容相关的错误与服务商健康无关，不计入）
+BREAKER_ERRORS = {
+    ERROR_AUTH,
+    ERROR_NOT_FOUND,
+    ERROR_RATE_LIMIT,
+    ERROR_SERVER,
+    ERROR_TIMEOUT,
+    ERROR_NETWORK,
+}
+
+
+class CircuitBreaker:
+    """
+    单个服务商的熔断器
+
+    - closed：连续 failure_threshold 次可归类的失败后进入 open
+    - open：请求直接抛出 CircuitOpenError；经过 recovery_timeout 秒后执行一次健康探测
+    - half_open：探测成功后放行一次真实请求，成功则恢复 closed，失败则重新 open
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30,
+        probe: Optional[Callable[[], Any]] = None
+    ):
+        """
+        初始化熔断器
+
+        Args:
+            name: 服务商名称
+            failure_threshold: 触发熔断的连续失败次数
+            recovery_timeout: 熔断后多久开始探测（秒）
+            probe: 健康探测函数，抛出异常或返回 success=False 视为失败
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe = probe
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._trial_in_flight = False
+        self._last_error: Optional[str] = None
+        self._last_error_type: Optional[str] = None
+        self._total_opens = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allows_request(self) -> bool:
+        """
+        当前是否会放行请求（不改变状态）
+
+        open 状态下到达探测时间后返回 True，便于调用方按原有优先级尝试该服务商
+        """
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_HALF_OPEN:
+                return not self._trial_in_flight
+            return not self._probing and time.time() - self._opened_at >= self.recovery_timeout
+
+    def before_request(self):
+        """
+        请求前检查熔断状态
+
+        Raises:
+            CircuitOpenError: 熔断中，请求不应发出
+        """
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return
+            if self._state == STATE_HALF_OPEN:
+                # 半开状态只放行一次试探请求
+                if not self._trial_in_flight:
+                    self._trial_in_flight = True
+                    return
+                raise CircuitOpenError(self.name, self._retry_after())
+            # open
+            if self._probing or time.time() - self._opened_at < self.recovery_timeout:
+                raise CircuitOpenError(self.name, self._retry_after())
+            self._probing = True
+
+        # 在锁外执行探测，其他线程在探测期间直接失败
+        probe_ok = self._run_probe()
+
+        with self._lock:
+            self._probing = False
+            if probe_ok:
+                logger.info(f"🔌 图片服务商 [{self.name}] 健康探测成功，进入半开状态")
+                self._state = STATE_HALF_OPEN
+                self._trial_in_flight = True
+                return
+            self._opened_at = time.time()
+            raise CircuitOpenError(self.name, self._retry_after())
+
+    def record_success(self):
+        """记录一次成功请求"""
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                logger.info(f"✅ 图片服务商 [{self.name}] 已恢复，熔断器关闭")
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self, error: Exception):
+        """
+        记录一次失败请求（只统计与服务商健康相关的错误）
+
+        Args:
+            error: 异常对象
+        """
+        error_type = classify_error(error)
+        with self._lock:
+            # 半开状态下试探请求结束；若是内容类错误，下一个请求继续作为试探放行
+            self._trial_in_flight = False
+            if error_type not in BREAKER_ERRORS:
+                return
+
+            self._failures += 1
+            self._last_error = str(error)[:200]
+            self._last_error_type = error_type
+
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != STATE_OPEN:
+                    self._total_opens += 1
+                    logger.warning(
+                        f"⛔ 图片服务商 [{self.name}] 熔断 ({error_type}, 连续失败 {self._failures} 次)，"
+                        f"{self.recovery_timeout:.0f}秒后探测"
+                    )
+                self._state = STATE_OPEN
+                self._opened_at = time.time()
+
+    def reset(self):
+        """手动重置熔断器"""
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self._trial_in_flight = False
+
+    def _retry_after(self) -> float:
+        """距离下一次探测的秒数（需在锁内调用）"""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.time() - self._opened_at))
+
+    def _run_probe(self) -> bool:
+        """执行健康探测"""
+        if self.probe is None:
+            # 没有探测函数时直接放行一次试探请求
+            return True
+        try:
+            result = self.probe()
+            if isinstance(result, dict) and not result.get('success', False):
+                return False
+            return True
+        except Exception as e:
+            logger.warning(f"🔌 图片服务商 [{self.name}] 健康探测失败: {str(e)[:200]}")
+            return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取熔断器状态
+
+        Returns:
+            状态字典
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_after_seconds": round(self._retry_after(), 1) if self._state == STATE_OPEN else 0,
+                "last_error_type": self._last_error_type,
+                "last_error": self._last_error,
+                "total_opens": self._total_opens,
+            }
+
+
+# 全局熔断器注册表（按服务商名称，服务重建后状态保留）
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(
+    name: str,
+    failure_threshold: int = 5,
+    recovery_timeout: float = 30,
+    probe: Optional[Callable[[], Any]] = None
+) -> CircuitBreaker:
+    """
+    获取（或创建）指定服务商的熔断器
+
+    已存在的熔断器会更新阈值和探测函数，但保留当前状态
+
+    Args:
+        name: 服务商名称
+        failure_threshold: 触发熔断的连续失败次数
+        recovery_timeout: 熔断后多久开始探测（秒）
+        probe: 健康探测函数
+
+    Returns:
+        熔断器实例
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, failure_threshold, recovery_timeout, probe)
+            _breakers[name] = breaker
+        else:
+            breaker.failure_threshold = failure_threshold
+            breaker.recovery_timeout = recovery_timeout
+            breaker.probe = probe
+        return breaker
+
+
+def get_all_circuit_breakers() -> Dict[str, CircuitBreaker]:
+    """获取所有熔断器"""
+    with _breakers_lock:
+        return dict(_breakers)
+
+
+def reset_circuit_breakers():
+    """清空熔断器（服务商配置更新后调用）"""
+    with _breakers_lock:
+        _breakers.clear()
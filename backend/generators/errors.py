@@ -0,0 +1,107 @@
+"""图片生成错误分类"""
+import re
+from typing import Optional, Set
+
+# 错误类别
+ERROR_AUTH = 'auth'                # 401/403 认证或权限错误
+ERROR_NOT_FOUND = 'not_found'      # 404 模型或端点不存在
+ERROR_RATE_LIMIT = 'rate_limit'    # 429 速率限制/配额
+ERROR_SERVER = 'server'            # 5xx 服务端错误
+ERROR_TIMEOUT = 'timeout'          # 请求超时
+ERROR_NETWORK = 'network'          # 网络连接错误
+ERROR_SAFETY = 'safety'            # 内容安全过滤
+ERROR_INVALID = 'invalid'          # 请求参数错误
+ERROR_UNKNOWN = 'unknown'          # 无法识别
+ERROR_CIRCUIT_OPEN = 'circuit_open'  # 服务商已熔断，请求未发出
+
+# 与服务商相关的错误：换一个服务商有机会成功，允许故障转移
+FAILOVER_ERRORS: Set[str] = {
+    ERROR_AUTH,
+    ERROR_NOT_FOUND,
+    ERROR_RATE_LIMIT,
+    ERROR_SERVER,
+    ERROR_TIMEOUT,
+    ERROR_NETWORK,
+    ERROR_CIRCUIT_OPEN,
+}
+
+
+class CircuitOpenError(Exception):
+    """服务商处于熔断状态，请求被直接拒绝"""
+
+    def __init__(self, provider_name: str, retry_after: float = 0.0):
+        self.provider_name = provider_name
+        self.retry_after = retry_after
+        super().__init__(
+            f"图片服务商 [{provider_name}] 暂时不可用（已熔断），约 {retry_after:.0f} 秒后重新探测。\n"
+            "解决方案：\n"
+            "1. 稍后重试\n"
+            "2. 在系统设置中检查该服务商的 API Key 和 Base URL\n"
+            "3. 在 image_providers.yaml 的 provider_pool 中配置备用服务商"
+        )
+
+
+def classify_error(error: Exception) -> str:
+    """
+    根据异常信息判断错误类别
+
+    各生成器抛出的异常都是带中文说明的字符串，这里同时匹配状态码、
+    英文关键词和中文提示，保证原始错误和已解析的错误都能被识别。
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        错误类别（ERROR_* 常量之一）
+    """
+    if isinstance(error, CircuitOpenError):
+        return ERROR_CIRCUIT_OPEN
+
+    error_str = str(error).lower()
+
+    # 优先使用错误信息中明确的 HTTP 状态码（提示文案里可能同时出现多个关键词）
+    status_code = _extract_status_code(error_str)
+    if status_code is not None:
+        if status_code == 429:
+            return ERROR_RATE_LIMIT
+        if status_code in (401, 403):
+            return ERROR_AUTH
+        if status_code == 404:
+            return ERROR_NOT_FOUND
+        if status_code >= 500:
+            return ERROR_SERVER
+        if status_code >= 400:
+            return ERROR_INVALID
+
+    if any(k in error_str for k in ("safety", "blocked", "安全过滤")):
+        return ERROR_SAFETY
+    if any(k in error_str for k in ("429", "resource_exhausted", "rate limit", "速率限制", "配额")):
+        return ERROR_RATE_LIMIT
+    if any(k in error_str for k in ("401", "403", "unauthenticated", "permission_denied",
+                                     "forbidden", "认证失败", "权限被拒绝")):
+        return ERROR_AUTH
+    if any(k in error_str for k in ("404", "not_found", "模型不存在")):
+        return ERROR_NOT_FOUND
+    if any(k in error_str for k in ("timeout", "timed out", "超时")):
+        return ERROR_TIMEOUT
+    if any(k in error_str for k in ("500", "502", "503", "504", "internal", "unavailable",
+                                     "服务器错误", "服务器内部错误", "暂时不可用")):
+        return ERROR_SERVER
+    if any(k in error_str for k in ("connection", "network", "refused", "ssl", "网络连接")):
+        return ERROR_NETWORK
+    if any(k in error_str for k in ("400", "invalid_argument", "参数错误")):
+        return ERROR_INVALID
+    return ERROR_UNKNOWN
+
+
+def _extract_status_code(error_str: str) -> Optional[int]:
+    """从错误信息中提取 HTTP 状态码（如 "状态码: 503"、"HTTP 502"）"""
+    match = re.search(r'(?:状态码[:：]\s*|http\s+|api 服务器错误 \()(\d{3})', error_str)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def is_failover_error(error: Exception) -> bool:
+    """判断该错误是否应该切换到下一个服务商"""
+    return classify_error(error) in FAILOVER_ERRORS
@@ -0,0 +1,147 @@
+"""
+服务商文件句柄缓存
+
+部分服务商支持先上传文件、之后按文件 URI 引用（目前只有 google_genai 使用 Gemini Files API）。
+同一张参考图（如封面）在一次任务中会被每一页的请求重复使用，
+按「服务商 + 图片内容哈希」缓存上传后的句柄，过期前直接复用，不再重复上传。
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 句柄提前失效的余量（秒），避免请求发出时句柄刚好过期
+EXPIRY_MARGIN = 300
+
+
+class ProviderFileCache:
+    """上传文件句柄缓存（线程安全，同一文件并发请求只上传一次）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def get_or_upload(
+        self,
+        scope: str,
+        data: bytes,
+        upload: Callable[[bytes], Tuple[Any, float]]
+    ) -> Any:
+        """
+        获取文件句柄，没有缓存或已过期时上传
+
+        Args:
+            scope: 缓存范围（区分服务商和账号）
+            data: 文件数据
+            upload: 上传函数，返回 (句柄, 过期时间戳)
+
+        Returns:
+            文件句柄
+        """
+        key = (scope, hashlib.sha256(data).hexdigest())
+        self.purge_expired()
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry and entry[1] - EXPIRY_MARGIN > time.time():
+                return entry[0]
+
+            try:
+                handle, expires_at = upload(data)
+            except Exception:
+                # 上传失败时不保留该键的锁，避免失败的图片越积越多
+                with self._lock:
+                    if key not in self._entries:
+                        self._key_locks.pop(key, None)
+                raise
+            with self._lock:
+                self._entries[key] = (handle, expires_at)
+            logger.info(f"已上传参考图到服务商: scope={scope.split(':')[0]}, {len(data)} bytes")
+            return handle
+
+    def invalidate(self, scope: str, data: bytes) -> None:
+        """
+        使文件句柄失效（服务商报告文件不存在或已过期时调用）
+
+        Args:
+            scope: 缓存范围
+            data: 文件数据
+        """
+        key = (scope, hashlib.sha256(data).hexdigest())
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def purge_expired(self) -> int:
+        """
+        清理已过期的句柄
+
+        Returns:
+            清理的数量
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+        return len(expired)
+
+
+# 服务商报告文件不存在或已过期时的关键词（需同时提到文件）
+_FILE_KEYWORDS = ("file", "文件")
+_MISSING_KEYWORDS = (
+    "not found", "not_found", "not exist", "no such", "expired",
+    "invalid file", "不存在", "已过期", "已失效",
+)
+
+
+def is_file_reference_error(error: Any) -> bool:
+    """
+    判断错误是否表示引用的已上传文件不存在或已过期（只有这类错误才需要使缓存的句柄失效）
+
+    Args:
+        error: 异常对象或错误信息
+
+    Returns:
+        是否为文件不存在或过期错误
+    """
+    text = str(error).lower()
+    return any(k in text for k in _FILE_KEYWORDS) and any(k in text for k in _MISSING_KEYWORDS)
+
+
+def make_cache_scope(provider_type: str, base_url: Optional[str], api_key: Optional[str]) -> str:
+    """
+    构建缓存范围（API Key 只保留哈希，不出现在日志和内存键中）
+
+    Args:
+        provider_type: 服务商类型
+        base_url: API 地址
+        api_key: API Key
+
+    Returns:
+        缓存范围字符串
+    """
+    key_hash = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+    return f"{provider_type}:{base_url or ''}:{key_hash}"
+
+
+_file_cache_instance: Optional[ProviderFileCache] = None
+_file_cache_lock = threading.Lock()
+
+
+def get_provider_file_cache() -> ProviderFileCache:
+    """获取全局服务商文件句柄缓存"""
+    global _file_cache_instance
+    if _file_cache_instance is None:
+        with _file_cache_lock:
+            if _file_cache_instance is None:
+                _file_cache_instance = ProviderFileCache()
+    return _file_cache_instance
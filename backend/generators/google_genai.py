@@ -3,11 +3,13 @@ import logging
 import time
 import random
 import base64
+import io
 from functools import wraps
 from typing import Dict, Any, Optional
 from google import genai
 from google.genai import types
 from .base import ImageGeneratorBase
+from .file_cache import get_provider_file_cache, is_file_reference_error, make_cache_scope
 from ..utils.image_compressor import compress_image
 
 logger = logging.getLogger(__name__)
@@ -307,6 +309,11 @@ def retry_on_error(max_retries=5, base_delay=3):
                             should_retry = False
                             break
 
+                    # 服务商池中的生成器：记录本次失败，可故障转移的错误交给服务商池切换
+                    generator = args[0] if args and isinstance(args[0], ImageGeneratorBase) else None
+                    if generator is not None and not generator.should_retry(e):
+                        should_retry = False
+
                     if not should_retry:
                         # 直接抛出，不重试
                         raise Exception(parse_genai_error(e))
@@ -368,6 +375,10 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
 
         self.client = genai.Client(**client_kwargs)
 
+        # 参考图通过 Files API 上传一次后按 URI 引用（可选，部分代理地址不支持 Files API）
+        self.use_file_upload = bool(self.config.get('file_upload', False)) and not self.is_vertexai
+        self.file_cache_scope = make_cache_scope('google_genai', self.config.get('base_url'), self.api_key)
+
         # 默认安全设置
         self.safety_settings = [
             types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
@@ -410,6 +421,7 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
 
         # 构建 parts 列表
         parts = []
+        uploaded_ref = None
 
         # 如果有参考图，先添加参考图和说明
         if reference_image:
@@ -418,12 +430,8 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
             compressed_ref = compress_image(reference_image, max_size_kb=200)
             logger.debug(f"  参考图压缩后: {len(compressed_ref)} bytes")
             # 添加参考图
-            parts.append(types.Part(
-                inline_data=types.Blob(
-                    mime_type="image/png",
-                    data=compressed_ref
-                )
-            ))
+            reference_part, uploaded_ref = self._build_reference_part(compressed_ref)
+            parts.append(reference_part)
             # 添加带参考说明的提示词
             enhanced_prompt = f"""请参考上面这张图片的视觉风格（包括配色、排版风格、字体风格、装饰元素风格），生成一张风格一致的新图片。
 
@@ -466,18 +474,24 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
 
         image_data = None
         logger.debug(f"  开始调用 API: model={model}")
-        for chunk in self.client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
-                for part in chunk.candidates[0].content.parts:
-                    # 检查是否有图片数据
-                    if hasattr(part, 'inline_data') and part.inline_data:
-                        image_data = part.inline_data.data
-                        logger.debug(f"  收到图片数据: {len(image_data)} bytes")
-                        break
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=generate_content_config,
+            ):
+                if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
+                    for part in chunk.candidates[0].content.parts:
+                        # 检查是否有图片数据
+                        if hasattr(part, 'inline_data') and part.inline_data:
+                            image_data = part.inline_data.data
+                            logger.debug(f"  收到图片数据: {len(image_data)} bytes")
+                            break
+        except Exception as e:
+            # 已上传的文件已被删除或过期时，重试时重新上传（其他错误继续复用句柄）
+            if uploaded_ref and is_file_reference_error(e):
+                get_provider_file_cache().invalidate(self.file_cache_scope, uploaded_ref)
+            raise
 
         if not image_data:
             logger.error("API 返回为空，未生成图片")
@@ -499,6 +513,45 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
         logger.info(f"✅ Google GenAI 图片生成成功: {len(image_data)} bytes")
         return image_data
 
+    def _upload_file(self, data: bytes):
+        """通过 Files API 上传参考图，返回 (文件对象, 过期时间戳)"""
+        mime_type = "image/jpeg" if data.startswith(b"\xff\xd8") else "image/png"
+        uploaded = self.client.files.upload(
+            file=io.BytesIO(data),
+            config=types.UploadFileConfig(mime_type=mime_type)
+        )
+        if uploaded.expiration_time:
+            expires_at = uploaded.expiration_time.timestamp()
+        else:
+            # Files API 文件默认保留 48 小时
+            expires_at = time.time() + 47 * 3600
+        return uploaded, expires_at
+
+    def _build_reference_part(self, data: bytes):
+        """
+        构建参考图 Part
+
+        开启 file_upload 时优先使用已上传文件的 URI（同一张图只上传一次），
+        上传失败时回退为内联数据
+
+        Returns:
+            (Part, 使用了上传文件时为图片数据，否则为 None)
+        """
+        if self.use_file_upload:
+            try:
+                uploaded = get_provider_file_cache().get_or_upload(self.file_cache_scope, data, self._upload_file)
+                logger.debug(f"  使用已上传的参考图: {uploaded.name}")
+                return types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type), data
+            except Exception as e:
+                logger.warning(f"参考图上传失败，改为内联传输: {str(e)[:200]}")
+
+        return types.Part(
+            inline_data=types.Blob(
+                mime_type="image/png",
+                data=data
+            )
+        ), None
+
     def get_supported_aspect_ratios(self) -> list:
         """获取支持的宽高比"""
         return ["1:1", "3:4", "4:3", "16:9", "9:16"]
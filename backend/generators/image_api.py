@@ -21,6 +21,10 @@ def retry_on_error(max_retries: int = 3, base_delay: float = 2):
                     return func(*args, **kwargs)
                 except Exception as e:
                     last_error = e
+                    # 服务商池中的生成器：记录本次失败，可故障转移的错误交给服务商池切换
+                    generator = args[0] if args and isinstance(args[0], ImageGeneratorBase) else None
+                    if generator is not None and not generator.should_retry(e):
+                        raise
                     if attempt < max_retries - 1:
                         delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
                         logger.warning(f"请求失败，{delay:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries}): {str(e)[:100]}")
@@ -53,6 +57,10 @@ class ImageApiGenerator(ImageGeneratorBase):
             endpoint_type = '/' + endpoint_type
         self.endpoint_type = endpoint_type
 
+        # OpenAI 兼容的 chat completions 不接受图片的 file_id 引用，参考图始终内联传输
+        if config.get('file_upload'):
+            logger.warning("image_api 不支持 file_upload（chat completions 的图片只能使用 image_url），已忽略该配置")
+
         logger.info(f"ImageApiGenerator 初始化完成: base_url={self.base_url}, model={self.model}, endpoint={self.endpoint_type}")
 
     def validate_config(self) -> bool:
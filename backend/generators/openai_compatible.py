@@ -4,7 +4,7 @@ import time
 import random
 import base64
 from functools import wraps
-from typing import Dict, Any
+from typing import Dict, Any, List
 import requests
 from .base import ImageGeneratorBase
 
@@ -21,6 +21,10 @@ def retry_on_error(max_retries=5, base_delay=3):
                     return func(*args, **kwargs)
                 except Exception as e:
                     error_str = str(e)
+                    # 服务商池中的生成器：记录本次失败，可故障转移的错误交给服务商池切换
+                    generator = args[0] if args and isinstance(args[0], ImageGeneratorBase) else None
+                    if generator is not None and not generator.should_retry(e):
+                        raise
                     # 检查是否是速率限制错误
                     if "429" in error_str or "rate" in error_str.lower():
                         if attempt < max_retries - 1:
@@ -84,12 +88,87 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
             endpoint_type = '/v1/chat/completions'
         self.endpoint_type = endpoint_type
 
+        # 单次请求最多生成的图片数（images API 的 n 参数），1 表示不使用批量生成
+        self.batch_size = max(1, int(config.get('batch_size', 1) or 1))
+        # 服务商是否支持组图生成（一次请求按顺序返回多张对应不同描述的图片）。
+        # images API 的 n 参数本身只生成同一提示词的多个变体，不同页面只有开启该项后才合并请求
+        self.multi_prompt_batch = bool(config.get('multi_prompt_batch', False))
+
         logger.info(f"OpenAICompatibleGenerator 初始化完成: base_url={self.base_url}, model={self.default_model}, endpoint={self.endpoint_type}")
 
     def validate_config(self) -> bool:
         """验证配置"""
         return bool(self.api_key and self.base_url)
 
+    def _supports_n(self) -> bool:
+        """images API 端点且配置了 batch_size > 1 时，同一提示词可以用 n 参数一次生成多张"""
+        is_chat = 'chat' in self.endpoint_type or 'completions' in self.endpoint_type
+        return self.batch_size > 1 and not is_chat
+
+    def supports_batch(self) -> bool:
+        """不同提示词的批量生成需要服务商支持组图生成（multi_prompt_batch）"""
+        return self._supports_n() and self.multi_prompt_batch
+
+    def get_max_batch_size(self) -> int:
+        """获取单次请求最多生成的图片数量"""
+        return self.batch_size if self.supports_batch() else 1
+
+    def generate_images_batch(
+        self,
+        prompts: List[str],
+        size: str = "1024x1024",
+        model: str = None,
+        quality: str = "standard",
+        **kwargs
+    ) -> List[bytes]:
+        """
+        在一次 images API 请求中生成多张图片（n = len(prompts)）
+
+        提示词相同时直接使用 n 参数；提示词不同时，只有配置了 multi_prompt_batch
+        才合并为一个按顺序编号的组图提示词，否则逐张生成。
+        批量请求失败时不在这里重试，由调用方退回逐张生成。
+
+        Args:
+            prompts: 提示词列表（数量不超过 batch_size）
+            size: 图片尺寸
+            model: 模型名称
+            quality: 质量
+
+        Returns:
+            与 prompts 顺序一致的图片二进制数据列表
+        """
+        same_prompt = len(set(prompts)) == 1
+        if len(prompts) <= 1 or not self._supports_n() or not (same_prompt or self.multi_prompt_batch):
+            return super().generate_images_batch(prompts, size=size, model=model, quality=quality, **kwargs)
+
+        if len(prompts) > self.batch_size:
+            raise ValueError(f"批量生成数量 {len(prompts)} 超过 batch_size={self.batch_size}")
+
+        if model is None:
+            model = self.default_model
+
+        if same_prompt:
+            prompt = prompts[0]
+        else:
+            parts = [f"请按顺序生成 {len(prompts)} 张风格统一的图片，每张图片对应以下一段描述："]
+            for idx, item in enumerate(prompts, 1):
+                parts.append(f"【第 {idx} 张】\n{item}")
+            prompt = "\n\n".join(parts)
+
+        logger.info(f"OpenAI 兼容 API 批量生成图片: model={model}, size={size}, n={len(prompts)}")
+
+        items = self._request_images(prompt, size, model, quality, n=len(prompts))
+        if len(items) != len(prompts):
+            raise ValueError(
+                f"批量生成返回的图片数量不符：请求 {len(prompts)} 张，返回 {len(items)} 张。\n"
+                "可能原因：该服务商不支持 n > 1 或组图生成\n"
+                "建议：关闭该服务商的 multi_prompt_batch，或将 batch_size 设为 1"
+            )
+
+        images = [self._extract_image_bytes(item) for item in items]
+        logger.info(f"✅ OpenAI Images API 批量生成成功: {len(images)} 张")
+        return images
+
     @retry_on_error(max_retries=5, base_delay=3)
     def generate_image(
         self,
@@ -132,6 +211,25 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         quality: str
     ) -> bytes:
         """通过 images API 端点生成"""
+        items = self._request_images(prompt, size, model, quality, n=1)
+        img_bytes = self._extract_image_bytes(items[0])
+        logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_bytes)} bytes")
+        return img_bytes
+
+    def _request_images(
+        self,
+        prompt: str,
+        size: str,
+        model: str,
+        quality: str,
+        n: int = 1
+    ) -> list:
+        """
+        请求 images API 端点
+
+        Returns:
+            响应中的 data 列表（至少一项）
+        """
         # 确保端点以 / 开头
         endpoint = self.endpoint_type if self.endpoint_type.startswith('/') else '/' + self.endpoint_type
         url = f"{self.base_url}{endpoint}"
@@ -145,7 +243,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         payload = {
             "model": model,
             "prompt": prompt,
-            "n": 1,
+            "n": n,
             "size": size,
             "response_format": "b64_json"  # 使用base64格式更可靠
         }
@@ -154,7 +252,8 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         if quality and model.startswith('dall-e'):
             payload["quality"] = quality
 
-        response = requests.post(url, headers=headers, json=payload, timeout=180)
+        # 批量请求耗时更长，按图片数量放宽超时
+        response = requests.post(url, headers=headers, json=payload, timeout=180 * max(1, n))
 
         if response.status_code != 200:
             error_detail = response.text[:500]
@@ -188,20 +287,19 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
                 "建议：修改提示词或检查模型配置"
             )
 
-        image_data = result["data"][0]
+        return result["data"]
 
+    def _extract_image_bytes(self, image_data: Dict[str, Any]) -> bytes:
+        """从 images API 响应的单个 data 项中提取图片"""
         # 处理base64格式
         if "b64_json" in image_data:
-            img_bytes = base64.b64decode(image_data["b64_json"])
-            logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_bytes)} bytes")
-            return img_bytes
+            return base64.b64decode(image_data["b64_json"])
 
         # 处理URL格式
         elif "url" in image_data:
             logger.debug(f"  下载图片 URL...")
             img_response = requests.get(image_data["url"], timeout=60)
             if img_response.status_code == 200:
-                logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_response.content)} bytes")
                 return img_response.content
             else:
                 logger.error(f"下载图片失败: {img_response.status_code}")
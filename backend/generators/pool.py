@@ -0,0 +1,467 @@
+"""图片服务商池：按顺序故障转移，并支持对冲请求（hedged request）"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, List, Optional, Tuple
+from .base import ImageGeneratorBase
+from .factory import ImageGeneratorFactory
+from .errors import classify_error, is_failover_error
+from .circuit_breaker import CircuitBreaker, get_circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+
+def build_generate_kwargs(
+    provider_config: Dict[str, Any],
+    prompt: str,
+    reference_image: Optional[bytes] = None,
+    user_images: Optional[List[bytes]] = None
+) -> Dict[str, Any]:
+    """
+    根据服务商类型构建 generate_image 的调用参数
+
+    Args:
+        provider_config: 服务商配置
+        prompt: 提示词
+        reference_image: 参考图片（封面图）
+        user_images: 用户上传的参考图片列表
+
+    Returns:
+        generate_image 的关键字参数
+    """
+    provider_type = provider_config.get('type')
+
+    if provider_type == 'google_genai':
+        return {
+            "prompt": prompt,
+            "aspect_ratio": provider_config.get('default_aspect_ratio', '3:4'),
+            "temperature": provider_config.get('temperature', 1.0),
+            "model": provider_config.get('model', 'gemini-3-pro-image-preview'),
+            "reference_image": reference_image,
+        }
+
+    if provider_type == 'image_api':
+        # Image API 支持多张参考图片
+        reference_images = []
+        if reference_image:
+            reference_images.append(reference_image)
+        if user_images:
+            reference_images.extend(user_images)
+        return {
+            "prompt": prompt,
+            "aspect_ratio": provider_config.get('default_aspect_ratio', '3:4'),
+            "temperature": provider_config.get('temperature', 1.0),
+            "model": provider_config.get('model', 'nano-banana-2'),
+            "reference_images": reference_images if reference_images else None,
+        }
+
+    return {
+        "prompt": prompt,
+        "size": provider_config.get('default_size', '1024x1024'),
+        "model": provider_config.get('model'),
+        "quality": provider_config.get('quality', 'standard'),
+    }
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计（只记录成功请求）"""
+
+    def __init__(self, window: int = 100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        """记录一次耗时"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    @property
+    def count(self) -> int:
+        """样本数量"""
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        计算分位数
+
+        Args:
+            p: 分位（0-100）
+
+        Returns:
+            分位耗时（秒），没有样本时返回 None
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        # nearest-rank 分位数
+        rank = max(1, math.ceil(p / 100 * len(samples)))
+        return samples[min(rank, len(samples)) - 1]
+
+
+# 健康探测使用的连接测试类型：OpenAI 兼容的图片服务商只检查 /v1/models，不发起对话请求
+PROBE_TYPES = {
+    'openai': 'image_api',
+    'openai_compatible': 'image_api',
+}
+
+
+def _make_probe(provider_type: str, config: Dict[str, Any]):
+    """构建服务商健康探测函数（复用设置页面的连接测试逻辑）"""
+    def probe():
+        from backend.utils.provider_check import check_provider_connection
+        return check_provider_connection(PROBE_TYPES.get(provider_type, provider_type), config)
+    return probe
+
+
+class ProviderMember:
+    """服务商池成员"""
+
+    def __init__(
+        self,
+        name: str,
+        config: Dict[str, Any],
+        generator: ImageGeneratorBase,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.config = config
+        self.generator = generator
+        self.latency = LatencyTracker()
+        self.breaker = breaker or CircuitBreaker(name)
+        # 每次 HTTP 请求失败都计入熔断（而不是整轮内部重试结束后才计一次）
+        self.generator.attempt_listener = self._on_attempt_failure
+
+    def _on_attempt_failure(self, error: Exception) -> bool:
+        """记录一次失败的请求；熔断后不再继续内部重试"""
+        self.breaker.record_failure(error)
+        return self.breaker.allows_request()
+
+    @property
+    def type(self) -> str:
+        return self.config.get('type', self.name)
+
+    @property
+    def available(self) -> bool:
+        """熔断器当前是否放行请求"""
+        return self.breaker.allows_request()
+
+
+class ImageProviderPool:
+    """
+    图片服务商池
+
+    - 故障转移：按配置顺序调用，遇到与服务商相关的错误（限流、5xx、超时等）时切换到下一个
+    - 对冲请求：主服务商耗时超过其 p95 延迟后，向备用服务商并发发送同一请求，取先返回的结果
+    - 熔断：服务商连续失败后直接跳过，定期用连接测试探测恢复情况
+    """
+
+    # 对冲请求线程池大小（与 ImageService.MAX_CONCURRENT 对应，每页最多两路请求）
+    HEDGE_MAX_WORKERS = 30
+
+    # 对冲默认配置
+    DEFAULT_HEDGE_CONFIG = {
+        'enabled': False,
+        'percentile': 95,     # 超过该分位耗时后发起对冲
+        'min_samples': 10,    # 样本不足时使用已有样本的最大值（没有样本时使用 initial_delay）
+        'initial_delay': 30,  # 秒
+        'min_delay': 5,       # 对冲等待的下限（秒），避免过早发起
+    }
+
+    # 熔断默认配置
+    DEFAULT_BREAKER_CONFIG = {
+        'failure_threshold': 5,  # 连续失败多少次后熔断
+        'recovery_timeout': 30,  # 熔断后多久开始探测（秒）
+    }
+
+    def __init__(
+        self,
+        providers: List[Tuple[str, Dict[str, Any]]],
+        hedge_config: Optional[Dict[str, Any]] = None,
+        breaker_config: Optional[Dict[str, Any]] = None
+    ):
+        """
+        初始化服务商池
+
+        Args:
+            providers: 按优先级排列的 (服务商名称, 服务商配置) 列表，第一个为主服务商
+            hedge_config: 对冲请求配置
+            breaker_config: 熔断配置
+
+        Raises:
+            ValueError: 没有可用的服务商
+        """
+        if not providers:
+            raise ValueError("服务商池为空：至少需要配置一个图片生成服务商")
+
+        self.breaker_config = {**self.DEFAULT_BREAKER_CONFIG, **(breaker_config or {})}
+
+        self.members: List[ProviderMember] = []
+        for idx, (name, config) in enumerate(providers):
+            provider_type = config.get('type', name)
+            try:
+                generator = ImageGeneratorFactory.create(provider_type, config)
+            except Exception as e:
+                # 主服务商创建失败直接抛出，备用服务商只记录警告
+                if idx == 0:
+                    raise
+                logger.warning(f"⚠️ 备用图片服务商 [{name}] 初始化失败，已跳过: {e}")
+                continue
+            breaker = get_circuit_breaker(
+                name,
+                failure_threshold=int(self.breaker_config['failure_threshold']),
+                recovery_timeout=float(self.breaker_config['recovery_timeout']),
+                probe=_make_probe(provider_type, config)
+            )
+            self.members.append(ProviderMember(name, config, generator, breaker))
+
+        # 有备用服务商时，限流、5xx、超时等错误不在生成器内部重试，立即切换
+        for member in self.members:
+            member.generator.fail_fast = len(self.members) > 1
+
+        self.hedge_config = {**self.DEFAULT_HEDGE_CONFIG, **(hedge_config or {})}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._closed = False
+
+        logger.info(
+            f"图片服务商池初始化完成: {[m.name for m in self.members]}, "
+            f"hedge={'开启' if self.hedging_enabled else '关闭'}"
+        )
+
+    @property
+    def primary(self) -> ProviderMember:
+        """主服务商"""
+        return self.members[0]
+
+    @property
+    def hedging_enabled(self) -> bool:
+        """是否启用对冲请求（至少需要两个服务商）"""
+        return bool(self.hedge_config.get('enabled')) and len(self.members) > 1
+
+    @property
+    def batch_size(self) -> int:
+        """主服务商单次请求最多生成的图片数量（不支持批量时为 1）"""
+        generator = self.primary.generator
+        if not generator.supports_batch():
+            return 1
+        return max(1, generator.get_max_batch_size())
+
+    def generate_images_batch(
+        self,
+        prompts: List[str],
+        reference_image: Optional[bytes] = None,
+        user_images: Optional[List[bytes]] = None
+    ) -> List[bytes]:
+        """
+        通过主服务商批量生成图片（所有提示词共用同一张参考图）
+
+        批量请求只发往主服务商，不做故障转移和对冲；失败时由调用方退回逐张生成。
+
+        Args:
+            prompts: 提示词列表
+            reference_image: 参考图片（封面图）
+            user_images: 用户上传的参考图片列表
+
+        Returns:
+            与 prompts 顺序一致的图片二进制数据列表
+        """
+        member = self.primary
+        member.breaker.before_request()
+        kwargs = build_generate_kwargs(member.config, "", reference_image, user_images)
+        kwargs.pop("prompt")
+        start = time.time()
+        try:
+            images = member.generator.generate_images_batch(prompts, **kwargs)
+        except Exception as e:
+            # 批量请求不经过重试装饰器（单张时会退回 generate_image，已在其中计入）
+            if len(prompts) > 1:
+                member.breaker.record_failure(e)
+            raise
+        # 按单张平均耗时记录，避免批量请求抬高对冲阈值
+        member.latency.record((time.time() - start) / max(1, len(prompts)))
+        member.breaker.record_success()
+        return images
+
+    def generate_image(
+        self,
+        prompt: str,
+        reference_image: Optional[bytes] = None,
+        user_images: Optional[List[bytes]] = None
+    ) -> bytes:
+        """
+        通过服务商池生成图片
+
+        Args:
+            prompt: 提示词
+            reference_image: 参考图片（封面图）
+            user_images: 用户上传的参考图片列表
+
+        Returns:
+            图片二进制数据
+        """
+        # 熔断中的服务商排到最后；到达探测时间后恢复原有优先级，由首个请求触发健康探测
+        candidates = [m for m in self.members if m.available] + \
+                     [m for m in self.members if not m.available]
+        if self.hedging_enabled:
+            return self._generate_hedged(candidates, prompt, reference_image, user_images)
+        return self._generate_with_failover(candidates, prompt, reference_image, user_images)
+
+    def _call_member(
+        self,
+        member: ProviderMember,
+        prompt: str,
+        reference_image: Optional[bytes],
+        user_images: Optional[List[bytes]]
+    ) -> bytes:
+        """调用单个服务商，记录耗时并更新熔断状态（失败由生成器在每次请求后通过 attempt_listener 计入）"""
+        member.breaker.before_request()
+        kwargs = build_generate_kwargs(member.config, prompt, reference_image, user_images)
+        start = time.time()
+        image_data = member.generator.generate_image(**kwargs)
+        member.latency.record(time.time() - start)
+        member.breaker.record_success()
+        return image_data
+
+    def _generate_with_failover(
+        self,
+        candidates: List[ProviderMember],
+        prompt: str,
+        reference_image: Optional[bytes],
+        user_images: Optional[List[bytes]]
+    ) -> bytes:
+        """按顺序调用服务商，遇到可转移的错误时切换到下一个"""
+        last_error = None
+        for idx, member in enumerate(candidates):
+            try:
+                return self._call_member(member, prompt, reference_image, user_images)
+            except Exception as e:
+                last_error = e
+                if not is_failover_error(e) or idx == len(candidates) - 1:
+                    raise
+                logger.warning(
+                    f"⚠️ 图片服务商 [{member.name}] 失败 ({classify_error(e)})，"
+                    f"切换到 [{candidates[idx + 1].name}]: {str(e)[:100]}"
+                )
+        raise last_error
+
+    def _hedge_delay(self, member: ProviderMember) -> float:
+        """计算发起对冲前的等待时间"""
+        min_delay = float(self.hedge_config.get('min_delay', 5))
+        initial_delay = float(self.hedge_config.get('initial_delay', 30))
+        count = member.latency.count
+        if count == 0:
+            return max(min_delay, initial_delay)
+        if count < int(self.hedge_config.get('min_samples', 10)):
+            # 样本不足时分位数不可靠，使用已观测到的最大耗时（不超过 initial_delay）
+            return max(min_delay, min(initial_delay, member.latency.percentile(100)))
+        p = member.latency.percentile(float(self.hedge_config.get('percentile', 95)))
+        return max(min_delay, p)
+
+    def shutdown(self):
+        """关闭对冲线程池（服务商池被替换时调用，进行中的请求继续完成）"""
+        with self._executor_lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _get_executor(self) -> Optional[ThreadPoolExecutor]:
+        """获取对冲线程池（服务商池已关闭时返回 None）"""
+        with self._executor_lock:
+            if self._closed:
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.HEDGE_MAX_WORKERS,
+                    thread_name_prefix="image-hedge"
+                )
+            return self._executor
+
+    def _generate_hedged(
+        self,
+        candidates: List[ProviderMember],
+        prompt: str,
+        reference_image: Optional[bytes],
+        user_images: Optional[List[bytes]]
+    ) -> bytes:
+        """
+        对冲请求：主服务商超过分位耗时仍未返回时，并发请求下一个服务商
+
+        先成功的结果被采用；较慢的请求继续在后台完成，结果被丢弃。
+        """
+        if len(candidates) == 1:
+            return self._call_member(candidates[0], prompt, reference_image, user_images)
+
+        primary, backup = candidates[0], candidates[1]
+        executor = self._get_executor()
+        if executor is None:
+            # 服务商池已被替换，剩余请求不再对冲
+            return self._generate_with_failover(candidates, prompt, reference_image, user_images)
+        delay = self._hedge_delay(primary)
+
+        primary_future = executor.submit(self._call_member, primary, prompt, reference_image, user_images)
+        try:
+            return primary_future.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        except Exception as e:
+            if not is_failover_error(e):
+                raise
+            logger.warning(
+                f"⚠️ 图片服务商 [{primary.name}] 失败 ({classify_error(e)})，"
+                f"切换到 [{backup.name}]: {str(e)[:100]}"
+            )
+            return self._generate_hedged(candidates[1:], prompt, reference_image, user_images)
+
+        logger.info(f"⏱️ 图片服务商 [{primary.name}] 超过 {delay:.1f}s 未返回，对冲请求 [{backup.name}]")
+        try:
+            backup_future = executor.submit(self._call_member, backup, prompt, reference_image, user_images)
+        except RuntimeError:
+            # 等待期间服务商池已关闭
+            return primary_future.result()
+        pending = {primary_future: primary, backup_future: backup}
+        last_error = None
+
+        while pending:
+            done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                member = pending.pop(future)
+                try:
+                    image_data = future.result()
+                    logger.info(f"✅ 对冲请求由 [{member.name}] 胜出")
+                    return image_data
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"⚠️ 对冲请求 [{member.name}] 失败 ({classify_error(e)}): {str(e)[:100]}")
+
+        # 两路都失败：继续尝试剩余服务商
+        remaining = candidates[2:]
+        if remaining and is_failover_error(last_error):
+            return self._generate_hedged(remaining, prompt, reference_image, user_images)
+        raise last_error
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """
+        获取服务商池状态（不包含敏感信息）
+
+        Returns:
+            每个服务商的名称、类型、延迟统计和熔断状态
+        """
+        percentile = float(self.hedge_config.get('percentile', 95))
+        return [
+            {
+                "name": m.name,
+                "type": m.type,
+                "primary": idx == 0,
+                "samples": m.latency.count,
+                "p50_seconds": m.latency.percentile(50),
+                f"p{int(percentile)}_seconds": m.latency.percentile(percentile),
+                "circuit_breaker": m.breaker.snapshot(),
+            }
+            for idx, m in enumerate(self.members)
+        ]
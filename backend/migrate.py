@@ -163,7 +163,8 @@ def migrate_data():
                         image_id = ImageModel.create(
                             record_id=record_id,
                             filename=new_filename,
-                            thumbnail_filename=new_thumb_filename
+                            thumbnail_filename=new_thumb_filename,
+                            path=f"{task_id}/{new_filename}"
                         )
                         
                         # 更新 page 的 image_id
@@ -1,5 +1,6 @@
 """数据库模型和 ORM 操作封装"""
 import json
+import time
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from backend.database import get_database
@@ -194,13 +195,13 @@ class RecordModel:
             # 获取 page_count（通过 tone_id -> outline_id）
             # 先获取 tone_id
             tone = db.fetchone(
-                "SELECT id FROM tones WHERE record_id = ? ORDER BY created_at DESC LIMIT 1",
+                "SELECT id FROM tones WHERE record_id = ? AND staged = 0 ORDER BY created_at DESC LIMIT 1",
                 (record['id'],)
             )
             if tone:
                 # 再获取 outline_id
                 outline = db.fetchone(
-                    "SELECT id FROM outlines WHERE tone_id = ? ORDER BY created_at DESC LIMIT 1",
+                    "SELECT id FROM outlines WHERE tone_id = ? AND staged = 0 ORDER BY created_at DESC LIMIT 1",
                     (tone['id'],)
                 )
                 if outline:
@@ -269,13 +270,13 @@ class RecordModel:
             # 获取 page_count（通过 tone_id -> outline_id）
             # 先获取 tone_id
             tone = db.fetchone(
-                "SELECT id FROM tones WHERE record_id = ? ORDER BY created_at DESC LIMIT 1",
+                "SELECT id FROM tones WHERE record_id = ? AND staged = 0 ORDER BY created_at DESC LIMIT 1",
                 (record['id'],)
             )
             if tone:
                 # 再获取 outline_id
                 outline = db.fetchone(
-                    "SELECT id FROM outlines WHERE tone_id = ? ORDER BY created_at DESC LIMIT 1",
+                    "SELECT id FROM outlines WHERE tone_id = ? AND staged = 0 ORDER BY created_at DESC LIMIT 1",
                     (tone['id'],)
                 )
                 if outline:
@@ -308,13 +309,14 @@ class ToneModel:
     """基调模型"""
     
     @staticmethod
-    def create(record_id: str, tone_text: str) -> int:
+    def create(record_id: str, tone_text: str, staged: bool = False) -> int:
         """
         创建基调
         
         Args:
             record_id: 记录 ID
             tone_text: 基调文本
+            staged: 是否为流式生成中的基调（publish 之前查询不到）
             
         Returns:
             创建的基调 ID
@@ -325,9 +327,9 @@ class ToneModel:
         with db.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO tones (record_id, tone_text, created_at)
-                VALUES (?, ?, ?)
-            """, (record_id, tone_text, now))
+                INSERT INTO tones (record_id, tone_text, created_at, staged)
+                VALUES (?, ?, ?, ?)
+            """, (record_id, tone_text, now, int(staged)))
             conn.commit()
             return cursor.lastrowid
     
@@ -344,10 +346,25 @@ class ToneModel:
         """
         db = get_database()
         return db.fetchone(
-            "SELECT * FROM tones WHERE record_id = ? ORDER BY created_at DESC LIMIT 1",
+            "SELECT * FROM tones WHERE record_id = ? AND staged = 0 ORDER BY created_at DESC LIMIT 1",
             (record_id,)
         )
     
+    @staticmethod
+    def publish(tone_id: int) -> bool:
+        """
+        将流式生成中的基调设为正式基调
+        
+        Args:
+            tone_id: 基调 ID
+            
+        Returns:
+            是否成功
+        """
+        db = get_database()
+        db.execute("UPDATE tones SET staged = 0 WHERE id = ?", (tone_id,))
+        return True
+    
     @staticmethod
     def update(record_id: str, tone_text: str) -> bool:
         """
@@ -369,6 +386,23 @@ class ToneModel:
         ToneModel.create(record_id, tone_text)
         
         return True
+    
+    @staticmethod
+    def delete_by_id(tone_id: int) -> bool:
+        """
+        根据基调ID删除基调（同时删除关联的大纲和页面）
+        
+        Args:
+            tone_id: 基调 ID
+            
+        Returns:
+            是否成功
+        """
+        db = get_database()
+        for outline in db.fetchall("SELECT id FROM outlines WHERE tone_id = ?", (tone_id,)):
+            OutlineModel.delete_by_id(outline['id'])
+        db.execute("DELETE FROM tones WHERE id = ?", (tone_id,))
+        return True
 
 
 class OutlineModel:
@@ -380,7 +414,8 @@ class OutlineModel:
         raw_outline: str,
         metadata_title: Optional[str] = None,
         metadata_content: Optional[str] = None,
-        metadata_tags: Optional[str] = None
+        metadata_tags: Optional[str] = None,
+        staged: bool = False
     ) -> int:
         """
         创建大纲
@@ -391,6 +426,7 @@ class OutlineModel:
             metadata_title: 小红书标题
             metadata_content: 小红书正文
             metadata_tags: 小红书标签
+            staged: 是否为流式生成中的大纲（publish 之前查询不到）
             
         Returns:
             创建的大纲 ID
@@ -401,9 +437,9 @@ class OutlineModel:
         with db.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO outlines (tone_id, raw_outline, metadata_title, metadata_content, metadata_tags, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (tone_id, raw_outline, metadata_title, metadata_content, metadata_tags, now))
+                INSERT INTO outlines (tone_id, raw_outline, metadata_title, metadata_content, metadata_tags, created_at, staged)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (tone_id, raw_outline, metadata_title, metadata_content, metadata_tags, now, int(staged)))
             conn.commit()
             return cursor.lastrowid
     
@@ -420,10 +456,39 @@ class OutlineModel:
         """
         db = get_database()
         return db.fetchone(
-            "SELECT * FROM outlines WHERE tone_id = ? ORDER BY created_at DESC LIMIT 1",
+            "SELECT * FROM outlines WHERE tone_id = ? AND staged = 0 ORDER BY created_at DESC LIMIT 1",
             (tone_id,)
         )
     
+    @staticmethod
+    def publish(
+        outline_id: int,
+        raw_outline: str,
+        metadata_title: Optional[str] = None,
+        metadata_content: Optional[str] = None,
+        metadata_tags: Optional[str] = None
+    ) -> bool:
+        """
+        写入流式生成完成的大纲内容，并设为正式大纲
+        
+        Args:
+            outline_id: 大纲 ID
+            raw_outline: 原始大纲文本
+            metadata_title: 小红书标题
+            metadata_content: 小红书正文
+            metadata_tags: 小红书标签
+            
+        Returns:
+            是否成功
+        """
+        db = get_database()
+        db.execute("""
+            UPDATE outlines
+            SET raw_outline = ?, metadata_title = ?, metadata_content = ?, metadata_tags = ?, staged = 0
+            WHERE id = ?
+        """, (raw_outline, metadata_title, metadata_content, metadata_tags, outline_id))
+        return True
+    
     @staticmethod
     def update(
         tone_id: int,
@@ -504,6 +569,22 @@ class OutlineModel:
             db.execute("DELETE FROM outlines WHERE id = ?", (outline['id'],))
         
         return True
+    
+    @staticmethod
+    def delete_by_id(outline_id: int) -> bool:
+        """
+        根据大纲ID删除大纲（同时删除关联的页面）
+        
+        Args:
+            outline_id: 大纲 ID
+            
+        Returns:
+            是否成功
+        """
+        db = get_database()
+        PageModel.delete_by_outline(outline_id)
+        db.execute("DELETE FROM outlines WHERE id = ?", (outline_id,))
+        return True
 
 
 class PageModel:
@@ -563,6 +644,7 @@ class PageModel:
                 p.image_id,
                 i.filename as image_filename,
                 i.thumbnail_filename as image_thumbnail_filename,
+                i.renditions_json as image_renditions_json,
                 i.id as image_id_full
             FROM pages p
             LEFT JOIN images i ON p.image_id = i.id
@@ -587,7 +669,13 @@ class PageModel:
                 page_dict['image'] = {
                     'id': page['image_id_full'],
                     'filename': page['image_filename'],
-                    'thumbnail_filename': page['image_thumbnail_filename']
+                    'thumbnail_filename': page['image_thumbnail_filename'],
+                    # 已生成的副本宽度，前端据此拼接 srcset（?w=）
+                    'rendition_widths': sorted({
+                        r['width'] for r in ImageModel.parse_renditions(
+                            {'renditions_json': page['image_renditions_json']}
+                        )
+                    })
                 }
             else:
                 page_dict['image'] = None
@@ -813,7 +901,10 @@ class ImageModel:
     def create(
         record_id: str,
         filename: str,
-        thumbnail_filename: str
+        thumbnail_filename: str,
+        file_size: Optional[int] = None,
+        sha256: Optional[str] = None,
+        path: Optional[str] = None
     ) -> int:
         """
         创建图片记录
@@ -822,6 +913,9 @@ class ImageModel:
             record_id: 记录 ID
             filename: 文件名
             thumbnail_filename: 缩略图文件名
+            file_size: 原图字节数
+            sha256: 原图内容哈希（用作 ETag）
+            path: 原图相对于 history 目录的路径（默认为 {record_id}/{filename}）
             
         Returns:
             创建的图片 ID
@@ -832,9 +926,10 @@ class ImageModel:
         with db.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO images (record_id, filename, thumbnail_filename, created_at)
-                VALUES (?, ?, ?, ?)
-            """, (record_id, filename, thumbnail_filename, now))
+                INSERT INTO images (record_id, filename, thumbnail_filename, created_at, file_size, sha256, path)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (record_id, filename, thumbnail_filename, now, file_size, sha256,
+                  path or f"{record_id}/{filename}"))
             conn.commit()
             return cursor.lastrowid
     
@@ -886,4 +981,256 @@ class ImageModel:
         db = get_database()
         db.execute("DELETE FROM images WHERE record_id = ?", (record_id,))
         return True
+    
+    @staticmethod
+    def update_file_info(image_id: int, file_size: int, sha256: str) -> bool:
+        """
+        更新原图的字节数和内容哈希（迁移前的图片首次下载时补齐）
+        
+        Args:
+            image_id: 图片 ID
+            file_size: 原图字节数
+            sha256: 原图内容哈希
+            
+        Returns:
+            是否成功
+        """
+        db = get_database()
+        db.execute(
+            "UPDATE images SET file_size = ?, sha256 = ? WHERE id = ?",
+            (file_size, sha256, image_id)
+        )
+        return True
+    
+    @staticmethod
+    def update_renditions(image_id: int, renditions: List[Dict]) -> bool:
+        """
+        更新图片的多尺寸副本列表
+        
+        Args:
+            image_id: 图片 ID
+            renditions: 副本列表（width、height、format、filename、size）
+            
+        Returns:
+            是否成功
+        """
+        db = get_database()
+        db.execute(
+            "UPDATE images SET renditions_json = ? WHERE id = ?",
+            (json.dumps(renditions), image_id)
+        )
+        return True
+    
+    @staticmethod
+    def parse_renditions(image: Optional[Dict]) -> List[Dict]:
+        """
+        解析图片记录中的多尺寸副本列表
+        
+        Args:
+            image: 图片数据
+            
+        Returns:
+            副本列表（尚未生成时为空列表）
+        """
+        if not image or not image.get('renditions_json'):
+            return []
+        try:
+            return json.loads(image['renditions_json'])
+        except (TypeError, ValueError):
+            return []
+
 
+class TextCacheModel:
+    """文本生成缓存模型"""
+    
+    @staticmethod
+    def get(cache_key: str, ttl_seconds: float) -> Optional[str]:
+        """
+        读取未过期的缓存，并更新访问时间
+        
+        Args:
+            cache_key: 缓存键
+            ttl_seconds: 有效期（秒）
+            
+        Returns:
+            缓存的文本，不存在或已过期时返回 None
+        """
+        db = get_database()
+        now = time.time()
+        
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT response, created_at FROM text_cache WHERE cache_key = ?",
+                (cache_key,)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            if now - row['created_at'] > ttl_seconds:
+                cursor.execute("DELETE FROM text_cache WHERE cache_key = ?", (cache_key,))
+                conn.commit()
+                return None
+            
+            cursor.execute("""
+                UPDATE text_cache SET last_accessed = ?, hit_count = hit_count + 1
+                WHERE cache_key = ?
+            """, (now, cache_key))
+            conn.commit()
+            return row['response']
+    
+    @staticmethod
+    def put(cache_key: str, model: str, response: str, ttl_seconds: float, max_entries: int) -> None:
+        """
+        写入缓存，并清理过期和超出数量上限（按最近访问时间）的条目
+        
+        Args:
+            cache_key: 缓存键
+            model: 模型名称
+            response: 生成的文本
+            ttl_seconds: 有效期（秒）
+            max_entries: 最多保留的条目数
+        """
+        db = get_database()
+        now = time.time()
+        
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO text_cache (cache_key, model, response, created_at, last_accessed, hit_count)
+                VALUES (?, ?, ?, ?, ?, 0)
+            """, (cache_key, model, response, now, now))
+            cursor.execute("DELETE FROM text_cache WHERE created_at < ?", (now - ttl_seconds,))
+            cursor.execute("""
+                DELETE FROM text_cache WHERE cache_key IN (
+                    SELECT cache_key FROM text_cache
+                    ORDER BY last_accessed DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (max_entries,))
+            conn.commit()
+    
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """
+        获取缓存条目统计
+        
+        Returns:
+            条目数、总字符数、累计命中次数
+        """
+        db = get_database()
+        row = db.fetchone("""
+            SELECT COUNT(*) AS entries,
+                   COALESCE(SUM(LENGTH(response)), 0) AS total_chars,
+                   COALESCE(SUM(hit_count), 0) AS total_hits
+            FROM text_cache
+        """)
+        return row or {"entries": 0, "total_chars": 0, "total_hits": 0}
+    
+    @staticmethod
+    def clear() -> bool:
+        """
+        清空缓存
+        
+        Returns:
+            是否成功
+        """
+        db = get_database()
+        db.execute("DELETE FROM text_cache")
+        return True
+
+
+class DirIndexModel:
+    """目录文件列表索引模型"""
+    
+    @staticmethod
+    def get_all() -> List[Dict]:
+        """
+        获取所有目录的索引
+        
+        Returns:
+            索引列表（path、mtime_ns、stable、entries_json）
+        """
+        db = get_database()
+        return db.fetchall("SELECT * FROM dir_index")
+    
+    @staticmethod
+    def put_many(rows: List[tuple]) -> None:
+        """
+        批量写入目录索引（一个事务）
+        
+        Args:
+            rows: (path, mtime_ns, stable, entries_json) 列表
+        """
+        if not rows:
+            return
+        db = get_database()
+        with db.get_connection() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO dir_index (path, mtime_ns, stable, entries_json)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+    
+    @staticmethod
+    def delete_many(paths: List[str]) -> None:
+        """
+        批量删除目录索引
+        
+        Args:
+            paths: 目录路径列表
+        """
+        if not paths:
+            return
+        db = get_database()
+        with db.get_connection() as conn:
+            conn.executemany("DELETE FROM dir_index WHERE path = ?", [(path,) for path in paths])
+            conn.commit()
+
+
+class PendingDeleteModel:
+    """等待后台删除的路径模型"""
+    
+    @staticmethod
+    def get_all() -> List[Dict]:
+        """
+        获取所有等待删除的路径
+        
+        Returns:
+            列表（path、attempts）
+        """
+        db = get_database()
+        return db.fetchall("SELECT * FROM pending_deletes")
+    
+    @staticmethod
+    def put_many(rows: List[tuple]) -> None:
+        """
+        批量写入等待删除的路径（一个事务）
+        
+        Args:
+            rows: (path, attempts) 列表
+        """
+        if not rows:
+            return
+        db = get_database()
+        with db.get_connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pending_deletes (path, attempts) VALUES (?, ?)", rows
+            )
+            conn.commit()
+    
+    @staticmethod
+    def delete_many(paths: List[str]) -> None:
+        """
+        批量删除（已删除或放弃的路径）
+        
+        Args:
+            paths: 路径列表
+        """
+        if not paths:
+            return
+        db = get_database()
+        with db.get_connection() as conn:
+            conn.executemany("DELETE FROM pending_deletes WHERE path = ?", [(path,) for path in paths])
+            conn.commit()
@@ -6,6 +6,8 @@ API 路由模块
 - image_routes: 图片生成/获取相关 API
 - history_routes: 历史记录 CRUD API
 - config_routes: 配置管理 API
+- pipeline_routes: 一键生成（基调 → 大纲 → 图片）流水线 API
+- export_routes: 批量导出 API
 
 所有路由都注册到统一的 /api 前缀下
 """
@@ -26,6 +28,8 @@ def create_api_blueprint():
     from .image_routes import create_image_blueprint
     from .history_routes import create_history_blueprint
     from .config_routes import create_config_blueprint
+    from .pipeline_routes import create_pipeline_blueprint
+    from .export_routes import create_export_blueprint
 
     # 创建主 API 蓝图
     api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -35,6 +39,8 @@ def create_api_blueprint():
     api_bp.register_blueprint(create_image_blueprint())
     api_bp.register_blueprint(create_history_blueprint())
     api_bp.register_blueprint(create_config_blueprint())
+    api_bp.register_blueprint(create_pipeline_blueprint())
+    api_bp.register_blueprint(create_export_blueprint())
 
     return api_bp
 
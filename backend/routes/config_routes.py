@@ -5,12 +5,14 @@
 - 获取当前配置
 - 更新配置
 - 测试服务商连接
+- 文本生成缓存统计与清空
 """
 
 import logging
 from pathlib import Path
 import yaml
 from flask import Blueprint, request, jsonify
+from backend.utils.provider_check import check_provider_connection
 from .utils import prepare_providers_for_response
 
 logger = logging.getLogger(__name__)
@@ -58,7 +60,8 @@ def create_config_blueprint():
                         "active_provider": text_config.get('active_provider', ''),
                         "providers": prepare_providers_for_response(
                             text_config.get('providers', {})
-                        )
+                        ),
+                        "cache": text_config.get('cache', {})
                     },
                     "image_generation": {
                         "active_provider": image_config.get('active_provider', ''),
@@ -160,12 +163,64 @@ def create_config_blueprint():
                 return jsonify({"success": False, "error": "API Key 未配置"}), 400
 
             # 根据类型执行测试
-            result = _test_provider_connection(provider_type, config)
+            result = check_provider_connection(provider_type, config)
             return jsonify(result), 200 if result['success'] else 400
 
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 400
 
+    # ==================== 文本缓存 ====================
+
+    @config_bp.route('/config/text-cache', methods=['GET'])
+    def get_text_cache_stats():
+        """
+        获取文本生成缓存统计
+
+        返回：
+        - success: 是否成功
+        - enabled: 是否开启缓存
+        - stats: 命中/未命中/跳过次数、命中率（进程启动以来）和条目统计
+        """
+        try:
+            from backend.utils.text_cache import get_text_cache_stats as collect_stats
+
+            text_config = _read_config(TEXT_CONFIG_PATH, {})
+            return jsonify({
+                "success": True,
+                "enabled": bool((text_config.get('cache') or {}).get('enabled')),
+                "stats": collect_stats()
+            })
+
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "error": f"获取缓存统计失败: {str(e)}"
+            }), 500
+
+    @config_bp.route('/config/text-cache', methods=['DELETE'])
+    def clear_text_cache():
+        """
+        清空文本生成缓存
+
+        返回：
+        - success: 是否成功
+        - message: 结果消息
+        """
+        try:
+            from backend.utils.text_cache import clear_text_cache as clear_cache
+
+            clear_cache()
+            return jsonify({
+                "success": True,
+                "message": "文本缓存已清空"
+            })
+
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "error": f"清空缓存失败: {str(e)}"
+            }), 500
+
     return config_bp
 
 
@@ -200,6 +255,10 @@ def _update_provider_config(config_path: Path, new_data: dict):
     if 'active_provider' in new_data:
         existing_config['active_provider'] = new_data['active_provider']
 
+    # 更新结果缓存配置（仅文本生成配置使用）
+    if 'cache' in new_data:
+        existing_config['cache'] = new_data['cache']
+
     # 更新 providers
     if 'providers' in new_data:
         existing_providers = existing_config.get('providers', {})
@@ -237,6 +296,12 @@ def _clear_config_cache():
     except Exception:
         pass
 
+    try:
+        from backend.generators.circuit_breaker import reset_circuit_breakers
+        reset_circuit_breakers()
+    except Exception:
+        pass
+
 
 def _load_provider_config(provider_type: str, provider_name: str, config: dict) -> dict:
     """
@@ -271,158 +336,3 @@ def _load_provider_config(provider_type: str, provider_name: str, config: dict)
                     config['model'] = saved.get('model')
 
     return config
-
-
-def _test_provider_connection(provider_type: str, config: dict) -> dict:
-    """
-    测试服务商连接
-
-    Args:
-        provider_type: 服务商类型
-        config: 服务商配置
-
-    Returns:
-        dict: 测试结果
-    """
-    test_prompt = "请回复'你好，红墨'"
-
-    if provider_type == 'google_genai':
-        return _test_google_genai(config)
-
-    elif provider_type == 'google_gemini':
-        return _test_google_gemini(config, test_prompt)
-
-    elif provider_type == 'openai_compatible':
-        return _test_openai_compatible(config, test_prompt)
-
-    elif provider_type == 'image_api':
-        return _test_image_api(config)
-
-    else:
-        raise ValueError(f"不支持的类型: {provider_type}")
-
-
-def _test_google_genai(config: dict) -> dict:
-    """测试 Google GenAI 图片生成服务"""
-    from google import genai
-
-    if config.get('base_url'):
-        client = genai.Client(
-            api_key=config['api_key'],
-            http_options={
-                'base_url': config['base_url'],
-                'api_version': 'v1beta'
-            },
-            vertexai=False
-        )
-        # 测试列出模型
-        try:
-            list(client.models.list())
-            return {
-                "success": True,
-                "message": "连接成功！仅代表连接稳定，不确定是否可以稳定支持图片生成"
-            }
-        except Exception as e:
-            raise Exception(f"连接测试失败: {str(e)}")
-    else:
-        return {
-            "success": True,
-            "message": "Vertex AI 无法通过 API Key 测试连接（需要 OAuth2 认证）。请在实际生成图片时验证配置是否正确。"
-        }
-
-
-def _test_google_gemini(config: dict, test_prompt: str) -> dict:
-    """测试 Google Gemini 文本生成服务"""
-    from google import genai
-
-    if config.get('base_url'):
-        client = genai.Client(
-            api_key=config['api_key'],
-            http_options={
-                'base_url': config['base_url'],
-                'api_version': 'v1beta'
-            },
-            vertexai=False
-        )
-    else:
-        client = genai.Client(
-            api_key=config['api_key'],
-            vertexai=True
-        )
-
-    model = config.get('model') or 'gemini-2.0-flash-exp'
-    response = client.models.generate_content(
-        model=model,
-        contents=test_prompt
-    )
-    result_text = response.text if hasattr(response, 'text') else str(response)
-
-    return _check_response(result_text)
-
-
-def _test_openai_compatible(config: dict, test_prompt: str) -> dict:
-    """测试 OpenAI 兼容接口"""
-    import requests
-
-    base_url = config['base_url'].rstrip('/').rstrip('/v1') if config.get('base_url') else 'https://api.openai.com'
-    url = f"{base_url}/v1/chat/completions"
-
-    payload = {
-        "model": config.get('model') or 'gpt-3.5-turbo',
-        "messages": [{"role": "user", "content": test_prompt}],
-        "max_tokens": 50
-    }
-
-    response = requests.post(
-        url,
-        headers={
-            'Authorization': f"Bearer {config['api_key']}",
-            'Content-Type': 'application/json'
-        },
-        json=payload,
-        timeout=30
-    )
-
-    if response.status_code != 200:
-        raise Exception(f"HTTP {response.status_code}: {response.text[:200]}")
-
-    result = response.json()
-    result_text = result['choices'][0]['message']['content']
-
-    return _check_response(result_text)
-
-
-def _test_image_api(config: dict) -> dict:
-    """测试图片 API 连接"""
-    import requests
-
-    base_url = config['base_url'].rstrip('/').rstrip('/v1') if config.get('base_url') else 'https://api.openai.com'
-    url = f"{base_url}/v1/models"
-
-    response = requests.get(
-        url,
-        headers={'Authorization': f"Bearer {config['api_key']}"},
-        timeout=30
-    )
-
-    if response.status_code == 200:
-        return {
-            "success": True,
-            "message": "连接成功！仅代表连接稳定，不确定是否可以稳定支持图片生成"
-        }
-    else:
-        raise Exception(f"HTTP {response.status_code}: {response.text[:200]}")
-
-
-def _check_response(result_text: str) -> dict:
-    """检查响应是否符合预期"""
-    if "你好" in result_text and "红墨" in result_text:
-        return {
-            "success": True,
-            "message": f"连接成功！响应: {result_text[:100]}"
-        }
-    else:
-        return {
-            "success": True,
-            "message": f"连接成功，但响应内容不符合预期: {result_text[:100]}"
-        }
@@ -0,0 +1,160 @@
+"""
+批量导出相关 API 路由
+
+包含功能：
+- 创建批量导出任务（后台打包多条记录的图片和清单）
+- 查询任务进度 / 列出任务
+- 恢复中断或失败的任务
+- 下载导出结果
+- 删除任务
+"""
+
+import logging
+import time
+from flask import Blueprint, request, jsonify
+from backend.services.export import ExportJobNotFoundError
+from .utils import log_request, log_error, send_history_file
+
+logger = logging.getLogger(__name__)
+
+
+def create_export_blueprint():
+    """创建批量导出路由蓝图（工厂函数，支持多次调用）"""
+    export_bp = Blueprint('export', __name__)
+
+    @export_bp.route('/exports', methods=['POST'])
+    def create_export():
+        """
+        创建批量导出任务
+
+        请求体：
+        - record_ids: 要导出的记录 ID 列表
+        - status: 不传 record_ids 时，导出该状态的全部记录（如 completed；为空则导出全部记录）
+
+        返回：
+        - success: 是否成功
+        - job: 任务信息（id、status、total、completed、progress 等）
+        """
+        try:
+            data = request.get_json() or {}
+            record_ids = data.get('record_ids')
+            log_request('/exports', {'record_ids': len(record_ids or []), 'status': data.get('status')})
+
+            if not record_ids:
+                from backend.services.history import get_history_service
+                result = get_history_service().list_records(page=1, page_size=100000, status=data.get('status'))
+                record_ids = [r['id'] for r in result['records']]
+
+            if not record_ids:
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：没有可导出的记录。\n解决方案：传入 record_ids，或确认 status 对应的记录存在"
+                }), 400
+
+            from backend.services.export import get_export_service
+            job = get_export_service().create_job(record_ids)
+            return jsonify({"success": True, "job": job}), 202
+
+        except Exception as e:
+            log_error('/exports', e)
+            return jsonify({
+                "success": False,
+                "error": f"创建导出任务失败。\n错误详情: {str(e)}"
+            }), 500
+
+    @export_bp.route('/exports', methods=['GET'])
+    def list_exports():
+        """
+        列出所有导出任务
+
+        返回：
+        - success: 是否成功
+        - jobs: 任务信息列表（按创建时间倒序）
+        """
+        from backend.services.export import get_export_service
+        return jsonify({"success": True, "jobs": get_export_service().list_jobs()})
+
+    @export_bp.route('/exports/<job_id>', methods=['GET'])
+    def get_export(job_id):
+        """
+        查询导出任务进度
+
+        路径参数：
+        - job_id: 任务 ID
+
+        返回：
+        - success: 是否成功
+        - job: 任务信息（status 为 pending / running / completed / failed / interrupted）
+        """
+        from backend.services.export import get_export_service
+        try:
+            return jsonify({"success": True, "job": get_export_service().get_job(job_id)})
+        except ExportJobNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 404
+
+    @export_bp.route('/exports/<job_id>/resume', methods=['POST'])
+    def resume_export(job_id):
+        """
+        从最后完成的记录继续打包中断（服务重启）或失败的任务
+
+        路径参数：
+        - job_id: 任务 ID
+
+        返回：
+        - success: 是否成功
+        - job: 任务信息
+        """
+        from backend.services.export import get_export_service
+        try:
+            return jsonify({"success": True, "job": get_export_service().resume_job(job_id)}), 202
+        except ExportJobNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 409
+
+    @export_bp.route('/exports/<job_id>/download', methods=['GET', 'HEAD'])
+    def download_export(job_id):
+        """
+        下载导出结果（支持 Range 断点续传）
+
+        路径参数：
+        - job_id: 任务 ID
+
+        返回：
+        - 成功：ZIP 文件（每条记录一个目录，根目录包含 manifest.json / manifest.csv）
+        - 失败：JSON 错误信息
+        """
+        from backend.services.export import get_export_service
+        try:
+            path = get_export_service().get_archive_path(job_id)
+        except ExportJobNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 409
+
+        return send_history_file(
+            path,
+            mimetype='application/zip',
+            as_attachment=True,
+            download_name=f"redink_export_{time.strftime('%Y%m%d')}_{job_id[:8]}.zip"
+        )
+
+    @export_bp.route('/exports/<job_id>', methods=['DELETE'])
+    def delete_export(job_id):
+        """
+        删除导出任务及其文件（进行中的任务在当前记录打包完成后停止）
+
+        路径参数：
+        - job_id: 任务 ID
+
+        返回：
+        - success: 是否成功
+        """
+        from backend.services.export import get_export_service
+        try:
+            get_export_service().delete_job(job_id)
+            return jsonify({"success": True})
+        except ExportJobNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 404
+
+    return export_bp
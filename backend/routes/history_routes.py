@@ -7,17 +7,23 @@
 - 获取统计信息
 - 扫描和同步任务图片
 - 打包下载图片
+- 缩略图拼图
 """
 
 import os
-import io
-import zipfile
+import base64
 import logging
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, Response
+from backend.services.download_bundles import collect_zip_entries, get_download_bundle_service
 from backend.services.history import get_history_service
+from backend.utils.zip_stream import iter_zip, zip_size
+from .utils import attachment_disposition, log_error, send_history_file
 
 logger = logging.getLogger(__name__)
 
+# 拼图内容由键决定、不会改变，浏览器缓存一年
+SPRITE_CACHE_MAX_AGE = 31536000
+
 
 def create_history_blueprint():
     """创建历史记录路由蓝图（工厂函数，支持多次调用）"""
@@ -110,6 +116,93 @@ def create_history_blueprint():
                 "error": f"获取历史记录列表失败。\n错误详情: {error_msg}"
             }), 500
 
+    @history_bp.route('/history/thumbnails', methods=['GET'])
+    def get_history_thumbnails():
+        """
+        获取一页历史记录及其封面缩略图拼图
+
+        查询参数：
+        - page: 页码（默认 1）
+        - page_size: 每页数量（默认 20）
+        - status: 状态过滤（可选）
+        - inline: 是否直接在响应中返回拼图（base64 data URI，省去一次图片请求）
+
+        返回：
+        - success: 是否成功
+        - records / total / total_pages 等：与 GET /history 相同
+        - sprite: 拼图信息（url、width、height、cell_width、cell_height，inline=true 时还有 data_uri），
+          没有任何封面时为 null
+        - cells: record_id -> 该记录封面在拼图中的位置（x、y、width、height）
+        """
+        try:
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('page_size', 20))
+            status = request.args.get('status')
+            inline = request.args.get('inline', 'false').lower() == 'true'
+
+            history_service = get_history_service()
+            result = history_service.list_records(page, page_size, status)
+
+            from backend.services.sprites import get_thumbnail_sprite_service
+            sprite_service = get_thumbnail_sprite_service()
+            info = sprite_service.get_or_create(result['records'])
+
+            sprite = None
+            if info['cells']:
+                sprite = {
+                    'url': f"/api/history/thumbnails/{info['key']}.jpg",
+                    'width': info['width'],
+                    'height': info['height'],
+                    'cell_width': info['cell_width'],
+                    'cell_height': info['cell_height'],
+                }
+                if inline:
+                    with open(sprite_service.get_path(info['key']), 'rb') as f:
+                        sprite['data_uri'] = 'data:image/jpeg;base64,' + base64.b64encode(f.read()).decode('ascii')
+
+            return jsonify({
+                "success": True,
+                **result,
+                "sprite": sprite,
+                "cells": info['cells']
+            }), 200
+
+        except Exception as e:
+            log_error('/history/thumbnails', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"获取缩略图拼图失败。\n错误详情: {error_msg}"
+            }), 500
+
+    @history_bp.route('/history/thumbnails/<key>.jpg', methods=['GET'])
+    def get_history_thumbnail_sprite(key):
+        """
+        获取缩略图拼图（内容由键决定，不会改变，可长期缓存）
+
+        路径参数：
+        - key: 拼图键（见 GET /history/thumbnails 返回的 sprite.url）
+
+        返回：
+        - 成功：JPEG 图片
+        - 失败：JSON 错误信息
+        """
+        from backend.services.sprites import get_thumbnail_sprite_service
+        try:
+            path = get_thumbnail_sprite_service().get_path(key)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        if not os.path.exists(path):
+            return jsonify({
+                "success": False,
+                "error": f"拼图不存在或已过期：{key}\n解决方案：重新请求 /api/history/thumbnails 获取新的拼图地址"
+            }), 404
+
+        response = send_history_file(path, mimetype='image/jpeg', max_age=SPRITE_CACHE_MAX_AGE)
+        response.cache_control.immutable = True
+        return response
+
     @history_bp.route('/history/<record_id>', methods=['GET'])
     def get_history(record_id):
         """
@@ -274,14 +367,17 @@ def create_history_blueprint():
         - success: 是否成功
         - total: 总记录数
         - by_status: 按状态分组的统计
+        - reclaim: 已删除记录的文件回收情况（pending、retrying、removed、reclaimed_bytes、failed）
         """
         try:
+            from backend.services.janitor import get_file_janitor
             history_service = get_history_service()
             stats = history_service.get_statistics()
 
             return jsonify({
                 "success": True,
-                **stats
+                **stats,
+                "reclaim": get_file_janitor().stats()
             }), 200
 
         except Exception as e:
@@ -388,20 +484,31 @@ def create_history_blueprint():
             outline = record.get('outline', {})
             pages = outline.get('pages', [])
             
-            # 创建内存中的 ZIP 文件
-            zip_buffer = _create_images_zip(task_dir, pages)
-
             # 生成安全的下载文件名
             title = record.get('title', 'images')
             safe_title = _sanitize_filename(title)
             filename = f"{safe_title}.zip"
 
-            return send_file(
-                zip_buffer,
-                mimetype='application/zip',
-                as_attachment=True,
-                download_name=filename
-            )
+            entries = collect_zip_entries(task_dir, pages)
+
+            # 已有预先打包好的文件时直接发送
+            bundle_service = get_download_bundle_service()
+            zip_path = bundle_service.find_bundle(record_id, entries)
+            if zip_path:
+                return send_history_file(
+                    zip_path,
+                    mimetype='application/zip',
+                    as_attachment=True,
+                    download_name=filename
+                )
+
+            # 还没有打包文件：后台生成供之后的下载使用，本次边读图片边输出 ZIP（不压缩），
+            # 不等待打包，内存占用与图片数量无关
+            bundle_service.schedule(record_id)
+            response = Response(iter_zip(entries), mimetype='application/zip')
+            response.content_length = zip_size(entries)
+            response.headers['Content-Disposition'] = attachment_disposition(filename)
+            return response
 
         except Exception as e:
             error_msg = str(e)
@@ -413,57 +520,6 @@ def create_history_blueprint():
     return history_bp
 
 
-def _create_images_zip(task_dir: str, pages: list = None) -> io.BytesIO:
-    """
-    创建包含所有图片的 ZIP 文件
-
-    Args:
-        task_dir: 任务目录路径
-        pages: 页面顺序列表（包含 index 字段），用于按照当前显示顺序命名文件
-
-    Returns:
-        io.BytesIO: 内存中的 ZIP 文件
-    """
-    memory_file = io.BytesIO()
-
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        if pages:
-            # 如果提供了页面顺序，按照页面顺序打包
-            for display_index, page in enumerate(pages, start=1):
-                # 从 page.image.filename 获取图片文件名
-                image = page.get('image')
-                if image and image.get('filename'):
-                    filename = image['filename']
-                    file_path = os.path.join(task_dir, filename)
-                    
-                    # 检查文件是否存在
-                    if os.path.exists(file_path):
-                        archive_name = f"page_{display_index}.png"
-                        zf.write(file_path, archive_name)
-        else:
-            # 如果没有提供页面顺序，使用原有逻辑（兼容旧代码）
-            for filename in os.listdir(task_dir):
-                # 跳过缩略图文件
-                if filename.startswith('thumb_'):
-                    continue
-
-                if filename.endswith(('.png', '.jpg', '.jpeg')):
-                    file_path = os.path.join(task_dir, filename)
-
-                    # 生成归档文件名（page_N.png 格式）
-                    try:
-                        index = int(filename.split('.')[0])
-                        archive_name = f"page_{index + 1}.png"
-                    except ValueError:
-                        archive_name = filename
-
-                    zf.write(file_path, archive_name)
-
-    # 将指针移到开始位置
-    memory_file.seek(0)
-    return memory_file
-
-
 def _sanitize_filename(title: str) -> str:
     """
     清理文件名中的非法字符
@@ -11,14 +11,23 @@
 
 import os
 import json
-import base64
+import hashlib
 import logging
-from flask import Blueprint, request, jsonify, Response, send_file
+from flask import Blueprint, request, jsonify, Response
 from backend.services.image import get_image_service
-from .utils import log_request, log_error
+from backend.utils.single_flight import build_flight_key, get_single_flight
+from backend.services.reference_images import ReferenceImageNotFoundError
+from backend.utils.image_compressor import FORMAT_MIMETYPES, guess_image_mimetype, variant_filename
+from backend.config import Config
+from backend.models import ImageModel
+from backend.utils.thumbnail_cache import get_thumbnail_cache
+from .utils import log_request, log_error, parse_base64_images, load_reference_images, send_history_file
 
 logger = logging.getLogger(__name__)
 
+# 不会改变的图片的浏览器缓存时间（一年）
+IMAGE_CACHE_MAX_AGE = 31536000
+
 
 def create_image_blueprint():
     """创建图片路由蓝图（工厂函数，支持多次调用）"""
@@ -37,6 +46,7 @@ def create_image_blueprint():
         - full_outline: 完整大纲文本
         - user_topic: 用户原始输入主题
         - user_images: base64 编码的用户参考图片列表
+        - user_image_ids: 已上传参考图片的摘要列表（见 /reference-images，可替代 user_images）
         - reference_mode: 参考图模式
 
         返回：
@@ -53,8 +63,9 @@ def create_image_blueprint():
             user_topic = data.get('user_topic', '')
             reference_mode = data.get('reference_mode', 'cover')
 
-            # 解析 base64 格式的用户参考图片
-            user_images = _parse_base64_images(data.get('user_images', []))
+            # 解析用户参考图片（base64 或已上传图片的摘要）
+            user_images = parse_base64_images(data.get('user_images', []))
+            user_images += load_reference_images(data.get('user_image_ids', []))
 
             log_request('/generate-single', {
                 'record_id': record_id,
@@ -72,14 +83,27 @@ def create_image_blueprint():
             logger.info(f"🖼️  开始生成单张图片: record_id={record_id}, page_id={page_id}")
             image_service = get_image_service()
 
-            result = image_service.generate_single_image_by_page_id(
-                record_id=record_id,
-                page_id=page_id,
-                full_outline=full_outline,
-                user_images=user_images if user_images else None,
-                user_topic=user_topic,
-                reference_mode=reference_mode
+            # 相同页面、相同参数的并发请求（双击、重连）只生成一次
+            flight_key = build_flight_key(record_id, page_id, {
+                'full_outline': full_outline,
+                'user_topic': user_topic,
+                'reference_mode': reference_mode,
+                'user_images': user_images,
+            })
+            result, shared = get_single_flight().do(
+                flight_key,
+                lambda: image_service.generate_single_image_by_page_id(
+                    record_id=record_id,
+                    page_id=page_id,
+                    full_outline=full_outline,
+                    user_images=user_images if user_images else None,
+                    user_topic=user_topic,
+                    reference_mode=reference_mode
+                ),
+                keep_if=lambda r: r["success"]
             )
+            if shared:
+                logger.info(f"♻️  复用进行中的相同请求结果: page_id={page_id}")
 
             if result["success"]:
                 logger.info(f"✅ 单张图片生成成功: page_id={page_id}, image_url={result.get('image_url')}")
@@ -88,6 +112,9 @@ def create_image_blueprint():
 
             return jsonify(result), 200 if result["success"] else 500
 
+        except ReferenceImageNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
         except Exception as e:
             log_error('/generate-single', e)
             error_msg = str(e)
@@ -107,6 +134,7 @@ def create_image_blueprint():
         - full_outline: 完整大纲文本
         - user_topic: 用户原始输入主题
         - user_images: base64 编码的用户参考图片列表
+        - user_image_ids: 已上传参考图片的摘要列表（见 /reference-images，可替代 user_images）
 
         返回：
         SSE 事件流，包含以下事件类型：
@@ -121,8 +149,9 @@ def create_image_blueprint():
             full_outline = data.get('full_outline', '')
             user_topic = data.get('user_topic', '')
 
-            # 解析 base64 格式的用户参考图片
-            user_images = _parse_base64_images(data.get('user_images', []))
+            # 解析用户参考图片（base64 或已上传图片的摘要）
+            user_images = parse_base64_images(data.get('user_images', []))
+            user_images += load_reference_images(data.get('user_image_ids', []))
             reference_mode = data.get('reference_mode', 'cover')
 
             log_request('/generate', {
@@ -167,6 +196,9 @@ def create_image_blueprint():
                 }
             )
 
+        except ReferenceImageNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
         except Exception as e:
             log_error('/generate', e)
             error_msg = str(e)
@@ -175,9 +207,83 @@ def create_image_blueprint():
                 "error": f"图片生成异常。\n错误详情: {error_msg}\n建议：检查图片生成服务配置和后端日志"
             }), 500
 
+    # ==================== 参考图片上传 ====================
+
+    @image_bp.route('/reference-images', methods=['POST'])
+    def upload_reference_images():
+        """
+        上传参考图片（按内容哈希去重存储）
+
+        请求格式：
+        1. multipart/form-data
+           - images: 图片文件列表
+        2. application/json
+           - images: base64 编码的图片数组
+
+        返回：
+        - success: 是否成功
+        - images: 图片信息列表（digest、size、compressed_size），
+          之后生成接口可以用 user_image_ids / image_ids 传 digest 代替图片数据
+        """
+        try:
+            if request.content_type and 'multipart/form-data' in request.content_type:
+                images = [f.read() for f in request.files.getlist('images') if f and f.filename]
+            else:
+                data = request.get_json() or {}
+                images = parse_base64_images(data.get('images', []))
+
+            log_request('/reference-images', {'images': images})
+
+            if not images:
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：images 不能为空。"
+                }), 400
+
+            from backend.services.reference_images import get_reference_image_service
+            store = get_reference_image_service()
+            return jsonify({
+                "success": True,
+                "images": [store.save(image_data) for image_data in images]
+            })
+
+        except Exception as e:
+            log_error('/reference-images', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"上传参考图片失败。\n错误详情: {error_msg}"
+            }), 500
+
+    @image_bp.route('/reference-images/<digest>', methods=['GET'])
+    def get_reference_image(digest):
+        """
+        获取已上传的参考图片
+
+        路径参数：
+        - digest: 图片摘要
+
+        查询参数：
+        - original: 是否返回原图（默认返回压缩后的参考图）
+
+        返回：
+        - 成功：图片文件
+        - 失败：JSON 错误信息
+        """
+        try:
+            from backend.services.reference_images import get_reference_image_service
+            store = get_reference_image_service()
+            original = request.args.get('original', 'false').lower() == 'true'
+            path = store.get_path(digest, 'original' if original else 'compressed')
+            # 按内容哈希寻址，内容不会改变
+            return _send_image(path)
+
+        except ReferenceImageNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 404
+
     # ==================== 图片获取 ====================
 
-    @image_bp.route('/images/<record_id>/<filename>', methods=['GET'])
+    @image_bp.route('/images/<record_id>/<filename>', methods=['GET', 'HEAD'])
     def get_image(record_id, filename):
         """
         获取图片文件
@@ -188,9 +294,14 @@ def create_image_blueprint():
 
         查询参数：
         - thumbnail: 是否返回缩略图（默认 true）
+        - w: 需要的宽度（像素），返回不小于该宽度的最小副本，没有时返回原图（可用于 srcset）
+        - fmt: 副本格式 webp / jpeg / avif（默认按 Accept 选择）
+
+        请求头 Accept 中明确包含 image/avif 或 image/webp 时，优先返回对应格式的缩略图；
+        支持 HEAD 和 Range（断点续传），原图的 ETag 为内容 sha256
 
         返回：
-        - 成功：图片文件
+        - 成功：图片文件（Range 请求返回 206）
         - 失败：JSON 错误信息
         """
         try:
@@ -198,6 +309,11 @@ def create_image_blueprint():
 
             # 检查是否请求缩略图
             thumbnail = request.args.get('thumbnail', 'true').lower() == 'true'
+            # 文件名带时间戳和随机数、内容不会改变，可以长期缓存；
+            # 只有副本尚未生成时返回的原图之后会被副本替代
+            immutable = True
+            rendition_requested = False
+            image = None
 
             # 构建 history 目录路径
             history_root = os.path.join(
@@ -205,13 +321,53 @@ def create_image_blueprint():
                 "history"
             )
 
+            if 'w' in request.args or 'fmt' in request.args:
+                # 按宽度 / 格式返回多尺寸副本
+                try:
+                    width = _parse_width(request.args.get('w'))
+                    formats = _rendition_formats(request.args.get('fmt'))
+                except ValueError as e:
+                    return jsonify({
+                        "success": False,
+                        "error": f"参数错误：{e}"
+                    }), 400
+
+                from backend.services.renditions import select_rendition
+                rendition_requested = True
+                image = ImageModel.get_by_filename(filename)
+                immutable = bool(image and image.get('renditions_json'))
+                if image and image['record_id'] == record_id:
+                    rendition = select_rendition(ImageModel.parse_renditions(image), width, formats)
+                    if rendition:
+                        rendition_path = os.path.join(history_root, record_id, rendition['filename'])
+                        if os.path.exists(rendition_path):
+                            response = _send_image(rendition_path)
+                            response.vary.add('Accept')
+                            return response
+                # 副本尚未生成或请求宽度不小于原图：返回原图
+                thumbnail = False
+
             if thumbnail:
-                # 尝试返回缩略图
+                # 尝试返回缩略图（按 Accept 选择 AVIF / WebP 副本）
                 thumb_filename = f"thumb_{filename}"
                 thumb_filepath = os.path.join(history_root, record_id, thumb_filename)
 
+                formats = _accepted_thumbnail_formats()
+
+                # 最近返回过的缩略图直接从内存返回（交给前置代理发送时不缓存）
+                cache = get_thumbnail_cache() if not Config.FILE_OFFLOAD else None
+                cache_key = (record_id, filename, formats)
+                entry = cache.get(cache_key) if cache and cache.max_bytes else None
+                if entry is not None:
+                    return _send_cached_image(entry)
+
                 if os.path.exists(thumb_filepath):
-                    return send_file(thumb_filepath, mimetype='image/png')
+                    thumb_path = _negotiate_thumbnail(thumb_filepath, formats)
+                    if cache and cache.max_bytes:
+                        return _send_cached_image(cache.load(cache_key, thumb_path))
+                    response = _send_image(thumb_path)
+                    response.vary.add('Accept')
+                    return response
 
             # 返回原图
             filepath = os.path.join(history_root, record_id, filename)
@@ -222,7 +378,17 @@ def create_image_blueprint():
                     "error": f"图片不存在：{record_id}/{filename}"
                 }), 404
 
-            return send_file(filepath, mimetype='image/png')
+            # 原图用内容哈希作为 ETag（不随复制、迁移改变，便于 CDN 缓存和断点续传校验）
+            if image is None:
+                image = ImageModel.get_by_filename(filename)
+            etag = None
+            if image and image['record_id'] == record_id:
+                etag = _ensure_file_info(image, filepath)['sha256']
+
+            response = _send_image(filepath, immutable=immutable, etag=etag)
+            if rendition_requested:
+                response.vary.add('Accept')
+            return response
 
         except Exception as e:
             log_error('/images', e)
@@ -355,6 +521,7 @@ def create_image_blueprint():
         - full_outline: 完整大纲文本（用于上下文）
         - user_topic: 用户原始输入主题
         - reference_mode: 参考图模式（'custom' | 'cover' | 'previous'，默认 'cover'）
+        - user_image_ids: 已上传参考图片的摘要列表（可选，优先于任务状态中的参考图）
 
         返回：
         - success: 是否成功
@@ -368,6 +535,8 @@ def create_image_blueprint():
             full_outline = data.get('full_outline', '')
             user_topic = data.get('user_topic', '')
             reference_mode = data.get('reference_mode', 'cover')
+            user_image_ids = data.get('user_image_ids', [])
+            user_images = load_reference_images(user_image_ids)
 
             log_request('/regenerate', {
                 'record_id': record_id,
@@ -384,12 +553,29 @@ def create_image_blueprint():
 
             logger.info(f"🔄 重新生成图片: record={record_id}, page={page.get('index')}, mode={reference_mode}")
             image_service = get_image_service()
-            result = image_service.regenerate_image(
-                record_id, page, use_reference,
-                full_outline=full_outline,
-                user_topic=user_topic,
-                reference_mode=reference_mode
+
+            # 相同页面、相同参数的并发请求（双击、重连）只生成一次
+            flight_key = build_flight_key(record_id, page.get('id', page.get('index')), {
+                'page': page,
+                'use_reference': use_reference,
+                'user_image_ids': user_image_ids,
+                'full_outline': full_outline,
+                'user_topic': user_topic,
+                'reference_mode': reference_mode,
+            })
+            result, shared = get_single_flight().do(
+                flight_key,
+                lambda: image_service.regenerate_image(
+                    record_id, page, use_reference,
+                    full_outline=full_outline,
+                    user_topic=user_topic,
+                    reference_mode=reference_mode,
+                    user_images=user_images if user_images else None
+                ),
+                keep_if=lambda r: r["success"]
             )
+            if shared:
+                logger.info(f"♻️  复用进行中的相同请求结果: page={page.get('index')}")
 
             if result["success"]:
                 logger.info(f"✅ 图片重新生成成功: {result.get('image_url')}")
@@ -398,6 +584,9 @@ def create_image_blueprint():
 
             return jsonify(result), 200 if result["success"] else 500
 
+        except ReferenceImageNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
         except Exception as e:
             log_error('/regenerate', e)
             error_msg = str(e)
@@ -619,29 +808,163 @@ def create_image_blueprint():
             "message": "服务正常运行"
         }), 200
 
+    @image_bp.route('/image-providers/status', methods=['GET'])
+    def get_image_providers_status():
+        """
+        获取图片服务商池状态（延迟统计与熔断状态）
+
+        返回：
+        - success: 是否成功
+        - available: 是否至少有一个服务商未熔断
+        - hedging_enabled: 是否启用对冲请求
+        - providers: 各服务商状态
+        """
+        try:
+            image_service = get_image_service()
+            pool = image_service.provider_pool
+            return jsonify({
+                "success": True,
+                "available": any(m.available for m in pool.members),
+                "hedging_enabled": pool.hedging_enabled,
+                "providers": pool.get_status()
+            }), 200
+
+        except Exception as e:
+            log_error('/image-providers/status', e)
+            return jsonify({
+                "success": False,
+                "error": f"获取图片服务商状态失败: {str(e)}"
+            }), 500
+
     return image_bp
 
 
-# ==================== 辅助函数 ====================
+def _accepted_thumbnail_formats() -> tuple:
+    """
+    Accept 请求头中明确声明支持（而不是 */*）的缩略图副本格式
+
+    Returns:
+        按优先级排列的格式（'AVIF'、'WEBP'）
+    """
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    return tuple(f for f in ('AVIF', 'WEBP') if FORMAT_MIMETYPES[f] in accepted)
+
+
+def _negotiate_thumbnail(thumb_filepath: str, formats: tuple) -> str:
+    """
+    根据浏览器支持的格式选择缩略图，没有对应副本时返回 JPEG 缩略图
+
+    Args:
+        thumb_filepath: JPEG 缩略图路径
+        formats: 浏览器支持的副本格式（见 _accepted_thumbnail_formats）
+
+    Returns:
+        实际返回的文件路径
+    """
+    for image_format in formats:
+        variant_path = variant_filename(thumb_filepath, image_format)
+        if os.path.exists(variant_path):
+            return variant_path
+    return thumb_filepath
+
+
+def _parse_width(value: str = None):
+    """解析 w 参数（为空时返回 None）"""
+    if not value:
+        return None
+    if not value.isdigit() or int(value) <= 0:
+        raise ValueError(f"w 必须是正整数，当前为 {value}")
+    return int(value)
+
+
+def _rendition_formats(fmt: str = None) -> list:
+    """
+    确定副本格式的优先级
+
+    Args:
+        fmt: 请求参数中的格式（为空时按 Accept 选择）
+
+    Returns:
+        格式列表（JPEG 兜底）
+
+    Raises:
+        ValueError: 不支持的格式
+    """
+    if fmt:
+        image_format = {'jpg': 'JPEG'}.get(fmt.lower(), fmt.upper())
+        if image_format not in FORMAT_MIMETYPES:
+            raise ValueError(f"不支持的图片格式 {fmt}，可选 webp / jpeg / avif")
+        return [image_format, 'JPEG']
+
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    return [f for f in ('AVIF', 'WEBP') if FORMAT_MIMETYPES[f] in accepted] + ['JPEG']
+
+
+def _send_cached_image(entry: dict):
+    """
+    返回内存中缓存的缩略图（响应头与 _send_image 一致，不访问文件系统）
+
+    Args:
+        entry: ThumbnailCache 中的缓存条目
 
-def _parse_base64_images(images_base64: list) -> list:
+    Returns:
+        Flask 响应
     """
-    解析 base64 编码的图片列表
+    response = Response(entry['data'], mimetype=entry['mimetype'])
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response.make_conditional(request)
+
+
+def _ensure_file_info(image: dict, filepath: str) -> dict:
+    """
+    获取原图的字节数和内容哈希（迁移前的图片没有记录时计算并写入数据库）
 
     Args:
-        images_base64: base64 编码的图片字符串列表
+        image: 图片记录
+        filepath: 原图路径
 
     Returns:
-        list: 解码后的图片二进制数据列表
+        包含 file_size、sha256 的字典
+    """
+    if image.get('sha256') and image.get('file_size') is not None:
+        return {'file_size': image['file_size'], 'sha256': image['sha256']}
+
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    info = {'file_size': os.path.getsize(filepath), 'sha256': digest.hexdigest()}
+    ImageModel.update_file_info(image['id'], info['file_size'], info['sha256'])
+    return info
+
+
+def _send_image(filepath: str, immutable: bool = True, etag: str = None):
     """
-    if not images_base64:
-        return []
+    按文件头判断 MIME 类型后发送图片（生成的图片和缩略图不一定是 PNG）
 
-    images = []
-    for img_b64 in images_base64:
-        # 移除可能的 data URL 前缀（如 data:image/png;base64,）
-        if ',' in img_b64:
-            img_b64 = img_b64.split(',')[1]
-        images.append(base64.b64decode(img_b64))
+    带 ETag 和 Last-Modified，If-None-Match / If-Modified-Since 命中时返回 304；支持 Range 断点续传
 
-    return images
+    Args:
+        filepath: 图片路径
+        immutable: 该 URL 的内容是否永不改变（是则允许浏览器缓存一年且不再验证）
+        etag: 指定的 ETag（默认按修改时间和大小生成）
+
+    Returns:
+        Flask 响应
+    """
+    with open(filepath, 'rb') as f:
+        mimetype = guess_image_mimetype(f.read(12))
+    response = send_history_file(
+        filepath,
+        mimetype=mimetype,
+        max_age=IMAGE_CACHE_MAX_AGE if immutable else None,
+        etag=etag
+    )
+    if immutable:
+        response.cache_control.immutable = True
+    return response
@@ -3,15 +3,18 @@
 
 包含功能：
 - 生成基调
-- 生成大纲（支持图片上传和基调）
+- 生成大纲（支持图片上传和基调，支持 SSE 流式返回）
 """
 
 import time
+import json
 import base64
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from backend.services.outline import get_outline_service
-from .utils import log_request, log_error
+from backend.utils.single_flight import build_flight_key, get_single_flight
+from backend.services.reference_images import ReferenceImageNotFoundError
+from .utils import log_request, log_error, load_reference_images, wants_bypass_cache
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +31,7 @@ def create_outline_blueprint():
         请求格式：application/json
         - topic: 主题文本（必填）
         - record_id: 记录ID（可选，如果提供则更新现有记录，否则创建新记录）
+        - bypass_cache: 是否跳过文本缓存（可选，开启缓存时重新生成使用）
 
         返回：
         - success: 是否成功
@@ -69,7 +73,7 @@ def create_outline_blueprint():
             # 调用基调生成服务
             logger.info(f"🔄 开始生成基调，主题: {topic[:50]}...")
             outline_service = get_outline_service()
-            result = outline_service.generate_tone(topic, record_id)
+            result = outline_service.generate_tone(topic, record_id, bypass_cache=wants_bypass_cache())
             
             # 在返回结果中添加 record_id
             if result["success"]:
@@ -106,6 +110,17 @@ def create_outline_blueprint():
            - topic: 主题文本
            - images: base64 编码的图片数组（可选）
 
+        两种格式都支持 image_ids 字段（已上传参考图片的摘要，见 /reference-images）
+        和 bypass_cache 字段（或查询参数），开启文本缓存时用于强制重新生成。
+
+        流式模式（?stream=1 或 Accept: text/event-stream）：
+        返回 SSE 事件流，包含以下事件类型：
+        - text: 新生成的文本片段
+        - metadata: 标题、正文、标签
+        - page: 单个页面结束（已写入数据库，包含 id）
+        - complete: 全部完成（内容与非流式返回相同）
+        - error: 生成失败
+
         返回：
         - success: 是否成功
         - outline: 原始大纲文本
@@ -127,30 +142,62 @@ def create_outline_blueprint():
                     "error": "参数错误：topic 不能为空。\n请提供要生成图文的主题内容。"
                 }), 400
 
-            # 如果没有 record_id，先创建记录
-            from backend.services.history import get_history_service
-            if not record_id:
-                history_service = get_history_service()
-                record_id = history_service.create_record(topic=topic, title="", status="draft")
-                logger.info(f"✅ 创建记录: record_id={record_id}")
-
-            # 调用大纲生成服务
-            logger.info(f"🔄 开始生成大纲，主题: {topic[:50]}..., record_id={record_id}")
             outline_service = get_outline_service()
-            result = outline_service.generate_outline(topic, record_id, images if images else None, tone)
-            
-            # 在返回结果中添加 record_id
-            if result["success"]:
-                result["record_id"] = record_id
+            bypass_cache = wants_bypass_cache()
+
+            if not _wants_stream():
+                # 相同主题、基调和参考图的并发请求（双击、重连）只生成一次，也不会重复创建记录
+                flight_key = build_flight_key(record_id, None, {
+                    'topic': topic,
+                    'tone': tone,
+                    'images': images,
+                    'bypass_cache': bypass_cache,
+                })
+                result, shared = get_single_flight().do(
+                    flight_key,
+                    lambda: _generate_outline_for_record(
+                        outline_service, topic, record_id, images, tone, bypass_cache
+                    ),
+                    keep_if=lambda r: r["success"]
+                )
+                if shared:
+                    logger.info(f"♻️  复用进行中的相同大纲请求结果: record_id={result.get('record_id')}")
+
+                # 记录结果
+                elapsed = time.time() - start_time
+                if result["success"]:
+                    logger.info(f"✅ 大纲生成成功，耗时 {elapsed:.2f}s，共 {len(result.get('pages', []))} 页")
+                    return jsonify(result), 200
+                else:
+                    logger.error(f"❌ 大纲生成失败: {result.get('error', '未知错误')}")
+                    return jsonify(result), 500
 
-            # 记录结果
-            elapsed = time.time() - start_time
-            if result["success"]:
-                logger.info(f"✅ 大纲生成成功，耗时 {elapsed:.2f}s，共 {len(result.get('pages', []))} 页")
-                return jsonify(result), 200
-            else:
-                logger.error(f"❌ 大纲生成失败: {result.get('error', '未知错误')}")
-                return jsonify(result), 500
+            # 如果没有 record_id，先创建记录
+            record_id = _ensure_record(topic, record_id)
+            logger.info(f"🔄 开始流式生成大纲，主题: {topic[:50]}..., record_id={record_id}")
+
+            def generate():
+                """SSE 事件生成器"""
+                for event in outline_service.generate_outline_stream(
+                    topic, record_id, images if images else None, tone,
+                    bypass_cache=bypass_cache
+                ):
+                    yield f"event: {event['event']}\n"
+                    yield f"data: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+                logger.info(f"✅ 大纲流式生成结束，耗时 {time.time() - start_time:.2f}s")
+
+            return Response(
+                generate(),
+                mimetype='text/event-stream',
+                headers={
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no',
+                }
+            )
+
+        except ReferenceImageNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
 
         except Exception as e:
             log_error('/outline', e)
@@ -283,6 +330,39 @@ def create_outline_blueprint():
     return outline_bp
 
 
+def _wants_stream() -> bool:
+    """请求是否要求 SSE 流式返回（?stream=1 或 Accept: text/event-stream）"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'text/event-stream' in (request.headers.get('Accept') or '')
+
+
+def _ensure_record(topic: str, record_id: str = None) -> str:
+    """没有 record_id 时创建新记录，返回记录ID"""
+    if record_id:
+        return record_id
+
+    from backend.services.history import get_history_service
+    record_id = get_history_service().create_record(topic=topic, title="", status="draft")
+    logger.info(f"✅ 创建记录: record_id={record_id}")
+    return record_id
+
+
+def _generate_outline_for_record(outline_service, topic, record_id, images, tone, bypass_cache) -> dict:
+    """创建记录（如需要）并生成大纲，返回结果中包含 record_id"""
+    record_id = _ensure_record(topic, record_id)
+    logger.info(f"🔄 开始生成大纲，主题: {topic[:50]}..., record_id={record_id}")
+
+    result = outline_service.generate_outline(
+        topic, record_id, images if images else None, tone, bypass_cache=bypass_cache
+    )
+
+    # 在返回结果中添加 record_id
+    if result["success"]:
+        result["record_id"] = record_id
+    return result
+
+
 def _parse_outline_request():
     """
     解析大纲生成请求
@@ -312,6 +392,9 @@ def _parse_outline_request():
                     image_data = file.read()
                     images.append(image_data)
 
+        # 已上传参考图片的摘要（见 /reference-images）
+        images += load_reference_images(request.form.getlist('image_ids'), variant='original')
+
         return topic, images, tone, record_id
 
     # JSON 请求（无图片或 base64 图片）
@@ -330,4 +413,7 @@ def _parse_outline_request():
                 img_b64 = img_b64.split(',')[1]
             images.append(base64.b64decode(img_b64))
 
+    # 已上传参考图片的摘要（见 /reference-images）
+    images += load_reference_images(data.get('image_ids', []), variant='original')
+
     return topic, images, tone, record_id
@@ -0,0 +1,144 @@
+"""
+一键生成流水线 API 路由
+
+包含功能：
+- 基调 → 大纲 → 图片 一次请求完成（SSE 流式返回）
+  大纲每生成完一页就立即开始生成该页图片
+"""
+
+import json
+import time
+import logging
+from flask import Blueprint, request, jsonify, Response
+from backend.services.reference_images import ReferenceImageNotFoundError
+from .utils import log_request, log_error, parse_base64_images, load_reference_images, wants_bypass_cache
+
+logger = logging.getLogger(__name__)
+
+
+def create_pipeline_blueprint():
+    """创建流水线路由蓝图（工厂函数，支持多次调用）"""
+    pipeline_bp = Blueprint('pipeline', __name__)
+
+    @pipeline_bp.route('/pipeline', methods=['POST'])
+    def run_pipeline():
+        """
+        一键生成：基调 → 大纲 → 图片（SSE 流式返回）
+
+        请求体：
+        - topic: 主题文本（必填）
+        - record_id: 记录ID（可选，不提供则创建新记录）
+        - tone: 内容基调（可选，不提供则先生成基调）
+        - images: base64 编码的参考图片列表（可选，同时用于大纲和图片生成）
+        - image_ids: 已上传参考图片的摘要列表（可选，见 /reference-images，可替代 images）
+        - reference_mode: 参考图模式 (cover/custom)，默认 cover
+        - bypass_cache: 是否跳过文本缓存（可选）
+
+        返回：
+        SSE 事件流，包含以下事件类型：
+        - record: 记录已创建
+        - tone / tone_error: 基调生成完成或失败
+        - text / metadata / page: 大纲生成进度（同 /outline 流式模式）
+        - outline_complete / outline_error: 大纲完成或失败
+        - progress / complete / error: 单页图片生成进度（同 /generate）
+        - finish: 全部完成
+        """
+        start_time = time.time()
+
+        try:
+            data = request.get_json() or {}
+            topic = data.get('topic')
+            record_id = data.get('record_id')
+            tone = data.get('tone')
+            images = parse_base64_images(data.get('images', []))
+            image_ids = data.get('image_ids', [])
+            images += load_reference_images(image_ids, variant='original')
+            # 图片生成使用预先压缩好的参考图，避免每页重新压缩
+            if image_ids and not data.get('images'):
+                compressed_images = load_reference_images(image_ids)
+            else:
+                compressed_images = images
+            reference_mode = data.get('reference_mode', 'cover')
+            bypass_cache = wants_bypass_cache()
+
+            log_request('/pipeline', {
+                'topic': topic,
+                'record_id': record_id,
+                'tone': '已提供' if tone else '未提供',
+                'images': images,
+                'reference_mode': reference_mode
+            })
+
+            if not topic:
+                logger.warning("流水线请求缺少 topic 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 不能为空。\n请提供要生成图文的主题内容。"
+                }), 400
+
+            from backend.services.history import get_history_service
+            from backend.services.outline import get_outline_service
+            from backend.services.image import get_image_service
+
+            if not record_id:
+                record_id = get_history_service().create_record(topic=topic, title="", status="draft")
+                logger.info(f"✅ 创建记录: record_id={record_id}")
+
+            # 在请求上下文中初始化服务，配置错误可以直接返回 500
+            outline_service = get_outline_service()
+            image_service = get_image_service()
+
+            def generate():
+                """SSE 事件生成器"""
+                def sse(event_type: str, event_data: dict) -> str:
+                    return f"event: {event_type}\ndata: {json.dumps(event_data, ensure_ascii=False)}\n\n"
+
+                yield sse("record", {"record_id": record_id})
+
+                tone_text = tone
+                if not tone_text:
+                    logger.info(f"🔄 流水线生成基调: record_id={record_id}")
+                    result = outline_service.generate_tone(topic, record_id, bypass_cache=bypass_cache)
+                    if not result["success"]:
+                        yield sse("tone_error", {"success": False, "record_id": record_id, "error": result["error"]})
+                        return
+                    tone_text = result["tone"]
+                    yield sse("tone", {"record_id": record_id, "tone": tone_text})
+
+                outline_events = outline_service.generate_outline_stream(
+                    topic, record_id, images if images else None, tone_text,
+                    bypass_cache=bypass_cache
+                )
+                for event in image_service.generate_images_from_outline_stream(
+                    outline_events,
+                    record_id,
+                    user_images=compressed_images if compressed_images else None,
+                    user_topic=topic,
+                    reference_mode=reference_mode,
+                    tone=tone_text
+                ):
+                    yield sse(event["event"], event["data"])
+
+                logger.info(f"✅ 流水线结束: record_id={record_id}，耗时 {time.time() - start_time:.2f}s")
+
+            return Response(
+                generate(),
+                mimetype='text/event-stream',
+                headers={
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no',
+                }
+            )
+
+        except ReferenceImageNotFoundError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        except Exception as e:
+            log_error('/pipeline', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"一键生成异常。\n错误详情: {error_msg}\n建议：检查文本和图片生成服务配置和后端日志"
+            }), 500
+
+    return pipeline_bp
@@ -4,8 +4,16 @@ API 路由工具函数
 包含通用的日志记录、错误处理等辅助函数
 """
 
+import base64
 import logging
+import os
 import traceback
+from urllib.parse import quote
+
+from flask import Response, request, send_file
+from werkzeug.http import dump_options_header
+
+from backend.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -95,3 +103,137 @@ def prepare_providers_for_response(providers: dict) -> dict:
         result[name] = provider_copy
 
     return result
+
+
+def parse_base64_images(images_base64: list) -> list:
+    """
+    解析 base64 编码的图片列表
+
+    Args:
+        images_base64: base64 编码的图片字符串列表
+
+    Returns:
+        list: 解码后的图片二进制数据列表
+    """
+    if not images_base64:
+        return []
+
+    images = []
+    for img_b64 in images_base64:
+        # 移除可能的 data URL 前缀（如 data:image/png;base64,）
+        if ',' in img_b64:
+            img_b64 = img_b64.split(',')[1]
+        images.append(base64.b64decode(img_b64))
+
+    return images
+
+
+def load_reference_images(image_ids: list, variant: str = "compressed") -> list:
+    """
+    按摘要读取已上传的参考图片（见 POST /api/reference-images）
+
+    Args:
+        image_ids: 参考图片摘要列表
+        variant: 'compressed'（压缩后的参考图）或 'original'（原图）
+
+    Returns:
+        list: 图片二进制数据列表
+
+    Raises:
+        ReferenceImageNotFoundError: 摘要格式错误或图片不存在
+    """
+    if not image_ids:
+        return []
+
+    from backend.services.reference_images import get_reference_image_service
+    return get_reference_image_service().load(image_ids, variant)
+
+
+def wants_bypass_cache() -> bool:
+    """请求是否要求跳过文本缓存（查询参数、表单或 JSON 中的 bypass_cache）"""
+    value = request.args.get('bypass_cache')
+    if value is None and request.content_type and 'multipart/form-data' in request.content_type:
+        value = request.form.get('bypass_cache')
+    if value is None:
+        data = request.get_json(silent=True) or {}
+        value = data.get('bypass_cache')
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+# history 目录（图片和下载文件都在这里）
+HISTORY_ROOT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "history"
+)
+
+
+def attachment_disposition(filename: str) -> str:
+    """
+    附件下载的 Content-Disposition 头（与 send_file 一致：非 ASCII 文件名使用 filename*）
+
+    Args:
+        filename: 下载文件名
+
+    Returns:
+        Content-Disposition 头的值
+    """
+    try:
+        filename.encode('ascii')
+        return dump_options_header('attachment', {'filename': filename})
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+def send_history_file(
+    filepath: str,
+    mimetype: str,
+    max_age: int = None,
+    as_attachment: bool = False,
+    download_name: str = None,
+    etag: str = None
+) -> Response:
+    """
+    发送 history 目录下的文件
+
+    配置了 FILE_OFFLOAD 时，Python 只负责鉴权和响应头，文件内容由前置代理发送：
+    - x-accel-redirect：返回 X-Accel-Redirect 头，nginx 从 internal location 读取文件
+    - x-sendfile：返回 X-Sendfile 头（文件绝对路径）
+
+    Args:
+        filepath: 文件路径（必须位于 history 目录下才会交给代理）
+        mimetype: MIME 类型
+        max_age: 浏览器缓存秒数（None 表示每次验证）
+        as_attachment: 是否作为附件下载
+        download_name: 下载文件名
+        etag: 指定的 ETag（如内容哈希，默认按修改时间和大小生成）
+
+    Returns:
+        Flask 响应（支持 Range 和 If-None-Match / If-Modified-Since）
+    """
+    relative_path = os.path.relpath(os.path.abspath(filepath), HISTORY_ROOT)
+    if Config.FILE_OFFLOAD == 'x-accel-redirect' and not relative_path.startswith('..'):
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = (
+            Config.FILE_OFFLOAD_PREFIX.rstrip('/') + '/' + quote(relative_path.replace(os.sep, '/'))
+        )
+        if as_attachment:
+            response.headers['Content-Disposition'] = attachment_disposition(download_name)
+        if max_age is not None:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    # 默认由 Flask 发送；x-sendfile 模式下 send_file 只写 X-Sendfile 头
+    return send_file(
+        filepath,
+        mimetype=mimetype,
+        etag=etag or True,
+        conditional=True,
+        max_age=max_age,
+        as_attachment=as_attachment,
+        download_name=download_name
+    )
@@ -0,0 +1,234 @@
+"""
+预先打包的下载文件
+
+同一篇已完成的笔记常被反复下载，每次都重新读取所有图片打包。
+记录状态变为 completed 时在后台生成 ZIP，保存在 history/.downloads/<record_id>/<版本>.zip，
+之后的下载直接发送该文件（支持 Range，也可交给前置代理发送）。
+下载时还没有打包文件则直接流式输出，同时提交后台打包，下载请求不等待打包完成。
+版本由打包内容（页面顺序、图片文件名、大小、修改时间）计算，
+内容变化后旧文件不会再被使用；保存新图片或更新记录时会立即删除旧文件。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from backend.utils.zip_stream import iter_zip
+
+logger = logging.getLogger(__name__)
+
+
+def collect_zip_entries(task_dir: str, pages: list = None) -> List[Tuple[str, str]]:
+    """
+    确定打包的图片文件及其在压缩包中的文件名
+
+    Args:
+        task_dir: 任务目录路径
+        pages: 页面顺序列表（包含 index 字段），用于按照当前显示顺序命名文件
+
+    Returns:
+        (文件路径, 压缩包内文件名) 列表
+    """
+    entries = []
+    if pages:
+        # 如果提供了页面顺序，按照页面顺序打包
+        for display_index, page in enumerate(pages, start=1):
+            # 从 page.image.filename 获取图片文件名
+            image = page.get('image')
+            if image and image.get('filename'):
+                filename = image['filename']
+                file_path = os.path.join(task_dir, filename)
+
+                # 检查文件是否存在
+                if os.path.exists(file_path):
+                    entries.append((file_path, f"page_{display_index}.png"))
+    else:
+        # 如果没有提供页面顺序，使用原有逻辑（兼容旧代码）
+        for filename in os.listdir(task_dir):
+            # 跳过缩略图文件
+            if filename.startswith('thumb_'):
+                continue
+
+            if filename.endswith(('.png', '.jpg', '.jpeg')):
+                file_path = os.path.join(task_dir, filename)
+
+                # 生成归档文件名（page_N.png 格式）
+                try:
+                    index = int(filename.split('.')[0])
+                    archive_name = f"page_{index + 1}.png"
+                except ValueError:
+                    archive_name = filename
+
+                entries.append((file_path, archive_name))
+
+    return entries
+
+
+class DownloadBundleService:
+    """按 (record_id, 内容版本) 缓存打包好的 ZIP 文件"""
+
+    # 记录锁的数量（按 record_id 的哈希选择，锁的数量固定，不随记录数增长）
+    LOCK_STRIPES = 64
+
+    def __init__(self, root_dir: Optional[str] = None):
+        """
+        初始化
+
+        Args:
+            root_dir: 打包文件存储目录，默认为 history/.downloads
+        """
+        self.history_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "history"
+        )
+        self.root_dir = root_dir or os.path.join(self.history_dir, ".downloads")
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="download-bundle")
+        self._record_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def _record_dir(self, record_id: str) -> str:
+        return os.path.join(self.root_dir, record_id)
+
+    def _record_lock(self, record_id: str) -> threading.Lock:
+        return self._record_locks[hash(record_id) % self.LOCK_STRIPES]
+
+    @staticmethod
+    def build_version(entries: List[Tuple[str, str]]) -> str:
+        """
+        计算打包内容的版本
+
+        Args:
+            entries: (文件路径, 压缩包内文件名) 列表
+
+        Returns:
+            版本号（sha256 前 16 位）
+        """
+        members = []
+        for path, archive_name in entries:
+            stat = os.stat(path)
+            members.append([archive_name, os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        return hashlib.sha256(json.dumps(members).encode('utf-8')).hexdigest()[:16]
+
+    def _load_entries(self, record_id: str) -> Optional[List[Tuple[str, str]]]:
+        """读取记录当前的打包内容（记录或任务目录不存在时为 None）"""
+        from backend.services.history import get_history_service
+
+        record = get_history_service().get_record(record_id)
+        task_dir = os.path.join(self.history_dir, record_id)
+        if not record or not os.path.isdir(task_dir):
+            return None
+        pages = (record.get('outline') or {}).get('pages', [])
+        return collect_zip_entries(task_dir, pages)
+
+    def _bundle_path(self, record_id: str, entries: List[Tuple[str, str]]) -> str:
+        return os.path.join(self._record_dir(record_id), f"{self.build_version(entries)}.zip")
+
+    def find_bundle(self, record_id: str, entries: List[Tuple[str, str]]) -> Optional[str]:
+        """
+        查找与当前内容一致的打包文件（不生成）
+
+        Args:
+            record_id: 记录 ID
+            entries: (文件路径, 压缩包内文件名) 列表
+
+        Returns:
+            ZIP 文件路径，不存在时为 None
+        """
+        path = self._bundle_path(record_id, entries)
+        return path if os.path.exists(path) else None
+
+    def get_bundle(self, record_id: str, entries: List[Tuple[str, str]]) -> str:
+        """
+        获取与当前内容一致的打包文件（不存在时生成）
+
+        Args:
+            record_id: 记录 ID
+            entries: (文件路径, 压缩包内文件名) 列表
+
+        Returns:
+            ZIP 文件路径
+        """
+        path = self._bundle_path(record_id, entries)
+        if os.path.exists(path):
+            return path
+
+        with self._record_lock(record_id):
+            if not os.path.exists(path):
+                self._write(record_id, path, entries)
+        return path
+
+    def _write(self, record_id: str, path: str, entries: List[Tuple[str, str]]) -> None:
+        """写入打包文件，并删除同一记录的旧版本"""
+        record_dir = os.path.dirname(path)
+        os.makedirs(record_dir, exist_ok=True)
+
+        # 先写临时文件再重命名，下载请求和前置代理不会读到写了一半的文件
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter_zip(entries):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        for name in os.listdir(record_dir):
+            stale = os.path.join(record_dir, name)
+            if stale != path and name.endswith('.zip'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        logger.info(f"生成下载打包文件: record_id={record_id}, {len(entries)} 张图片")
+
+    def schedule(self, record_id: str) -> Future:
+        """
+        提交后台打包任务（记录变为 completed 时，或下载时还没有打包文件时调用）
+
+        Args:
+            record_id: 记录 ID
+
+        Returns:
+            后台任务
+        """
+        return self._executor.submit(self._run, record_id)
+
+    def _run(self, record_id: str) -> Optional[str]:
+        try:
+            entries = self._load_entries(record_id)
+            if not entries:
+                return None
+            return self.get_bundle(record_id, entries)
+        except Exception as e:
+            logger.warning(f"预先打包下载文件失败: record_id={record_id}, {e}")
+            return None
+
+    def invalidate(self, record_id: str) -> None:
+        """
+        删除记录的所有打包文件（图片或页面变化、记录删除时调用）
+
+        Args:
+            record_id: 记录 ID
+        """
+        record_dir = self._record_dir(record_id)
+        if os.path.isdir(record_dir):
+            with self._record_lock(record_id):
+                shutil.rmtree(record_dir, ignore_errors=True)
+
+
+_service_instance = None
+
+
+def get_download_bundle_service() -> DownloadBundleService:
+    """获取全局下载打包服务实例"""
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = DownloadBundleService()
+    return _service_instance
@@ -0,0 +1,445 @@
+"""
+批量导出任务
+
+选中的多条记录在后台打包为一个 ZIP：每条记录的图片放在以记录 ID 命名的目录下，
+根目录附带 manifest.json / manifest.csv（标题、主题、文案、标签、每页内容和对应图片）。
+打包进度保存在 history/.exports/<job_id>/ 下，每完成一条记录保存一次：
+job.json 只保存状态、已完成的记录数和写入位置，每条记录的清单条目和 ZIP 文件信息
+追加到 progress.jsonl（不随记录数增加重写整个列表）。
+服务重启或打包失败后可以从最后完成的记录继续，不必从头开始。
+几百篇笔记的导出很容易超过 4GB，超出部分由 ZipStreamWriter 自动写入 ZIP64 字段。
+"""
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from backend.services.history import get_history_service
+from backend.utils.zip_stream import ZipStreamWriter
+
+logger = logging.getLogger(__name__)
+
+# 导出任务状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+STATUS_INTERRUPTED = 'interrupted'
+
+MANIFEST_CSV_FIELDS = [
+    'record_id', 'title', 'topic', 'status', 'created_at',
+    'note_title', 'note_content', 'tags', 'page_count', 'images'
+]
+
+
+class ExportJobNotFoundError(ValueError):
+    """导出任务不存在"""
+    pass
+
+
+class ExportService:
+    """批量导出任务管理（后台单线程依次打包）"""
+
+    def __init__(self, root_dir: Optional[str] = None):
+        """
+        初始化
+
+        Args:
+            root_dir: 导出任务目录，默认为 history/.exports
+        """
+        self.root_dir = root_dir or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "history",
+            ".exports"
+        )
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        self._cancelled = set()
+        self._mark_interrupted()
+
+    # ==================== 任务状态 ====================
+
+    def _job_dir(self, job_id: str) -> str:
+        # job_id 由 uuid4 生成，拒绝其他格式，避免拼出 .exports 之外的路径
+        try:
+            job_id = str(uuid.UUID(job_id))
+        except (TypeError, ValueError):
+            raise ExportJobNotFoundError(f"导出任务不存在: {job_id}")
+        return os.path.join(self.root_dir, job_id)
+
+    def _load(self, job_id: str) -> Dict:
+        path = os.path.join(self._job_dir(job_id), 'job.json')
+        if not os.path.exists(path):
+            raise ExportJobNotFoundError(f"导出任务不存在: {job_id}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self, job: Dict) -> None:
+        """先写临时文件再重命名，中断时 job.json 不会损坏"""
+        job['updated_at'] = time.time()
+        path = os.path.join(self._job_dir(job['id']), 'job.json')
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _mark_interrupted(self) -> None:
+        """启动时把上次进程中未完成的任务标记为中断（可以恢复）"""
+        for job_id in os.listdir(self.root_dir):
+            try:
+                job = self._load(job_id)
+            except (ExportJobNotFoundError, ValueError, OSError):
+                continue
+            if job['status'] in (STATUS_PENDING, STATUS_RUNNING):
+                if self._archive_complete(job):
+                    # export.zip 已生成，只是还没来得及保存完成状态
+                    self._mark_completed(job)
+                else:
+                    job['status'] = STATUS_INTERRUPTED
+                    self._save(job)
+
+    @staticmethod
+    def _public(job: Dict) -> Dict:
+        """返回给前端的任务信息（不含打包内部状态）"""
+        return {
+            'id': job['id'],
+            'status': job['status'],
+            'total': len(job['record_ids']),
+            'completed': job['completed'],
+            'progress': round(job['completed'] / len(job['record_ids']) * 100, 1) if job['record_ids'] else 100.0,
+            'current_record_id': job.get('current_record_id'),
+            'size': job['zip']['offset'],
+            'error': job.get('error'),
+            'created_at': job['created_at'],
+            'updated_at': job['updated_at'],
+        }
+
+    # ==================== 对外接口 ====================
+
+    def create_job(self, record_ids: List[str]) -> Dict:
+        """
+        创建导出任务并提交后台打包
+
+        Args:
+            record_ids: 记录 ID 列表（按此顺序打包，重复的 ID 只打包一次）
+
+        Returns:
+            任务信息
+        """
+        job_id = str(uuid.uuid4())
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+        job = {
+            'id': job_id,
+            'status': STATUS_PENDING,
+            'record_ids': list(dict.fromkeys(record_ids)),
+            'completed': 0,
+            'zip': {'offset': 0},
+            'progress_size': 0,
+            'error': None,
+            'created_at': time.time(),
+        }
+        self._save(job)
+        self._executor.submit(self._run, job_id)
+        logger.info(f"创建导出任务: job_id={job_id}, {len(job['record_ids'])} 条记录")
+        return self._public(job)
+
+    def get_job(self, job_id: str) -> Dict:
+        """
+        获取任务进度
+
+        Args:
+            job_id: 任务 ID
+
+        Returns:
+            任务信息（status、total、completed、progress 等）
+
+        Raises:
+            ExportJobNotFoundError: 任务不存在
+        """
+        with self._lock:
+            return self._public(self._load(job_id))
+
+    def list_jobs(self) -> List[Dict]:
+        """
+        列出所有导出任务（按创建时间倒序）
+
+        Returns:
+            任务信息列表
+        """
+        jobs = []
+        for job_id in os.listdir(self.root_dir):
+            try:
+                jobs.append(self.get_job(job_id))
+            except (ExportJobNotFoundError, ValueError, OSError):
+                continue
+        return sorted(jobs, key=lambda j: j['created_at'], reverse=True)
+
+    def resume_job(self, job_id: str) -> Dict:
+        """
+        从最后完成的记录继续打包中断或失败的任务
+
+        Args:
+            job_id: 任务 ID
+
+        Returns:
+            任务信息
+
+        Raises:
+            ExportJobNotFoundError: 任务不存在
+            ValueError: 任务不处于可恢复的状态
+        """
+        with self._lock:
+            job = self._load(job_id)
+            if job['status'] not in (STATUS_FAILED, STATUS_INTERRUPTED):
+                raise ValueError(f"任务状态为 {job['status']}，只有 failed / interrupted 的任务可以恢复")
+            job['status'] = STATUS_PENDING
+            job['error'] = None
+            self._save(job)
+        self._executor.submit(self._run, job_id)
+        logger.info(f"恢复导出任务: job_id={job_id}, 已完成 {job['completed']}/{len(job['record_ids'])}")
+        return self._public(job)
+
+    def delete_job(self, job_id: str) -> None:
+        """
+        删除任务及其文件（进行中的任务在当前记录完成后停止）
+
+        Args:
+            job_id: 任务 ID
+
+        Raises:
+            ExportJobNotFoundError: 任务不存在
+        """
+        with self._lock:
+            job = self._load(job_id)
+            if job['status'] in (STATUS_PENDING, STATUS_RUNNING):
+                self._cancelled.add(job_id)
+                return
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    def get_archive_path(self, job_id: str) -> str:
+        """
+        获取已完成任务的 ZIP 路径
+
+        Args:
+            job_id: 任务 ID
+
+        Returns:
+            ZIP 文件路径
+
+        Raises:
+            ExportJobNotFoundError: 任务不存在
+            ValueError: 任务尚未完成
+        """
+        job = self._load(job_id)
+        if job['status'] != STATUS_COMPLETED:
+            raise ValueError(f"导出任务尚未完成（{job['status']}，{job['completed']}/{len(job['record_ids'])}）")
+        return os.path.join(self._job_dir(job_id), 'export.zip')
+
+    # ==================== 后台打包 ====================
+
+    def _run(self, job_id: str) -> None:
+        try:
+            self._package(job_id)
+        except Exception as e:
+            logger.error(f"导出任务失败: job_id={job_id}, {e}")
+            with self._lock:
+                try:
+                    job = self._load(job_id)
+                except ExportJobNotFoundError:
+                    return
+                job['status'] = STATUS_FAILED
+                job['error'] = str(e)
+                self._save(job)
+
+    def _package(self, job_id: str) -> None:
+        """打包剩余的记录（从 job.json 记录的位置继续写入 export.zip.part）"""
+        job_dir = self._job_dir(job_id)
+        part_path = os.path.join(job_dir, 'export.zip.part')
+        progress_path = os.path.join(job_dir, 'progress.jsonl')
+
+        with self._lock:
+            job = self._load(job_id)
+            if self._archive_complete(job):
+                # 上次在 export.zip 生成后、保存状态前中断
+                self._mark_completed(job)
+                return
+            if (self._file_shorter(part_path, job['zip']['offset'])
+                    or self._file_shorter(progress_path, job['progress_size'])):
+                # 已写入的数据丢失，无法从保存的位置继续，从头开始
+                logger.warning(f"导出任务的临时文件不完整，重新打包: job_id={job_id}")
+                job['completed'] = 0
+                job['zip'] = {'offset': 0}
+                job['progress_size'] = 0
+            job['status'] = STATUS_RUNNING
+            self._save(job)
+
+        manifest, entries = self._load_progress(progress_path, job['progress_size'])
+        writer = ZipStreamWriter(entries, job['zip']['offset'])
+        history_service = get_history_service()
+
+        with open(part_path, 'r+b' if os.path.exists(part_path) else 'wb') as f, \
+                open(progress_path, 'r+b' if os.path.exists(progress_path) else 'wb') as progress:
+            # 丢弃上次中断时写了一半的记录
+            f.truncate(writer.offset)
+            f.seek(writer.offset)
+            progress.truncate(job['progress_size'])
+            progress.seek(job['progress_size'])
+
+            for record_id in job['record_ids'][job['completed']:]:
+                if job_id in self._cancelled:
+                    self._cancelled.discard(job_id)
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                    logger.info(f"导出任务已取消: job_id={job_id}")
+                    return
+
+                job['current_record_id'] = record_id
+                entry_count = len(writer.entries)
+                item = self._write_record(f, writer, history_service, record_id)
+                manifest.append(item)
+                f.flush()
+                os.fsync(f.fileno())
+
+                progress.write(json.dumps(
+                    {'manifest': item, 'entries': writer.entries[entry_count:]}, ensure_ascii=False
+                ).encode('utf-8') + b'\n')
+                progress.flush()
+                os.fsync(progress.fileno())
+
+                job['completed'] += 1
+                job['zip'] = {'offset': writer.offset}
+                job['progress_size'] = progress.tell()
+                with self._lock:
+                    self._save(job)
+
+            f.write(writer.add_bytes(
+                json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'),
+                'manifest.json'
+            ))
+            f.write(writer.add_bytes(self._manifest_csv(manifest), 'manifest.csv'))
+            f.write(writer.finish())
+
+        os.replace(part_path, os.path.join(job_dir, 'export.zip'))
+        with self._lock:
+            job['zip'] = {'offset': writer.offset}
+            self._mark_completed(job)
+        logger.info(f"导出任务完成: job_id={job_id}, {len(job['record_ids'])} 条记录, {writer.offset} bytes")
+
+    @staticmethod
+    def _load_progress(path: str, size: int) -> Tuple[List[Dict], List[Dict]]:
+        """读取 progress.jsonl 中已完成记录的清单条目和 ZIP 文件信息（只读取前 size 字节）"""
+        manifest, entries = [], []
+        if size:
+            with open(path, 'rb') as f:
+                for line in f.read(size).splitlines():
+                    item = json.loads(line)
+                    manifest.append(item['manifest'])
+                    entries.extend(item['entries'])
+        return manifest, entries
+
+    @staticmethod
+    def _file_shorter(path: str, size: int) -> bool:
+        """文件不存在或比已保存的大小短（size 为 0 时不检查）"""
+        return size > 0 and (not os.path.exists(path) or os.path.getsize(path) < size)
+
+    def _archive_complete(self, job: Dict) -> bool:
+        """所有记录都已打包且 export.zip 已生成"""
+        return (job['completed'] == len(job['record_ids'])
+                and os.path.exists(os.path.join(self._job_dir(job['id']), 'export.zip')))
+
+    def _mark_completed(self, job: Dict) -> None:
+        """保存为已完成，并删除不再需要的进度文件"""
+        job['status'] = STATUS_COMPLETED
+        job['current_record_id'] = None
+        job['error'] = None
+        self._save(job)
+        progress_path = os.path.join(self._job_dir(job['id']), 'progress.jsonl')
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+
+    @staticmethod
+    def _write_record(f, writer: ZipStreamWriter, history_service, record_id: str) -> Dict:
+        """写入一条记录的图片，返回该记录的清单条目"""
+        record = history_service.get_record(record_id)
+        if not record:
+            return {'record_id': record_id, 'error': '记录不存在'}
+
+        outline = record.get('outline') or {}
+        metadata = outline.get('metadata') or {}
+        task_dir = os.path.join(history_service.history_dir, record_id)
+
+        pages = []
+        for display_index, page in enumerate(outline.get('pages') or [], start=1):
+            image_name = None
+            image = page.get('image')
+            if image and image.get('filename'):
+                image_path = os.path.join(task_dir, image['filename'])
+                if os.path.exists(image_path):
+                    image_name = f"{record_id}/page_{display_index}.png"
+                    for chunk in writer.add_file(image_path, image_name):
+                        f.write(chunk)
+            pages.append({
+                'index': page['index'],
+                'type': page['type'],
+                'content': page['content'],
+                'image': image_name,
+            })
+
+        return {
+            'record_id': record_id,
+            'title': record.get('title'),
+            'topic': record.get('topic'),
+            'status': record.get('status'),
+            'created_at': record.get('created_at'),
+            'note': {
+                'title': metadata.get('title'),
+                'content': metadata.get('content'),
+                'tags': metadata.get('tags'),
+            },
+            'outline': outline.get('raw'),
+            'pages': pages,
+        }
+
+    @staticmethod
+    def _manifest_csv(manifest: List[Dict]) -> bytes:
+        """生成 CSV 清单（每条记录一行，带 BOM 以便 Excel 正确识别中文）"""
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=MANIFEST_CSV_FIELDS)
+        writer.writeheader()
+        for item in manifest:
+            note = item.get('note') or {}
+            pages = item.get('pages') or []
+            writer.writerow({
+                'record_id': item['record_id'],
+                'title': item.get('title'),
+                'topic': item.get('topic'),
+                'status': item.get('status') or item.get('error'),
+                'created_at': item.get('created_at'),
+                'note_title': note.get('title'),
+                'note_content': note.get('content'),
+                'tags': note.get('tags'),
+                'page_count': len(pages),
+                'images': ';'.join(p['image'] for p in pages if p['image']),
+            })
+        return ('\ufeff' + output.getvalue()).encode('utf-8')
+
+
+_service_instance = None
+_service_lock = threading.Lock()
+
+
+def get_export_service() -> ExportService:
+    """获取全局批量导出服务实例"""
+    global _service_instance
+    if _service_instance is None:
+        with _service_lock:
+            if _service_instance is None:
+                _service_instance = ExportService()
+    return _service_instance
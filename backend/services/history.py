@@ -4,6 +4,11 @@ from datetime import datetime
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 from backend.models import RecordModel, ToneModel, OutlineModel, PageModel, ImageModel
+from backend.services.download_bundles import get_download_bundle_service
+from backend.services.janitor import get_file_janitor
+from backend.utils.dir_index import get_directory_index
+from backend.utils.image_compressor import variant_filename
+from backend.utils.thumbnail_cache import get_thumbnail_cache
 
 
 class HistoryService:
@@ -201,6 +206,12 @@ class HistoryService:
                         for page_id in pages_to_delete:
                             PageModel.delete_by_id(page_id)
         
+        # 页面或图片可能已变化，删除旧的下载打包文件；记录完成时在后台重新打包
+        bundles = get_download_bundle_service()
+        bundles.invalidate(record_id)
+        if status == 'completed':
+            bundles.schedule(record_id)
+        
         return True
 
     def delete_record(self, record_id: str) -> bool:
@@ -223,47 +234,53 @@ class HistoryService:
         # 删除数据库记录（级联删除）
         RecordModel.delete(record_id)
         
-        # 删除图片文件
-        # 注意：图片存储在 history/{record_id}/ 目录下
-        # 图片文件名格式：{record_id}_{timestamp}_{random}.png
+        # 清除内存中缓存的缩略图
+        get_thumbnail_cache().invalidate_record(record_id)
+        
+        # 文件交给后台删除，接口立即返回：
+        # 记录目录（history/{record_id}/，包含原图、缩略图和副本）整体删除，
+        # 只有旧版 task_* 目录中的图片需要逐个删除（images.path 已在数据库迁移时按实际位置填写）
+        record_dir = os.path.join(self.history_dir, record_id)
+        paths = [record_dir]
         for img in images:
-            # 删除原图
-            img_path = self._find_image_path(img['filename'])
-            if img_path and os.path.exists(img_path):
-                try:
-                    os.remove(img_path)
-                except Exception as e:
-                    print(f"删除图片失败: {img_path}, {e}")
+            img_path = self._resolve_image_path(img)
+            if os.path.dirname(img_path) == record_dir:
+                continue
+            image_dir = os.path.dirname(img_path)
+            paths.append(img_path)
             
-            # 删除缩略图
+            # 缩略图（包括 WebP / AVIF 副本）
             if img['thumbnail_filename']:
-                thumb_path = self._find_image_path(img['thumbnail_filename'])
-                if thumb_path and os.path.exists(thumb_path):
-                    try:
-                        os.remove(thumb_path)
-                    except Exception as e:
-                        print(f"删除缩略图失败: {thumb_path}, {e}")
+                paths.append(os.path.join(image_dir, img['thumbnail_filename']))
+                paths.extend(
+                    os.path.join(image_dir, variant_filename(img['thumbnail_filename'], image_format))
+                    for image_format in ('WEBP', 'AVIF')
+                )
+            
+            # 多尺寸副本（路径相对于原图所在目录）
+            paths.extend(
+                os.path.join(image_dir, rendition['filename'])
+                for rendition in ImageModel.parse_renditions(img)
+            )
+        get_file_janitor().submit(paths)
+        
+        # 删除预先打包的下载文件
+        get_download_bundle_service().invalidate(record_id)
         
         return True
 
-    def _find_image_path(self, filename: str) -> Optional[str]:
+    def _resolve_image_path(self, img: Dict) -> str:
         """
-        在 history 目录中查找图片文件
+        获取图片原图的完整路径（按 images.path 定位，不检查文件是否存在）
         
         Args:
-            filename: 文件名
+            img: 图片数据（images 表的一行）
             
         Returns:
             完整路径
         """
-        # 遍历 history 目录下的所有 task_ 文件夹
-        for item in os.listdir(self.history_dir):
-            if item.startswith('task_'):
-                task_dir = os.path.join(self.history_dir, item)
-                img_path = os.path.join(task_dir, filename)
-                if os.path.exists(img_path):
-                    return img_path
-        return None
+        relative_path = img.get('path') or f"{img['record_id']}/{img['filename']}"
+        return os.path.join(self.history_dir, *relative_path.split('/'))
 
     def list_records(
         self,
@@ -329,39 +346,49 @@ class HistoryService:
             扫描结果
         """
         task_dir = os.path.join(self.history_dir, record_id)
-
-        if not os.path.exists(task_dir) or not os.path.isdir(task_dir):
-            return {
-                "success": False,
-                "error": f"任务目录不存在: {record_id}"
-            }
-
         try:
-            # 扫描目录下所有图片文件（排除缩略图）
-            image_files = []
-            for filename in os.listdir(task_dir):
-                # 跳过缩略图文件（以 thumb_ 开头）
-                if filename.startswith('thumb_'):
-                    continue
-                if filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                    image_files.append(filename)
-
-            # 按文件名排序
-            image_files.sort()
-
+            entries = get_directory_index().scandir(task_dir)
+        except Exception as e:
             return {
-                "success": True,
-                "record_id": record_id,
-                "images_count": len(image_files),
-                "images": image_files
+                "success": False,
+                "error": f"扫描任务失败: {str(e)}"
             }
+        return self._task_images_result(record_id, entries)
 
-        except Exception as e:
+    @staticmethod
+    def _task_images_result(record_id: str, entries: Optional[List]) -> Dict[str, Any]:
+        """
+        根据任务目录的目录项生成扫描结果
+        
+        Args:
+            record_id: 记录ID
+            entries: 目录项 [(名称, 是否为目录)]，目录不存在时为 None
+            
+        Returns:
+            扫描结果
+        """
+        if entries is None:
             return {
                 "success": False,
-                "error": f"扫描任务失败: {str(e)}"
+                "error": f"任务目录不存在: {record_id}"
             }
 
+        # 目录下所有图片文件（排除缩略图），按文件名排序
+        image_files = []
+        for filename, is_dir in entries:
+            # 跳过缩略图文件（以 thumb_ 开头）
+            if is_dir or filename.startswith('thumb_'):
+                continue
+            if filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg'):
+                image_files.append(filename)
+
+        return {
+            "success": True,
+            "record_id": record_id,
+            "images_count": len(image_files),
+            "images": image_files
+        }
+
     def scan_all_tasks(self) -> Dict[str, Any]:
         """
         扫描所有任务文件夹，同步图片列表（兼容迁移前的数据）
@@ -380,19 +407,21 @@ class HistoryService:
             failed_count = 0
             results = []
 
-            # 遍历 history 目录
-            for item in os.listdir(self.history_dir):
-                item_path = os.path.join(self.history_dir, item)
-
-                # 只处理目录（任务文件夹）
-                if not os.path.isdir(item_path):
-                    continue
-
-                # 假设任务文件夹名就是 record_id
-                record_id = item
+            # 只处理目录（任务文件夹），跳过 .references 等内部目录；
+            # 假设任务文件夹名就是 record_id
+            index = get_directory_index()
+            record_ids = [
+                item for item, is_dir in index.scandir(self.history_dir) or []
+                if is_dir and not item.startswith('.')
+            ]
 
-                # 扫描并同步
-                result = self.scan_and_sync_task_images(record_id)
+            # 只重新读取修改时间变化的目录，其余使用索引中的文件列表
+            task_entries = index.scandir_many(
+                os.path.join(self.history_dir, record_id) for record_id in record_ids
+            )
+            for record_id in record_ids:
+                entries = task_entries[os.path.join(self.history_dir, record_id)]
+                result = self._task_images_result(record_id, entries)
                 results.append(result)
 
                 if result.get("success"):
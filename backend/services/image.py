@@ -1,16 +1,22 @@
 """图片生成服务"""
+import hashlib
 import logging
 import os
 import uuid
 import time
 import random
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, Any, Generator, List, Optional, Tuple
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Dict, Any, Generator, Iterator, List, Optional, Tuple
 from backend.config import Config
-from backend.generators.factory import ImageGeneratorFactory
-from backend.utils.image_compressor import compress_image
+from backend.generators.pool import ImageProviderPool
+from backend.generators.errors import CircuitOpenError
+from backend.utils.dir_index import get_directory_index
+from backend.utils.image_compressor import compress_image, compress_image_formats, compress_images, variant_filename
 from backend.models import ToneModel, OutlineModel, PageModel, ImageModel, RecordModel
+from backend.services.renditions import get_rendition_service
+from backend.services.download_bundles import get_download_bundle_service
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +28,12 @@ class ImageService:
     MAX_CONCURRENT = 15  # 最大并发数
     AUTO_RETRY_COUNT = 3  # 自动重试次数
 
+    # 缩略图配置
+    THUMBNAIL_MAX_KB = 50
+    THUMBNAIL_MAX_DIMENSION = 1080  # 历史记录网格中显示，不需要原图分辨率
+    # 额外保存的缩略图格式及其相对 JPEG 缩略图的体积（与 JPEG 缩略图 PSNR 相当时的体积比），按 Accept 协商返回
+    THUMBNAIL_VARIANT_BUDGETS = {'AVIF': 0.45, 'WEBP': 0.55}
+
     # 任务停止标志
     _stop_flags: Dict[str, bool] = {}
 
@@ -40,11 +52,22 @@ class ImageService:
 
         logger.info(f"使用图片服务商: {provider_name}")
         provider_config = Config.get_image_provider_config(provider_name)
-
-        # 创建生成器实例
         provider_type = provider_config.get('type', provider_name)
-        logger.debug(f"创建生成器: type={provider_type}")
-        self.generator = ImageGeneratorFactory.create(provider_type, provider_config)
+
+        # 创建服务商池（主服务商 + provider_pool 中的备用服务商）
+        pool_providers = [(provider_name, provider_config)]
+        for backup_name in Config.get_image_provider_pool(provider_name)[1:]:
+            try:
+                pool_providers.append((backup_name, Config.get_image_provider_config(backup_name)))
+            except ValueError as e:
+                logger.warning(f"⚠️ 备用图片服务商 [{backup_name}] 配置无效，已跳过: {e}")
+        logger.debug(f"创建生成器: type={provider_type}, pool={[name for name, _ in pool_providers]}")
+        self.provider_pool = ImageProviderPool(
+            pool_providers,
+            Config.get_image_hedge_config(),
+            Config.get_image_circuit_breaker_config()
+        )
+        self.generator = self.provider_pool.primary.generator
 
         # 保存配置信息
         self.provider_name = provider_name
@@ -129,19 +152,34 @@ class ImageService:
         with open(filepath, "wb") as f:
             f.write(image_data)
 
-        # 生成缩略图（50KB左右）
-        thumbnail_data = compress_image(image_data, max_size_kb=50)
+        # 生成缩略图（50KB左右）及 WebP / AVIF 副本（原图只解码一次）
+        thumbnails = compress_image_formats(
+            image_data,
+            max_size_kb=self.THUMBNAIL_MAX_KB,
+            max_dimension=self.THUMBNAIL_MAX_DIMENSION,
+            variant_budgets=self.THUMBNAIL_VARIANT_BUDGETS
+        )
         thumbnail_path = os.path.join(task_dir, thumbnail_filename)
         with open(thumbnail_path, "wb") as f:
-            f.write(thumbnail_data)
+            f.write(thumbnails.pop('JPEG'))
+        self._save_thumbnail_variants(thumbnails, thumbnail_path)
         
         # 保存到数据库
         image_id = ImageModel.create(
             record_id=record_id,
             filename=filename,
-            thumbnail_filename=thumbnail_filename
+            thumbnail_filename=thumbnail_filename,
+            file_size=len(image_data),
+            sha256=hashlib.sha256(image_data).hexdigest(),
+            path=os.path.relpath(filepath, self.history_root_dir).replace(os.sep, '/')
         )
         logger.debug(f"创建图片记录: image_id={image_id}, filename={filename}")
+
+        # 后台生成多尺寸副本（320/640/1080 等），不阻塞生成流程
+        get_rendition_service().schedule(image_id, filepath)
+
+        # 图片变化后旧的下载打包文件不再有效
+        get_download_bundle_service().invalidate(record_id)
         
         # 更新 page 的 image_id（直接使用 page_id）
         if page_id:
@@ -161,6 +199,114 @@ class ImageService:
 
         return filepath, filename, image_id
 
+    def _save_thumbnail_variants(self, variants: Dict[str, bytes], thumbnail_path: str):
+        """
+        保存 WebP / AVIF 格式的缩略图副本（失败不影响主流程）
+
+        Args:
+            variants: 格式 -> 缩略图数据（原图足够小、缩略图就是原图时为空）
+            thumbnail_path: JPEG 缩略图路径
+        """
+        for image_format, variant_data in variants.items():
+            try:
+                with open(variant_filename(thumbnail_path, image_format), "wb") as f:
+                    f.write(variant_data)
+            except Exception as e:
+                logger.warning(f"保存 {image_format} 缩略图失败: {e}")
+
+    def _build_prompt(
+        self,
+        page: Dict,
+        full_outline: str = "",
+        user_topic: str = "",
+        tone: Optional[str] = None
+    ) -> str:
+        """
+        根据配置选择模板（短 prompt 或完整 prompt）构建页面提示词
+
+        Args:
+            page: 页面数据
+            full_outline: 完整的大纲文本
+            user_topic: 用户原始输入
+            tone: 内容基调
+
+        Returns:
+            提示词
+        """
+        page_type = page["type"]
+        page_content = page["content"]
+
+        if self.use_short_prompt and self.prompt_template_short:
+            # 短 prompt 模式：只包含页面类型和内容
+            prompt = self.prompt_template_short.format(
+                page_content=page_content,
+                page_type=page_type
+            )
+            logger.debug(f"  使用短 prompt 模式 ({len(prompt)} 字符)")
+            return prompt
+
+        # 完整 prompt 模式：包含基调、大纲和用户需求
+        return self.prompt_template.format(
+            tone=tone if tone else "未提供内容基调，请使用通用小红书风格",
+            page_content=page_content,
+            page_type=page_type,
+            full_outline=full_outline,
+            user_topic=user_topic if user_topic else "未提供"
+        )
+
+    def _generate_page_batch(
+        self,
+        pages: List[Dict],
+        record_id: str,
+        reference_image: Optional[bytes] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        tone: Optional[str] = None
+    ) -> List[Tuple[int, bool, Optional[str], Optional[str]]]:
+        """
+        批量生成共用同一参考图的多个页面（一次请求生成多张）
+
+        批量请求失败时退回逐张生成（带自动重试和故障转移）
+
+        Args:
+            pages: 页面列表
+            record_id: 记录ID
+            reference_image: 所有页面共用的参考图片
+            full_outline: 完整的大纲文本
+            user_images: 用户上传的参考图片列表
+            user_topic: 用户原始输入
+            tone: 内容基调
+
+        Returns:
+            每个页面的 (page_id, success, filename, error_message)，顺序与 pages 一致
+        """
+        page_ids = [page.get("id") for page in pages]
+        results: Dict[int, Tuple[int, bool, Optional[str], Optional[str]]] = {}
+
+        if len(pages) > 1 and all(page_ids):
+            try:
+                prompts = [self._build_prompt(page, full_outline, user_topic, tone) for page in pages]
+                images = self.provider_pool.generate_images_batch(
+                    prompts,
+                    reference_image=reference_image,
+                    user_images=user_images,
+                )
+                for page_id, image_data in zip(page_ids, images):
+                    _, filename, _ = self._save_image(image_data, record_id, page_id, self.current_task_dir)
+                    results[page_id] = (page_id, True, filename, None)
+                logger.info(f"✅ 批量生成 {len(results)} 张图片成功: page_ids={page_ids}")
+            except Exception as e:
+                logger.warning(f"批量生成失败，剩余页面改为逐张生成: {str(e)[:200]}")
+
+        # 未在批量请求中完成的页面逐张生成
+        return [
+            results.get(page.get("id")) or self._generate_single_image(
+                page, record_id, reference_image, 0, full_outline, user_images, user_topic, tone
+            )
+            for page in pages
+        ]
+
     def _generate_single_image(
         self,
         page: Dict,
@@ -170,7 +316,8 @@ class ImageService:
         full_outline: str = "",
         user_images: Optional[List[bytes]] = None,
         user_topic: str = "",
-        tone: Optional[str] = None
+        tone: Optional[str] = None,
+        task_dir: Optional[str] = None
     ) -> Tuple[int, bool, Optional[str], Optional[str]]:
         """
         生成单张图片（带自动重试）
@@ -183,6 +330,8 @@ class ImageService:
             full_outline: 完整的大纲文本
             user_images: 用户上传的参考图片列表
             user_topic: 用户原始输入
+            tone: 内容基调
+            task_dir: 任务目录（为 None 时使用当前任务目录）
 
         Returns:
             (page_id, success, filename, error_message)
@@ -194,7 +343,6 @@ class ImageService:
             return (None, False, None, error_msg)
         
         page_type = page["type"]
-        page_content = page["content"]
 
         max_retries = self.AUTO_RETRY_COUNT
 
@@ -202,64 +350,17 @@ class ImageService:
             try:
                 logger.debug(f"生成图片 [page_id={page_id}]: type={page_type}, attempt={attempt + 1}/{max_retries}")
 
-                # 根据配置选择模板（短 prompt 或完整 prompt）
-                if self.use_short_prompt and self.prompt_template_short:
-                    # 短 prompt 模式：只包含页面类型和内容
-                    prompt = self.prompt_template_short.format(
-                        page_content=page_content,
-                        page_type=page_type
-                    )
-                    logger.debug(f"  使用短 prompt 模式 ({len(prompt)} 字符)")
-                else:
-                    # 完整 prompt 模式：包含基调、大纲和用户需求
-                    prompt = self.prompt_template.format(
-                        tone=tone if tone else "未提供内容基调，请使用通用小红书风格",
-                        page_content=page_content,
-                        page_type=page_type,
-                        full_outline=full_outline,
-                        user_topic=user_topic if user_topic else "未提供"
-                    )
+                prompt = self._build_prompt(page, full_outline, user_topic, tone)
 
-                # 调用生成器生成图片
-                if self.provider_config.get('type') == 'google_genai':
-                    logger.debug(f"  使用 Google GenAI 生成器")
-                    image_data = self.generator.generate_image(
-                        prompt=prompt,
-                        aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                        temperature=self.provider_config.get('temperature', 1.0),
-                        model=self.provider_config.get('model', 'gemini-3-pro-image-preview'),
-                        reference_image=reference_image,
-                    )
-                elif self.provider_config.get('type') == 'image_api':
-                    logger.debug(f"  使用 Image API 生成器")
-                    # Image API 支持多张参考图片
-                    # 根据参考图模式组合参考图片
-                    reference_images = []
-                    # 如果提供了 reference_image，使用它（cover 或 previous 模式）
-                    if reference_image:
-                        reference_images.append(reference_image)
-                    # 如果提供了 user_images，也添加它们（custom 模式或作为补充）
-                    if user_images:
-                        reference_images.extend(user_images)
-
-                    image_data = self.generator.generate_image(
-                        prompt=prompt,
-                        aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                        temperature=self.provider_config.get('temperature', 1.0),
-                        model=self.provider_config.get('model', 'nano-banana-2'),
-                        reference_images=reference_images if reference_images else None,
-                    )
-                else:
-                    logger.debug(f"  使用 OpenAI 兼容生成器")
-                    image_data = self.generator.generate_image(
-                        prompt=prompt,
-                        size=self.provider_config.get('default_size', '1024x1024'),
-                        model=self.provider_config.get('model'),
-                        quality=self.provider_config.get('quality', 'standard'),
-                    )
+                # 调用服务商池生成图片（失败时自动切换备用服务商）
+                image_data = self.provider_pool.generate_image(
+                    prompt=prompt,
+                    reference_image=reference_image,
+                    user_images=user_images,
+                )
 
-                # 保存图片（使用当前任务目录）并写入数据库
-                filepath, filename, image_id = self._save_image(image_data, record_id, page_id, self.current_task_dir)
+                # 保存图片并写入数据库
+                filepath, filename, image_id = self._save_image(image_data, record_id, page_id, task_dir or self.current_task_dir)
                 logger.info(f"✅ 图片 [page_id={page_id}] 生成成功: {filename}, image_id={image_id}")
 
                 return (page_id, True, filename, None)
@@ -268,6 +369,11 @@ class ImageService:
                 error_msg = str(e)
                 logger.warning(f"图片 [page_id={page_id}] 生成失败 (尝试 {attempt + 1}/{max_retries}): {error_msg[:200]}")
 
+                if isinstance(e, CircuitOpenError):
+                    # 所有服务商均已熔断，重试只会继续被拒绝，直接返回
+                    logger.error(f"❌ 图片 [page_id={page_id}] 生成失败，服务商已熔断")
+                    return (page_id, False, None, error_msg)
+
                 if attempt < max_retries - 1:
                     # 等待后重试
                     wait_time = 2 ** attempt
@@ -326,7 +432,7 @@ class ImageService:
         # 压缩用户上传的参考图到200KB以内（减少内存和传输开销）
         compressed_user_images = None
         if user_images:
-            compressed_user_images = [compress_image(img, max_size_kb=200) for img in user_images]
+            compressed_user_images = compress_images(user_images, max_size_kb=200)
 
         # 初始化任务状态
         self._task_states[record_id] = {
@@ -430,7 +536,109 @@ class ImageService:
             # 检查是否启用高并发模式
             high_concurrency = self.provider_config.get('high_concurrency', False)
 
-            if high_concurrency:
+            # 主服务商支持一次请求生成多张时，共用同一参考图的页面（cover/custom 模式）合并请求
+            batch_size = self.provider_pool.batch_size
+
+            if batch_size > 1 and reference_mode in ('cover', 'custom'):
+                if reference_mode == 'custom':
+                    batch_reference = compressed_user_images[0] if compressed_user_images else None
+                    batch_user_images = compressed_user_images
+                else:
+                    batch_reference = cover_image_data
+                    batch_user_images = None
+
+                batches = [other_pages[i:i + batch_size] for i in range(0, len(other_pages), batch_size)]
+                yield {
+                    "event": "progress",
+                    "data": {
+                        "status": "batch_start",
+                        "message": f"开始批量生成 {len(other_pages)} 页内容（{len(batches)} 个请求）...",
+                        "current": len(generated_images),
+                        "total": total,
+                        "phase": "content",
+                        "record_id": record_id
+                    }
+                }
+
+                with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT if high_concurrency else 1) as executor:
+                    future_to_batch = {
+                        executor.submit(
+                            self._generate_page_batch,
+                            batch,
+                            record_id,
+                            batch_reference,
+                            full_outline,
+                            batch_user_images,
+                            user_topic,
+                            tone
+                        ): batch
+                        for batch in batches
+                    }
+
+                    for page in other_pages:
+                        yield {
+                            "event": "progress",
+                            "data": {
+                                "page_id": page.get("id"),
+                                "status": "generating",
+                                "current": len(generated_images) + 1,
+                                "total": total,
+                                "phase": "content"
+                            }
+                        }
+
+                    for future in as_completed(future_to_batch):
+                        if self.is_task_stopped(record_id):
+                            for f in future_to_batch:
+                                f.cancel()
+                            yield {
+                                "event": "stopped",
+                                "data": {
+                                    "record_id": record_id,
+                                    "message": "生成已停止",
+                                    "completed": len(generated_images),
+                                    "pending": total - len(generated_images)
+                                }
+                            }
+                            return
+
+                        batch = future_to_batch[future]
+                        try:
+                            batch_results = future.result()
+                        except Exception as e:
+                            batch_results = [(page.get("id"), False, None, str(e)) for page in batch]
+
+                        for page, (page_id, success, filename, error) in zip(batch, batch_results):
+                            if success:
+                                generated_images.append(filename)
+                                self._task_states[record_id]["generated"][page_id] = filename
+
+                                yield {
+                                    "event": "complete",
+                                    "data": {
+                                        "page_id": page_id,
+                                        "status": "done",
+                                        "image_url": f"/api/images/{record_id}/{filename}",
+                                        "phase": "content"
+                                    }
+                                }
+                            else:
+                                failed_pages.append(page)
+                                if page_id:
+                                    self._task_states[record_id]["failed"][page_id] = error
+
+                                yield {
+                                    "event": "error",
+                                    "data": {
+                                        "page_id": page_id,
+                                        "status": "error",
+                                        "message": error,
+                                        "retryable": True,
+                                        "phase": "content"
+                                    }
+                                }
+
+            elif high_concurrency:
                 # 高并发模式：并行生成
                 yield {
                     "event": "progress",
@@ -687,6 +895,246 @@ class ImageService:
             }
         }
 
+    def generate_images_from_outline_stream(
+        self,
+        outline_events: Iterator[Dict[str, Any]],
+        record_id: str,
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        reference_mode: str = "cover",
+        tone: Optional[str] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        边生成大纲边生成图片（生成器，支持 SSE 流式返回）
+
+        outline_events 中的大纲事件原样转发（complete/error 改名为 outline_complete/outline_error，
+        与图片事件区分）；每收到一个 page 事件立即提交该页的图片任务。
+        第一页作为封面优先生成，cover 模式下其他页面等封面完成后再以封面为参考生成。
+        页面提示词中的完整大纲使用提交时已生成的大纲文本。
+
+        Args:
+            outline_events: OutlineService.generate_outline_stream 产生的事件
+            record_id: 记录 ID
+            user_images: 用户上传的参考图片列表（可选）
+            user_topic: 用户原始输入
+            reference_mode: 参考图模式 (cover/custom)，previous 模式按 cover 处理
+            tone: 内容基调（生成中的大纲和基调在完成前查询不到，需要由调用方传入；为 None 时从记录读取）
+
+        Yields:
+            大纲事件和图片进度事件字典
+        """
+        logger.info(f"开始流水线图片生成: record_id={record_id}, reference_mode={reference_mode}")
+
+        # 页面任务在后台线程中运行，使用局部变量，不受其他任务修改 current_task_dir 的影响
+        task_dir = os.path.join(self.history_root_dir, record_id)
+        os.makedirs(task_dir, exist_ok=True)
+        self.current_task_dir = task_dir
+
+        compressed_user_images = None
+        if user_images:
+            compressed_user_images = compress_images(user_images, max_size_kb=200)
+
+        task_state = {
+            "pages": [],
+            "generated": {},
+            "failed": {},
+            "cover_image": None,
+            "full_outline": "",
+            "user_images": compressed_user_images,
+            "user_topic": user_topic
+        }
+        self._task_states[record_id] = task_state
+
+        high_concurrency = self.provider_config.get('high_concurrency', False)
+        executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT if high_concurrency else 1)
+        events: "queue.Queue" = queue.Queue()
+        outline_done = object()
+        # 调用方停止读取（客户端断开）时设置，大纲线程和页面任务不再继续
+        stop = threading.Event()
+
+        cover_ready = threading.Event()
+        futures = []
+        outline_parts: List[str] = []
+        context = {"tone": tone, "tone_loaded": tone is not None}
+        page_results = {"generated": [], "failed": []}
+
+        def run_page(page: Dict, is_cover: bool):
+            """单页图片任务（在线程池中执行）"""
+            page_id = page.get("id")
+            try:
+                if stop.is_set() or self.is_task_stopped(record_id):
+                    return
+
+                if is_cover:
+                    reference_image = None
+                    page_user_images = compressed_user_images
+                elif reference_mode == 'custom':
+                    reference_image = compressed_user_images[0] if compressed_user_images else None
+                    page_user_images = compressed_user_images
+                else:
+                    cover_ready.wait()
+                    if stop.is_set():
+                        return
+                    reference_image = task_state["cover_image"]
+                    page_user_images = None
+
+                phase = "cover" if is_cover else "content"
+                events.put({
+                    "event": "progress",
+                    "data": {
+                        "page_id": page_id,
+                        "status": "generating",
+                        "phase": phase,
+                        "record_id": record_id
+                    }
+                })
+
+                page_id, success, filename, error = self._generate_single_image(
+                    page, record_id, reference_image, 0, task_state["full_outline"],
+                    page_user_images, user_topic, context["tone"], task_dir
+                )
+
+                if success:
+                    task_state["generated"][page_id] = filename
+                    page_results["generated"].append(filename)
+                    if is_cover:
+                        with open(os.path.join(task_dir, filename), "rb") as f:
+                            task_state["cover_image"] = compress_image(f.read(), max_size_kb=200)
+                    events.put({
+                        "event": "complete",
+                        "data": {
+                            "page_id": page_id,
+                            "status": "done",
+                            "image_url": f"/api/images/{record_id}/{filename}",
+                            "phase": phase
+                        }
+                    })
+                else:
+                    task_state["failed"][page_id] = error
+                    page_results["failed"].append(page_id)
+                    events.put({
+                        "event": "error",
+                        "data": {
+                            "page_id": page_id,
+                            "status": "error",
+                            "message": error,
+                            "retryable": True,
+                            "phase": phase
+                        }
+                    })
+            except Exception as e:
+                logger.error(f"流水线图片任务异常 [page_id={page_id}]: {e}")
+                task_state["failed"][page_id] = str(e)
+                page_results["failed"].append(page_id)
+                events.put({
+                    "event": "error",
+                    "data": {
+                        "page_id": page_id,
+                        "status": "error",
+                        "message": str(e),
+                        "retryable": True,
+                        "phase": "cover" if is_cover else "content"
+                    }
+                })
+            finally:
+                if is_cover:
+                    cover_ready.set()
+
+        def consume_outline():
+            """在后台线程中消费大纲事件，页面一出现就提交图片任务"""
+            try:
+                for event in outline_events:
+                    if stop.is_set():
+                        break
+                    event_type = event["event"]
+                    event_data = event["data"]
+                    # 大纲的 complete/error 与图片事件同名，转发时加前缀区分
+                    if event_type in ("complete", "error"):
+                        events.put({"event": f"outline_{event_type}", "data": event_data})
+                    else:
+                        events.put(event)
+
+                    if event_type == "text":
+                        outline_parts.append(event_data.get("delta", ""))
+                    elif event_type == "page":
+                        page = event_data["page"]
+                        if not context["tone_loaded"]:
+                            # 基调在大纲开始写入时已保存，第一页出现时再读取
+                            context["tone"] = self._load_tone_from_record(record_id)
+                            context["tone_loaded"] = True
+                        is_cover = len(task_state["pages"]) == 0
+                        task_state["pages"].append(page)
+                        task_state["full_outline"] = "".join(outline_parts)
+                        futures.append(executor.submit(run_page, page, is_cover))
+                    elif event_type == "complete":
+                        task_state["full_outline"] = event_data.get("outline", "")
+            except Exception as e:
+                logger.error(f"流水线大纲生成异常: {e}")
+                events.put({
+                    "event": "outline_error",
+                    "data": {"success": False, "record_id": record_id, "error": str(e)}
+                })
+            finally:
+                # 没有任何页面时也要释放等待封面的任务
+                if not task_state["pages"] or stop.is_set():
+                    cover_ready.set()
+                if stop.is_set():
+                    # 未完成的大纲关闭时会撤销并删除页面，先等进行中的页面任务结束，
+                    # 避免它们在页面删除后继续写入图片
+                    wait(futures)
+                # 在本线程中关闭大纲生成器（生成器不能由其他线程关闭）
+                close = getattr(outline_events, "close", None)
+                if close:
+                    close()
+                events.put(outline_done)
+
+        consumer = threading.Thread(target=consume_outline, name=f"outline-{record_id}", daemon=True)
+        consumer.start()
+
+        try:
+            outline_finished = False
+            while True:
+                if outline_finished and all(f.done() for f in futures) and events.empty():
+                    break
+                try:
+                    event = events.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if event is outline_done:
+                    outline_finished = True
+                    continue
+                yield event
+        finally:
+            # 客户端断开时生成器在这里被关闭：通知大纲线程停止，取消尚未开始的页面任务，
+            # 大纲线程等进行中的任务结束后再关闭大纲生成（不阻塞当前请求线程）
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.is_task_stopped(record_id):
+            yield {
+                "event": "stopped",
+                "data": {
+                    "record_id": record_id,
+                    "message": "生成已停止",
+                    "completed": len(page_results["generated"]),
+                    "pending": len(task_state["pages"]) - len(page_results["generated"]) - len(page_results["failed"])
+                }
+            }
+            return
+
+        yield {
+            "event": "finish",
+            "data": {
+                "success": len(task_state["pages"]) > 0 and len(page_results["failed"]) == 0,
+                "record_id": record_id,
+                "images": page_results["generated"],
+                "total": len(task_state["pages"]),
+                "completed": len(page_results["generated"]),
+                "failed": len(page_results["failed"]),
+                "failed_page_ids": [page_id for page_id in page_results["failed"] if page_id]
+            }
+        }
+
     def _get_reference_image_by_mode(
         self,
         record_id: str,
@@ -761,7 +1209,8 @@ class ImageService:
         use_reference: bool = True,
         full_outline: str = "",
         user_topic: str = "",
-        reference_mode: str = "cover"
+        reference_mode: str = "cover",
+        user_images: Optional[List[bytes]] = None
     ) -> Dict[str, Any]:
         """
         重试生成单张图片
@@ -773,6 +1222,7 @@ class ImageService:
             full_outline: 完整大纲文本（从前端传入）
             user_topic: 用户原始输入（从前端传入）
             reference_mode: 参考图模式（'custom' | 'cover' | 'previous'）
+            user_images: 用户参考图片列表（已压缩，可选，优先于任务状态中的参考图）
 
         Returns:
             生成结果
@@ -781,6 +1231,7 @@ class ImageService:
         os.makedirs(self.current_task_dir, exist_ok=True)
 
         reference_image = None
+        provided_user_images = user_images
         user_images = None
         task_state = None
 
@@ -797,6 +1248,10 @@ class ImageService:
                 user_topic = task_state.get("user_topic", "")
             user_images = task_state.get("user_images")
 
+        if provided_user_images:
+            user_images = provided_user_images
+            task_state = {**(task_state or {}), "user_images": provided_user_images}
+
         # 根据模式获取参考图
         if use_reference:
             reference_image = self._get_reference_image_by_mode(
@@ -954,7 +1409,8 @@ class ImageService:
         use_reference: bool = True,
         full_outline: str = "",
         user_topic: str = "",
-        reference_mode: str = "cover"
+        reference_mode: str = "cover",
+        user_images: Optional[List[bytes]] = None
     ) -> Dict[str, Any]:
         """
         重新生成图片（用户手动触发，即使成功的也可以重新生成）
@@ -966,6 +1422,7 @@ class ImageService:
             full_outline: 完整大纲文本
             user_topic: 用户原始输入
             reference_mode: 参考图模式（'custom' | 'cover' | 'previous'）
+            user_images: 用户参考图片列表（已压缩，可选）
 
         Returns:
             生成结果
@@ -974,7 +1431,8 @@ class ImageService:
             record_id, page, use_reference,
             full_outline=full_outline,
             user_topic=user_topic,
-            reference_mode=reference_mode
+            reference_mode=reference_mode,
+            user_images=user_images
         )
 
     def get_image_path(self, record_id: str, filename: str) -> str:
@@ -1096,7 +1554,7 @@ class ImageService:
         # 压缩用户上传的参考图
         compressed_user_images = None
         if user_images:
-            compressed_user_images = [compress_image(img, max_size_kb=200) for img in user_images]
+            compressed_user_images = compress_images(user_images, max_size_kb=200)
 
         # 生成图片
         page_id_result, success, filename, error = self._generate_single_image(
@@ -1216,11 +1674,10 @@ class ImageService:
             已生成的图片索引集合
         """
         task_dir = os.path.join(self.history_root_dir, record_id)
-        if not os.path.exists(task_dir):
-            return set()
 
+        # 目录未变化时直接使用索引中的文件列表（目录不存在时为空）
         generated_indices = set()
-        for filename in os.listdir(task_dir):
+        for filename in get_directory_index().listdir(task_dir):
             # 跳过非图片文件和缩略图
             if filename.startswith('thumb_') or filename == 'outline.json':
                 continue
@@ -1620,4 +2077,7 @@ def get_image_service() -> ImageService:
 def reset_image_service():
     """重置全局服务实例（配置更新后调用）"""
     global _service_instance
+    if _service_instance is not None:
+        # 旧服务商池的对冲线程池不再使用，关闭以免线程泄漏
+        _service_instance.provider_pool.shutdown()
     _service_instance = None
@@ -0,0 +1,239 @@
+"""
+后台回收已删除记录的文件
+
+删除记录时逐个删除原图、缩略图和副本会让请求耗时随图片数量增长，
+并且会留下空的 history/<record_id> 目录。
+删除接口只删除数据库记录，文件路径交给后台线程批量删除：
+- 记录自己的目录整体删除，不再逐个删除文件
+- 删除失败（文件被占用、权限问题等）时延迟重试
+- 等待删除的路径保存在 SQLite（pending_deletes 表），服务重启后继续删除，
+  不会因为数据库记录已删除而永远留在磁盘上
+- 统计回收的字节数，可通过 GET /api/history/stats 查看
+"""
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _path_size(path: str) -> int:
+    """文件或目录占用的字节数（不存在时为 0）"""
+    try:
+        if not os.path.isdir(path) or os.path.islink(path):
+            return os.lstat(path).st_size
+    except OSError:
+        return 0
+
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class FileJanitor:
+    """后台批量删除文件和目录（单个工作线程）"""
+
+    # 每批最多处理的路径数
+    BATCH_SIZE = 64
+    # 最多尝试次数
+    MAX_ATTEMPTS = 5
+    # 第 n 次失败后等待 n * RETRY_DELAY 秒再重试
+    RETRY_DELAY = 5.0
+
+    def __init__(self, root_dir: Optional[str] = None, persist: bool = True):
+        """
+        初始化
+
+        Args:
+            root_dir: 允许删除的根目录，默认为 history 目录
+            persist: 是否把等待删除的路径保存到数据库
+        """
+        self.root_dir = os.path.realpath(root_dir or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "history"
+        ))
+        self.persist = persist
+        self._queue: "queue.Queue[Tuple[str, int]]" = queue.Queue()
+        self._retries: List[Tuple[float, str, int]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._removed = 0
+        self._reclaimed_bytes = 0
+        self._failed = 0
+        self._busy = 0
+
+    def _key(self, path: str) -> str:
+        """路径相对于根目录的路径（保存到数据库）"""
+        return os.path.relpath(path, self.root_dir).replace(os.sep, '/')
+
+    def _persist(self, done: List[str], pending: List[Tuple[str, int]]) -> None:
+        """从数据库中移除已完成的路径，保存仍在等待的路径及尝试次数"""
+        if not self.persist or not (done or pending):
+            return
+        from backend.models import PendingDeleteModel
+        try:
+            PendingDeleteModel.delete_many([self._key(path) for path in done])
+            PendingDeleteModel.put_many([(self._key(path), attempts) for path, attempts in pending])
+        except Exception as e:
+            logger.warning(f"保存待删除路径失败: {e}")
+
+    def submit(self, paths: Iterable[str]) -> int:
+        """
+        提交待删除的文件或目录（目录整体删除）
+
+        Args:
+            paths: 路径列表（必须位于根目录内，其余路径会被忽略）
+
+        Returns:
+            接受的路径数
+        """
+        accepted = []
+        for path in paths:
+            real_path = os.path.realpath(path)
+            if real_path == self.root_dir or os.path.commonpath([real_path, self.root_dir]) != self.root_dir:
+                logger.warning(f"忽略 history 目录以外的删除请求: {path}")
+                continue
+            accepted.append((real_path, 0))
+
+        # 先保存再放入队列，删除完成前重启也不会丢失
+        self._persist([], accepted)
+        for item in accepted:
+            self._queue.put(item)
+
+        if accepted:
+            self._ensure_worker()
+        return len(accepted)
+
+    def resume(self) -> int:
+        """
+        继续删除上次运行时未完成的路径（启动时调用）
+
+        Returns:
+            重新提交的路径数
+        """
+        if not self.persist:
+            return 0
+        from backend.models import PendingDeleteModel
+        try:
+            rows = PendingDeleteModel.get_all()
+        except Exception as e:
+            logger.warning(f"读取待删除路径失败: {e}")
+            return 0
+
+        for row in rows:
+            self._queue.put((os.path.join(self.root_dir, *row['path'].split('/')), row['attempts']))
+        if rows:
+            logger.info(f"继续删除上次未完成的 {len(rows)} 个路径")
+            self._ensure_worker()
+        return len(rows)
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="file-janitor", daemon=True)
+                self._thread.start()
+
+    def _worker(self) -> None:
+        while True:
+            with self._lock:
+                next_retry = min((due for due, _, _ in self._retries), default=None)
+            timeout = None if next_retry is None else max(next_retry - time.time(), 0)
+
+            batch: List[Tuple[str, int]] = []
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                while len(batch) < self.BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            now = time.time()
+            with self._lock:
+                due = [(path, attempts) for when, path, attempts in self._retries if when <= now]
+                self._retries = [item for item in self._retries if item[0] > now]
+                self._busy = len(batch) + len(due)
+            batch.extend(due)
+
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch: List[Tuple[str, int]]) -> None:
+        """删除一批路径，失败的路径安排重试"""
+        removed = 0
+        reclaimed = 0
+        done: List[str] = []
+        retrying: List[Tuple[str, int]] = []
+        for path, attempts in batch:
+            size = _path_size(path)
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                done.append(path)
+                continue
+            except OSError as e:
+                # 目录可能已删除了一部分
+                reclaimed += size - _path_size(path)
+                attempts += 1
+                if attempts < self.MAX_ATTEMPTS:
+                    logger.warning(f"删除失败，{attempts * self.RETRY_DELAY:.0f} 秒后重试: {path}, {e}")
+                    with self._lock:
+                        self._retries.append((time.time() + attempts * self.RETRY_DELAY, path, attempts))
+                    retrying.append((path, attempts))
+                else:
+                    logger.error(f"删除失败，已放弃: {path}, {e}")
+                    with self._lock:
+                        self._failed += 1
+                    done.append(path)
+                continue
+            removed += 1
+            reclaimed += size
+            done.append(path)
+
+        self._persist(done, retrying)
+
+        with self._lock:
+            self._removed += removed
+            self._reclaimed_bytes += reclaimed
+            self._busy = 0
+        if removed:
+            logger.info(f"回收磁盘空间: {removed} 个路径, {reclaimed / 1024 / 1024:.2f} MB")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        回收统计
+
+        Returns:
+            pending（等待删除）、retrying（等待重试）、removed（已删除路径数）、
+            reclaimed_bytes（已回收字节数）、failed（放弃的路径数）
+        """
+        with self._lock:
+            return {
+                'pending': self._queue.qsize() + self._busy,
+                'retrying': len(self._retries),
+                'removed': self._removed,
+                'reclaimed_bytes': self._reclaimed_bytes,
+                'failed': self._failed,
+            }
+
+
+_janitor_instance = None
+
+
+def get_file_janitor() -> FileJanitor:
+    """获取全局文件回收实例"""
+    global _janitor_instance
+    if _janitor_instance is None:
+        _janitor_instance = FileJanitor()
+    return _janitor_instance
@@ -5,12 +5,146 @@ import yaml
 import uuid
 import json
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Generator
 from backend.utils.text_client import get_text_chat_client
 from backend.models import RecordModel, ToneModel, OutlineModel, PageModel
 
 logger = logging.getLogger(__name__)
 
+# 页面类型标记映射
+PAGE_TYPE_MAPPING = {
+    "封面": "cover",
+    "内容": "content",
+    "总结": "summary",
+}
+
+# 元数据标记（出现在页面文本中说明是元数据部分）
+METADATA_MARKERS = ('【小红书标题】', '【小红书正文】', '【小红书标签】')
+
+PAGE_SPLIT_PATTERN = re.compile(r'<page>', re.IGNORECASE)
+
+
+def _parse_metadata(outline_text: str) -> Dict[str, str]:
+    """提取小红书标题、正文和标签"""
+    metadata = {
+        "title": "",
+        "content": "",
+        "tags": ""
+    }
+
+    title_match = re.search(r'【小红书标题】\s*\n+(.*?)(?=\n+【|<page>|\Z)', outline_text, re.DOTALL)
+    if title_match:
+        metadata["title"] = title_match.group(1).strip()
+        logger.debug(f"提取到标题: {metadata['title'][:50]}...")
+    else:
+        logger.warning("未找到【小红书标题】标记")
+
+    content_match = re.search(r'【小红书正文】\s*\n+(.*?)(?=\n+【|<page>|\Z)', outline_text, re.DOTALL)
+    if content_match:
+        metadata["content"] = content_match.group(1).strip()
+        logger.debug(f"提取到正文: {len(metadata['content'])} 字符")
+    else:
+        logger.warning("未找到【小红书正文】标记")
+
+    tags_match = re.search(r'【小红书标签】\s*\n+(.*?)(?=\n+【|<page>|\Z)', outline_text, re.DOTALL)
+    if tags_match:
+        metadata["tags"] = tags_match.group(1).strip()
+        logger.debug(f"提取到标签: {metadata['tags']}")
+    else:
+        logger.warning("未找到【小红书标签】标记")
+
+    return metadata
+
+
+def _build_page(index: int, page_text: str) -> Optional[Dict[str, Any]]:
+    """
+    将分割后的一段文本转换为页面
+
+    Returns:
+        页面字典；空白段或元数据部分返回 None
+    """
+    page_text = page_text.strip()
+    if not page_text:
+        return None
+
+    # 如果页面文本包含【小红书标题】等标记，说明这是元数据部分，跳过
+    if any(marker in page_text for marker in METADATA_MARKERS):
+        return None
+
+    page_type = "content"
+    type_match = re.match(r"\[(\S+)\]", page_text)
+    if type_match:
+        page_type = PAGE_TYPE_MAPPING.get(type_match.group(1), "content")
+
+    return {
+        "index": index,
+        "type": page_type,
+        "content": page_text
+    }
+
+
+class OutlineStreamParser:
+    """
+    增量大纲解析器
+
+    每次 feed 新文本后返回已经结束（后面出现了下一个 <page>）的页面，
+    页面的 index 与 _parse_outline 对完整文本的解析结果一致。
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._buffer = ""          # 尚未结束的最后一段
+        self._segment_index = 0    # 当前段在整篇文本中的分段序号
+        self.metadata: Optional[Dict[str, str]] = None
+
+    @property
+    def text(self) -> str:
+        """目前收到的完整文本"""
+        return "".join(self._chunks)
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        """
+        输入新生成的文本
+
+        Args:
+            delta: 文本片段
+
+        Returns:
+            本次新结束的页面列表
+        """
+        self._chunks.append(delta)
+        self._buffer += delta
+
+        segments = PAGE_SPLIT_PATTERN.split(self._buffer)
+        if len(segments) == 1:
+            return []
+
+        pages = []
+        # 最后一段还可能继续增长（也可能包含不完整的 <page 标记），保留在缓冲区
+        for segment in segments[:-1]:
+            if self._segment_index == 0 and self.metadata is None:
+                self.metadata = _parse_metadata(segment)
+            page = _build_page(self._segment_index, segment)
+            if page:
+                pages.append(page)
+            self._segment_index += 1
+        self._buffer = segments[-1]
+        return pages
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        输出结束，处理最后一段
+
+        Returns:
+            最后一页（没有使用 <page> 分隔时返回空列表，由完整解析处理）
+        """
+        if self._segment_index == 0:
+            return []
+        page = _build_page(self._segment_index, self._buffer)
+        self._buffer = ""
+        self._segment_index += 1
+        return [page] if page else []
+
 
 class OutlineService:
     def __init__(self):
@@ -94,7 +228,7 @@ class OutlineService:
             )
 
         logger.info(f"使用文本服务商: {active_provider} (type={provider_config.get('type')})")
-        return get_text_chat_client(provider_config)
+        return get_text_chat_client(provider_config, self.text_config.get('cache'))
 
     def _load_prompt_template(self) -> str:
         prompt_path = os.path.join(
@@ -123,37 +257,11 @@ class OutlineService:
             - pages: 页面列表
             - metadata: 包含 title, content, tags 的字典
         """
-        metadata = {
-            "title": "",
-            "content": "",
-            "tags": ""
-        }
-        
-        # 提取小红书标题、正文和标签
-        title_match = re.search(r'【小红书标题】\s*\n+(.*?)(?=\n+【|<page>|\Z)', outline_text, re.DOTALL)
-        if title_match:
-            metadata["title"] = title_match.group(1).strip()
-            logger.debug(f"提取到标题: {metadata['title'][:50]}...")
-        else:
-            logger.warning("未找到【小红书标题】标记")
-        
-        content_match = re.search(r'【小红书正文】\s*\n+(.*?)(?=\n+【|<page>|\Z)', outline_text, re.DOTALL)
-        if content_match:
-            metadata["content"] = content_match.group(1).strip()
-            logger.debug(f"提取到正文: {len(metadata['content'])} 字符")
-        else:
-            logger.warning("未找到【小红书正文】标记")
-        
-        tags_match = re.search(r'【小红书标签】\s*\n+(.*?)(?=\n+【|<page>|\Z)', outline_text, re.DOTALL)
-        if tags_match:
-            metadata["tags"] = tags_match.group(1).strip()
-            logger.debug(f"提取到标签: {metadata['tags']}")
-        else:
-            logger.warning("未找到【小红书标签】标记")
-        
+        metadata = _parse_metadata(outline_text)
+
         # 按 <page> 分割页面（兼容旧的 --- 分隔符）
-        if '<page>' in outline_text:
-            pages_raw = re.split(r'<page>', outline_text, flags=re.IGNORECASE)
+        if PAGE_SPLIT_PATTERN.search(outline_text):
+            pages_raw = PAGE_SPLIT_PATTERN.split(outline_text)
         else:
             # 向后兼容：如果没有 <page> 则使用 ---
             pages_raw = outline_text.split("---")
@@ -161,40 +269,20 @@ class OutlineService:
         pages = []
 
         for index, page_text in enumerate(pages_raw):
-            page_text = page_text.strip()
-            if not page_text:
-                continue
-            
-            # 如果页面文本包含【小红书标题】等标记，说明这是元数据部分，跳过
-            if '【小红书标题】' in page_text or '【小红书正文】' in page_text or '【小红书标签】' in page_text:
-                continue
-
-            page_type = "content"
-            type_match = re.match(r"\[(\S+)\]", page_text)
-            if type_match:
-                type_cn = type_match.group(1)
-                type_mapping = {
-                    "封面": "cover",
-                    "内容": "content",
-                    "总结": "summary",
-                }
-                page_type = type_mapping.get(type_cn, "content")
-
-            pages.append({
-                "index": index,
-                "type": page_type,
-                "content": page_text
-            })
+            page = _build_page(index, page_text)
+            if page:
+                pages.append(page)
 
         return pages, metadata
 
-    def generate_tone(self, topic: str, record_id: str) -> Dict[str, Any]:
+    def generate_tone(self, topic: str, record_id: str, bypass_cache: bool = False) -> Dict[str, Any]:
         """
         生成内容基调并保存到数据库
         
         Args:
             topic: 用户输入的主题
             record_id: 记录 ID
+            bypass_cache: 是否跳过文本缓存（重新生成时使用）
             
         Returns:
             生成结果
@@ -204,14 +292,7 @@ class OutlineService:
             tone_prompt_template = self._load_tone_prompt_template()
             prompt = tone_prompt_template.format(topic=topic)
 
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 1.0)
-            max_output_tokens = provider_config.get('max_output_tokens', 8000)
+            model, temperature, max_output_tokens = self._get_model_params()
 
             logger.info(f"调用文本生成 API 生成基调: model={model}, temperature={temperature}")
             tone_text = self.client.generate_text(
@@ -219,7 +300,8 @@ class OutlineService:
                 model=model,
                 temperature=temperature,
                 max_output_tokens=max_output_tokens,
-                images=None
+                images=None,
+                bypass_cache=bypass_cache
             )
 
             logger.debug(f"基调生成完成，文本长度: {len(tone_text)} 字符")
@@ -236,67 +318,215 @@ class OutlineService:
         except Exception as e:
             error_msg = str(e)
             logger.error(f"基调生成失败: {error_msg}")
-
-            # 根据错误类型提供更详细的错误信息
-            if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
-                detailed_error = (
-                    f"API 认证失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查并更新 API Key"
-                )
-            elif "model" in error_msg.lower() or "404" in error_msg:
-                detailed_error = (
-                    f"模型访问失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 模型名称不正确\n"
-                    "2. 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查模型名称配置"
-                )
-            elif "timeout" in error_msg.lower() or "连接" in error_msg:
-                detailed_error = (
-                    f"网络连接失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 网络连接不稳定\n"
-                    "2. API 服务暂时不可用\n"
-                    "3. Base URL 配置错误\n"
-                    "解决方案：检查网络连接，稍后重试"
-                )
-            elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
-                detailed_error = (
-                    f"API 配额限制。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API 调用次数超限\n"
-                    "2. 账户配额用尽\n"
-                    "解决方案：等待配额重置，或升级 API 套餐"
-                )
-            else:
-                detailed_error = (
-                    f"基调生成失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. Text API 配置错误或密钥无效\n"
-                    "2. 网络连接问题\n"
-                    "3. 模型无法访问或不存在\n"
-                    "建议：检查配置文件 text_providers.yaml"
-                )
-
             return {
                 "success": False,
-                "error": detailed_error
+                "error": self._describe_error(error_msg, "基调生成")
             }
 
+    def _get_model_params(self) -> tuple:
+        """从配置中获取模型参数 (model, temperature, max_output_tokens)"""
+        active_provider = self.text_config.get('active_provider', 'google_gemini')
+        providers = self.text_config.get('providers', {})
+        provider_config = providers.get(active_provider, {})
+
+        model = provider_config.get('model', 'gemini-2.0-flash-exp')
+        temperature = provider_config.get('temperature', 1.0)
+        max_output_tokens = provider_config.get('max_output_tokens', 8000)
+        return model, temperature, max_output_tokens
+
+    def _build_outline_prompt(
+        self,
+        topic: str,
+        images: Optional[List[bytes]] = None,
+        tone: Optional[str] = None
+    ) -> str:
+        """格式化大纲提示词（包含基调和参考图片说明）"""
+        prompt = self.prompt_template.format(
+            tone=tone if tone else "未提供内容基调，请使用通用小红书风格",
+            topic=topic
+        )
+        logger.debug("已将基调添加到提示词")
+
+        if images and len(images) > 0:
+            prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
+            logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
+
+        return prompt
+
+    def _prepare_tone(self, record_id: str, tone: Optional[str] = None) -> int:
+        """
+        获取或创建基调，并删除该基调下的旧大纲和页面
+
+        Args:
+            record_id: 记录 ID
+            tone: 内容基调
+
+        Returns:
+            tone_id
+        """
+        tone_obj = ToneModel.get_by_record(record_id)
+        if not tone_obj:
+            # 如果没有 tone，需要先创建（如果提供了 tone 参数）
+            if tone:
+                tone_id = ToneModel.create(record_id=record_id, tone_text=tone)
+                logger.info(f"基调已保存到数据库: record_id={record_id}, tone_id={tone_id}")
+            else:
+                # 如果没有提供 tone，创建一个空的 tone
+                tone_id = ToneModel.create(record_id=record_id, tone_text="")
+                logger.info(f"创建空基调: record_id={record_id}, tone_id={tone_id}")
+            return tone_id
+
+        tone_id = tone_obj['id']
+
+        # 🔥 重要：先删除旧的大纲和页面（在更新 tone 之前）
+        existing_outline = OutlineModel.get_by_tone(tone_id)
+        if existing_outline:
+            logger.info(f"🗑️ 删除旧的大纲和页面: outline_id={existing_outline['id']}")
+            OutlineModel.delete_by_tone(tone_id)
+
+        # 如果提供了新的 tone，更新它
+        if tone and tone != tone_obj['tone_text']:
+            ToneModel.update(record_id=record_id, tone_text=tone)
+            # 🔥 重要：ToneModel.update 会删除旧 tone 并创建新 tone，需要重新获取 tone_id
+            tone_obj = ToneModel.get_by_record(record_id)
+            tone_id = tone_obj['id']
+            logger.info(f"更新基调: record_id={record_id}, new_tone_id={tone_id}")
+
+        return tone_id
+
+    def _stage_outline(self, record_id: str, tone: Optional[str] = None) -> Dict[str, Any]:
+        """
+        为流式生成创建新的空大纲，旧的基调、大纲和页面保留到生成成功后再删除
+
+        新大纲（基调变化时连同新基调）标记为 staged，查询时不会返回，
+        历史记录在生成过程中仍显示旧大纲；成功后再替换，失败时删除新建的部分。
+
+        Args:
+            record_id: 记录 ID
+            tone: 内容基调
+
+        Returns:
+            tone_id、outline_id、tone_staged（基调是否新建），
+            以及成功后要删除的 old_tone_id / old_outline_id（可能为 None）
+        """
+        tone_obj = ToneModel.get_by_record(record_id)
+        old_outline = OutlineModel.get_by_tone(tone_obj['id']) if tone_obj else None
+
+        if tone_obj and not (tone and tone != tone_obj['tone_text']):
+            tone_id = tone_obj['id']
+            tone_staged = False
+            old_tone_id = None
+        else:
+            tone_id = ToneModel.create(record_id=record_id, tone_text=tone or "", staged=True)
+            tone_staged = True
+            old_tone_id = tone_obj['id'] if tone_obj else None
+            logger.info(f"基调已保存到数据库: record_id={record_id}, tone_id={tone_id}")
+
+        outline_id = OutlineModel.create(tone_id=tone_id, raw_outline="", staged=True)
+        return {
+            'tone_id': tone_id,
+            'outline_id': outline_id,
+            'tone_staged': tone_staged,
+            'old_tone_id': old_tone_id,
+            'old_outline_id': old_outline['id'] if old_outline else None,
+        }
+
+    def _commit_staged_outline(self, staged: Dict[str, Any], outline_text: str, metadata: Dict[str, str]) -> None:
+        """流式生成成功后写入大纲内容、替换为新大纲，并删除旧的基调、大纲和页面"""
+        # 先发布大纲再发布基调：基调发布前新大纲不会被查询到
+        OutlineModel.publish(
+            staged['outline_id'],
+            raw_outline=outline_text,
+            metadata_title=metadata.get('title'),
+            metadata_content=metadata.get('content'),
+            metadata_tags=metadata.get('tags')
+        )
+        if staged['tone_staged']:
+            ToneModel.publish(staged['tone_id'])
+
+        if staged['old_tone_id'] is not None:
+            logger.info(f"🗑️ 删除旧的基调、大纲和页面: tone_id={staged['old_tone_id']}")
+            ToneModel.delete_by_id(staged['old_tone_id'])
+        elif staged['old_outline_id'] is not None:
+            logger.info(f"🗑️ 删除旧的大纲和页面: outline_id={staged['old_outline_id']}")
+            OutlineModel.delete_by_id(staged['old_outline_id'])
+
+    def _rollback_staged_outline(self, staged: Dict[str, Any]) -> None:
+        """流式生成失败或中断时删除新建的大纲（和基调），恢复旧大纲"""
+        try:
+            if staged['tone_staged']:
+                ToneModel.delete_by_id(staged['tone_id'])
+            else:
+                OutlineModel.delete_by_id(staged['outline_id'])
+            logger.info(f"已撤销未完成的大纲: outline_id={staged['outline_id']}")
+        except Exception as e:
+            logger.error(f"撤销未完成的大纲失败: outline_id={staged['outline_id']}, {e}")
+
+    def _describe_error(self, error_msg: str, action: str) -> str:
+        """
+        根据错误类型提供更详细的错误信息
+
+        Args:
+            error_msg: 原始错误信息
+            action: 操作名称（如 "大纲生成"）
+
+        Returns:
+            带可能原因和解决方案的错误信息
+        """
+        if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
+            return (
+                f"API 认证失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 没有访问该模型的权限\n"
+                "解决方案：在系统设置页面检查并更新 API Key"
+            )
+        elif "model" in error_msg.lower() or "404" in error_msg:
+            return (
+                f"模型访问失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. 模型名称不正确\n"
+                "2. 没有访问该模型的权限\n"
+                "解决方案：在系统设置页面检查模型名称配置"
+            )
+        elif "timeout" in error_msg.lower() or "连接" in error_msg:
+            return (
+                f"网络连接失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. 网络连接不稳定\n"
+                "2. API 服务暂时不可用\n"
+                "3. Base URL 配置错误\n"
+                "解决方案：检查网络连接，稍后重试"
+            )
+        elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
+            return (
+                f"API 配额限制。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. API 调用次数超限\n"
+                "2. 账户配额用尽\n"
+                "解决方案：等待配额重置，或升级 API 套餐"
+            )
+        return (
+            f"{action}失败。\n"
+            f"错误详情: {error_msg}\n"
+            "可能原因：\n"
+            "1. Text API 配置错误或密钥无效\n"
+            "2. 网络连接问题\n"
+            "3. 模型无法访问或不存在\n"
+            "建议：检查配置文件 text_providers.yaml"
+        )
+
     def generate_outline(
         self,
         topic: str,
         record_id: str,
         images: Optional[List[bytes]] = None,
-        tone: Optional[str] = None
+        tone: Optional[str] = None,
+        bypass_cache: bool = False
     ) -> Dict[str, Any]:
         """
         生成大纲并保存到数据库
@@ -306,6 +536,7 @@ class OutlineService:
             record_id: 记录 ID
             images: 参考图片列表
             tone: 内容基调
+            bypass_cache: 是否跳过文本缓存（重新生成时使用）
             
         Returns:
             生成结果
@@ -313,25 +544,8 @@ class OutlineService:
         try:
             logger.info(f"开始生成大纲: topic={topic[:50]}..., record_id={record_id}, images={len(images) if images else 0}")
             
-            # 格式化提示词（包含基调）
-            prompt = self.prompt_template.format(
-                tone=tone if tone else "未提供内容基调，请使用通用小红书风格",
-                topic=topic
-            )
-            logger.debug("已将基调添加到提示词")
-
-            if images and len(images) > 0:
-                prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
-                logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
-
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 1.0)
-            max_output_tokens = provider_config.get('max_output_tokens', 8000)
+            prompt = self._build_outline_prompt(topic, images, tone)
+            model, temperature, max_output_tokens = self._get_model_params()
 
             logger.info(f"调用文本生成 API: model={model}, temperature={temperature}")
             outline_text = self.client.generate_text(
@@ -339,7 +553,8 @@ class OutlineService:
                 model=model,
                 temperature=temperature,
                 max_output_tokens=max_output_tokens,
-                images=images
+                images=images,
+                bypass_cache=bypass_cache
             )
 
             logger.debug(f"API 返回文本长度: {len(outline_text)} 字符")
@@ -353,32 +568,7 @@ class OutlineService:
             logger.info(f"创建记录目录: {record_dir}")
 
             # 获取或创建 tone
-            tone_obj = ToneModel.get_by_record(record_id)
-            if not tone_obj:
-                # 如果没有 tone，需要先创建（如果提供了 tone 参数）
-                if tone:
-                    tone_id = ToneModel.create(record_id=record_id, tone_text=tone)
-                    logger.info(f"基调已保存到数据库: record_id={record_id}, tone_id={tone_id}")
-                else:
-                    # 如果没有提供 tone，创建一个空的 tone
-                    tone_id = ToneModel.create(record_id=record_id, tone_text="")
-                    logger.info(f"创建空基调: record_id={record_id}, tone_id={tone_id}")
-            else:
-                tone_id = tone_obj['id']
-                
-                # 🔥 重要：先删除旧的大纲和页面（在更新 tone 之前）
-                existing_outline = OutlineModel.get_by_tone(tone_id)
-                if existing_outline:
-                    logger.info(f"🗑️ 删除旧的大纲和页面: outline_id={existing_outline['id']}")
-                    OutlineModel.delete_by_tone(tone_id)
-                
-                # 如果提供了新的 tone，更新它
-                if tone and tone != tone_obj['tone_text']:
-                    ToneModel.update(record_id=record_id, tone_text=tone)
-                    # 🔥 重要：ToneModel.update 会删除旧 tone 并创建新 tone，需要重新获取 tone_id
-                    tone_obj = ToneModel.get_by_record(record_id)
-                    tone_id = tone_obj['id']
-                    logger.info(f"更新基调: record_id={record_id}, new_tone_id={tone_id}")
+            tone_id = self._prepare_tone(record_id, tone)
             
             # 保存大纲到数据库（使用 tone_id）
             outline_id = OutlineModel.create(
@@ -427,61 +617,140 @@ class OutlineService:
         except Exception as e:
             error_msg = str(e)
             logger.error(f"大纲生成失败: {error_msg}")
+            return {
+                "success": False,
+                "error": self._describe_error(error_msg, "大纲生成")
+            }
 
-            # 根据错误类型提供更详细的错误信息
-            if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
-                detailed_error = (
-                    f"API 认证失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查并更新 API Key"
-                )
-            elif "model" in error_msg.lower() or "404" in error_msg:
-                detailed_error = (
-                    f"模型访问失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 模型名称不正确\n"
-                    "2. 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查模型名称配置"
-                )
-            elif "timeout" in error_msg.lower() or "连接" in error_msg:
-                detailed_error = (
-                    f"网络连接失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 网络连接不稳定\n"
-                    "2. API 服务暂时不可用\n"
-                    "3. Base URL 配置错误\n"
-                    "解决方案：检查网络连接，稍后重试"
-                )
-            elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
-                detailed_error = (
-                    f"API 配额限制。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API 调用次数超限\n"
-                    "2. 账户配额用尽\n"
-                    "解决方案：等待配额重置，或升级 API 套餐"
-                )
-            else:
-                detailed_error = (
-                    f"大纲生成失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. Text API 配置错误或密钥无效\n"
-                    "2. 网络连接问题\n"
-                    "3. 模型无法访问或不存在\n"
-                    "建议：检查配置文件 text_providers.yaml"
+    def generate_outline_stream(
+        self,
+        topic: str,
+        record_id: str,
+        images: Optional[List[bytes]] = None,
+        tone: Optional[str] = None,
+        bypass_cache: bool = False
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        流式生成大纲（生成器，支持 SSE 流式返回）
+
+        每个 <page> 一结束就写入数据库并推送，前端可以立即开始生成该页图片。
+        旧的大纲和页面在生成完成后才删除，生成失败或中断时保持不变。
+
+        Args:
+            topic: 用户输入的主题
+            record_id: 记录 ID
+            images: 参考图片列表
+            tone: 内容基调
+            bypass_cache: 是否跳过文本缓存（重新生成时使用）
+
+        Yields:
+            事件字典：
+            - text: 新生成的文本片段
+            - metadata: 标题、正文、标签（第一个 <page> 出现时）
+            - page: 单个页面（已包含数据库 id）
+            - complete: 全部完成（与 generate_outline 返回值相同）
+            - error: 生成失败
+        """
+        staged = None
+        completed = False
+        try:
+            logger.info(f"开始流式生成大纲: topic={topic[:50]}..., record_id={record_id}, images={len(images) if images else 0}")
+
+            prompt = self._build_outline_prompt(topic, images, tone)
+            model, temperature, max_output_tokens = self._get_model_params()
+
+            # 先创建记录目录和空大纲，页面生成后逐个写入（旧大纲完成后再删除）
+            record_dir = os.path.join(self.history_root_dir, record_id)
+            os.makedirs(record_dir, exist_ok=True)
+            staged = self._stage_outline(record_id, tone)
+            tone_id, outline_id = staged['tone_id'], staged['outline_id']
+            logger.info(f"已创建空大纲: tone_id={tone_id}, outline_id={outline_id}")
+
+            parser = OutlineStreamParser()
+            metadata_sent = False
+            saved_pages: Dict[int, Dict[str, Any]] = {}
+
+            def save_page(page: Dict[str, Any]) -> Dict[str, Any]:
+                page_with_id = page.copy()
+                page_with_id['id'] = PageModel.create(
+                    outline_id=outline_id,
+                    page_index=page['index'],
+                    page_type=page['type'],
+                    content=page['content'],
+                    image_id=None
                 )
+                saved_pages[page['index']] = page_with_id
+                return page_with_id
 
-            return {
-                "success": False,
-                "error": detailed_error
+            logger.info(f"调用文本生成 API（流式）: model={model}, temperature={temperature}")
+            for delta in self.client.generate_text_stream(
+                prompt=prompt,
+                model=model,
+                temperature=temperature,
+                max_output_tokens=max_output_tokens,
+                images=images,
+                bypass_cache=bypass_cache
+            ):
+                yield {"event": "text", "data": {"delta": delta}}
+
+                new_pages = parser.feed(delta)
+                if parser.metadata is not None and not metadata_sent:
+                    metadata_sent = True
+                    yield {"event": "metadata", "data": {"record_id": record_id, **parser.metadata}}
+
+                for page in new_pages:
+                    yield {"event": "page", "data": {"record_id": record_id, "page": save_page(page)}}
+
+            # 最后一页没有结束标记，输出完成后再处理；再用完整解析结果校正
+            outline_text = parser.text
+            for page in parser.finish():
+                yield {"event": "page", "data": {"record_id": record_id, "page": save_page(page)}}
+
+            pages, metadata = self._parse_outline(outline_text)
+            for page in pages:
+                if page['index'] not in saved_pages:
+                    # 未使用 <page> 分隔（旧的 --- 格式）时，页面只能在最后得到
+                    yield {"event": "page", "data": {"record_id": record_id, "page": save_page(page)}}
+
+            pages_with_ids = [saved_pages[page['index']] for page in pages if page['index'] in saved_pages]
+            logger.info(f"大纲流式生成完成，共 {len(pages_with_ids)} 页")
+
+            self._commit_staged_outline(staged, outline_text, metadata)
+            RecordModel.update(record_id=record_id, title=metadata.get('title'))
+            completed = True
+
+            yield {
+                "event": "complete",
+                "data": {
+                    "success": True,
+                    "record_id": record_id,
+                    "outline": outline_text,
+                    "pages": pages_with_ids,
+                    "has_images": images is not None and len(images) > 0,
+                    "metadata": metadata
+                }
             }
 
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"大纲流式生成失败: {error_msg}")
+            if staged is not None:
+                self._rollback_staged_outline(staged)
+                staged = None
+            yield {
+                "event": "error",
+                "data": {
+                    "success": False,
+                    "record_id": record_id,
+                    "error": self._describe_error(error_msg, "大纲生成")
+                }
+            }
+
+        finally:
+            # 出错或客户端断开（生成器被关闭）时撤销新大纲
+            if staged is not None and not completed:
+                self._rollback_staged_outline(staged)
+
     def get_tone(self, record_id: str) -> Dict[str, Any]:
         """
         从数据库读取基调
@@ -0,0 +1,171 @@
+"""参考图片上传存储服务（按内容哈希存储）"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+from backend.utils.image_compressor import compress_image, guess_image_mimetype
+
+logger = logging.getLogger(__name__)
+
+# 参考图片摘要格式（sha256 十六进制）
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ReferenceImageNotFoundError(ValueError):
+    """参考图片摘要格式错误或图片不存在"""
+    pass
+
+
+class ReferenceImageService:
+    """
+    参考图片存储
+
+    上传的图片以 sha256 摘要为键保存原图和压缩后的参考图，
+    生成接口只需要传摘要，不必每次都携带 base64 图片数据，
+    也不必每次都重新压缩。
+    """
+
+    # 压缩参考图的大小上限（与 ImageService 中参考图压缩参数一致）
+    COMPRESSED_MAX_KB = 200
+
+    def __init__(self, root_dir: Optional[str] = None):
+        """
+        初始化参考图片存储
+
+        Args:
+            root_dir: 存储目录，默认为 history/.references
+        """
+        self.root_dir = root_dir or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "history",
+            ".references"
+        )
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str, variant: str) -> str:
+        """图片在磁盘上的路径（按摘要前两位分目录）"""
+        suffix = "orig" if variant == "original" else "ref"
+        return os.path.join(self.root_dir, digest[:2], f"{digest}.{suffix}")
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        """先写临时文件再重命名，避免并发读取到写了一半的文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def save(self, image_data: bytes) -> Dict[str, object]:
+        """
+        保存参考图片（已存在时直接返回）
+
+        Args:
+            image_data: 原始图片数据
+
+        Returns:
+            图片信息：digest、size（原图字节数）、compressed_size（参考图字节数）
+        """
+        digest = hashlib.sha256(image_data).hexdigest()
+        original_path = self._path(digest, "original")
+        compressed_path = self._path(digest, "compressed")
+
+        with self._lock:
+            if not os.path.exists(compressed_path):
+                self._write_atomic(original_path, image_data)
+                compressed = compress_image(image_data, max_size_kb=self.COMPRESSED_MAX_KB)
+                self._write_atomic(compressed_path, compressed)
+                logger.info(f"保存参考图片: digest={digest[:12]}, {len(image_data)} -> {len(compressed)} bytes")
+
+        return {
+            "digest": digest,
+            "size": len(image_data),
+            "compressed_size": os.path.getsize(compressed_path)
+        }
+
+    def exists(self, digest: str) -> bool:
+        """
+        参考图片是否存在
+
+        Args:
+            digest: 图片摘要
+
+        Returns:
+            是否存在
+        """
+        return bool(DIGEST_PATTERN.match(digest or '')) and os.path.exists(self._path(digest, "compressed"))
+
+    def get_path(self, digest: str, variant: str = "compressed") -> str:
+        """
+        获取参考图片文件路径
+
+        Args:
+            digest: 图片摘要
+            variant: 'compressed'（压缩后的参考图）或 'original'（原图）
+
+        Returns:
+            文件路径
+
+        Raises:
+            ReferenceImageNotFoundError: 摘要格式错误或图片不存在
+        """
+        if not DIGEST_PATTERN.match(digest or ''):
+            raise ReferenceImageNotFoundError(f"参考图片摘要格式错误: {digest}")
+
+        path = self._path(digest, variant)
+        if not os.path.exists(path):
+            raise ReferenceImageNotFoundError(
+                f"参考图片不存在: {digest}\n"
+                "解决方案：先通过 POST /api/reference-images 上传图片，再使用返回的 digest"
+            )
+        return path
+
+    @staticmethod
+    def guess_mimetype(path: str) -> str:
+        """
+        根据文件头判断图片 MIME 类型（压缩后的参考图可能保留原格式）
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            MIME 类型
+        """
+        with open(path, "rb") as f:
+            return guess_image_mimetype(f.read(12))
+
+    def load(self, digests: List[str], variant: str = "compressed") -> List[bytes]:
+        """
+        按摘要读取参考图片
+
+        Args:
+            digests: 图片摘要列表
+            variant: 'compressed'（压缩后的参考图）或 'original'（原图）
+
+        Returns:
+            与 digests 顺序一致的图片数据列表
+
+        Raises:
+            ReferenceImageNotFoundError: 摘要格式错误或图片不存在
+        """
+        images = []
+        for digest in digests or []:
+            with open(self.get_path(digest, variant), "rb") as f:
+                images.append(f.read())
+        return images
+
+
+_service_instance = None
+
+
+def get_reference_image_service() -> ReferenceImageService:
+    """获取全局参考图片存储服务实例"""
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = ReferenceImageService()
+    return _service_instance
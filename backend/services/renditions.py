@@ -0,0 +1,203 @@
+"""
+生成图片的多尺寸副本
+
+原图是数 MB 的 PNG，缩略图只有 50KB 左右，弹窗和移动端只能在两者之间二选一。
+图片保存后在后台按配置的宽度（默认 320/640/1080）生成 WebP / JPEG 副本，
+保存在任务目录的 renditions/ 子目录下，副本列表记录在 images 表中，
+GET /api/images/... 通过 w= / fmt= 参数返回最接近的副本，前端可以据此使用 srcset。
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from PIL import Image
+
+from backend.config import Config
+from backend.models import ImageModel
+from backend.utils.image_compressor import (
+    FORMAT_EXTENSIONS,
+    REDUCING_GAP,
+    _encode,
+    _to_rgb,
+    is_format_supported,
+)
+
+logger = logging.getLogger(__name__)
+
+# 副本所在的子目录（位于任务目录下，不会被当作原图扫描）
+RENDITIONS_DIRNAME = "renditions"
+
+DEFAULT_WIDTHS = (320, 640, 1080)
+DEFAULT_FORMATS = ("WEBP", "JPEG")
+
+# 各格式的编码质量（副本按尺寸而不是按体积生成，使用固定质量）
+DEFAULT_QUALITY = {"JPEG": 82, "WEBP": 80, "AVIF": 60}
+
+
+def select_rendition(
+    renditions: List[Dict],
+    width: Optional[int],
+    formats: Sequence[str]
+) -> Optional[Dict]:
+    """
+    选择最接近请求宽度的副本
+
+    按 formats 的顺序选第一个有副本的格式，再选宽度不小于请求宽度的最小副本；
+    请求宽度超过所有副本时返回 None（应返回原图，副本只为比原图窄的宽度生成）。
+
+    Args:
+        renditions: 副本列表
+        width: 请求的宽度（None 表示该格式下最大的副本）
+        formats: 可接受的格式，按优先级排列
+
+    Returns:
+        选中的副本，没有合适的副本时为 None
+    """
+    for image_format in formats:
+        candidates = sorted(
+            (r for r in renditions if r.get("format") == image_format),
+            key=lambda r: r["width"]
+        )
+        if not candidates:
+            continue
+        if width is None:
+            return candidates[-1]
+        for rendition in candidates:
+            if rendition["width"] >= width:
+                return rendition
+        return None
+    return None
+
+
+class RenditionService:
+    """多尺寸副本生成（后台线程执行，不阻塞图片生成流程）"""
+
+    def __init__(self, max_workers: int = 1):
+        """
+        初始化
+
+        Args:
+            max_workers: 后台生成线程数
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rendition")
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+
+    @staticmethod
+    def _settings() -> Dict:
+        """读取配置（每次读取，设置页修改后立即生效）"""
+        config = Config.get_image_renditions_config()
+        formats = [f.upper() for f in config.get("formats", DEFAULT_FORMATS)]
+        return {
+            "enabled": config.get("enabled", True),
+            "widths": sorted({int(w) for w in config.get("widths", DEFAULT_WIDTHS)}),
+            "formats": [f for f in formats if f in FORMAT_EXTENSIONS and is_format_supported(f)],
+            "quality": {**DEFAULT_QUALITY, **{k.upper(): v for k, v in (config.get("quality") or {}).items()}},
+        }
+
+    def schedule(self, image_id: int, filepath: str) -> Optional[Future]:
+        """
+        提交后台生成任务
+
+        Args:
+            image_id: 图片 ID
+            filepath: 原图路径
+
+        Returns:
+            后台任务（未启用时为 None）
+        """
+        settings = self._settings()
+        if not settings["enabled"] or not settings["widths"] or not settings["formats"]:
+            return None
+
+        future = self._executor.submit(self._run, image_id, filepath, settings)
+        with self._lock:
+            self._pending[image_id] = future
+        return future
+
+    def _run(self, image_id: int, filepath: str, settings: Dict) -> List[Dict]:
+        try:
+            return self.generate(image_id, filepath, settings)
+        except Exception as e:
+            logger.warning(f"生成多尺寸副本失败: image_id={image_id}, {e}")
+            return []
+        finally:
+            with self._lock:
+                self._pending.pop(image_id, None)
+
+    def generate(self, image_id: int, filepath: str, settings: Optional[Dict] = None) -> List[Dict]:
+        """
+        生成多尺寸副本并写入数据库
+
+        从大到小依次缩放（每一级以上一级为源），只生成比原图窄的宽度。
+
+        Args:
+            image_id: 图片 ID
+            filepath: 原图路径
+            settings: 配置（默认读取当前配置）
+
+        Returns:
+            副本列表（width、height、format、filename、size），filename 相对于任务目录
+        """
+        settings = settings or self._settings()
+        task_dir = os.path.dirname(filepath)
+        filename = os.path.basename(filepath)
+        output_dir = os.path.join(task_dir, RENDITIONS_DIRNAME)
+        os.makedirs(output_dir, exist_ok=True)
+
+        with Image.open(filepath) as img:
+            img.load()
+            source = _to_rgb(img)
+
+        original_width, original_height = source.size
+        renditions = []
+        for width in sorted((w for w in settings["widths"] if w < original_width), reverse=True):
+            height = max(1, round(original_height * width / original_width))
+            source = source.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+            for image_format in settings["formats"]:
+                data = _encode(source, settings["quality"][image_format], image_format, optimize=True)
+                rendition_name = f"w{width}_{filename}.{FORMAT_EXTENSIONS[image_format]}"
+                self._write_atomic(os.path.join(output_dir, rendition_name), data)
+                renditions.append({
+                    "width": width,
+                    "height": height,
+                    "format": image_format,
+                    "filename": f"{RENDITIONS_DIRNAME}/{rendition_name}",
+                    "size": len(data),
+                })
+
+        renditions.sort(key=lambda r: (r["width"], r["format"]))
+        ImageModel.update_renditions(image_id, renditions)
+        logger.info(f"多尺寸副本已生成: image_id={image_id}, {len(renditions)} 个")
+        return renditions
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        """先写临时文件再重命名，避免读取到写了一半的副本"""
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def pending_count(self) -> int:
+        """等待或正在生成的图片数"""
+        with self._lock:
+            return len(self._pending)
+
+
+_service_instance: Optional[RenditionService] = None
+_service_lock = threading.Lock()
+
+
+def get_rendition_service() -> RenditionService:
+    """获取全局多尺寸副本服务实例"""
+    global _service_instance
+    if _service_instance is None:
+        with _service_lock:
+            if _service_instance is None:
+                _service_instance = RenditionService()
+    return _service_instance
@@ -0,0 +1,194 @@
+"""
+历史记录缩略图拼图
+
+历史记录页每张卡片单独请求一次缩略图，20 张卡片就是 20 个请求。
+把一页记录的封面缩略图拼成一张图片，并返回每张卡片在拼图中的坐标，
+前端用 CSS background-position 显示，一页只需要一个图片请求。
+拼图在第一次请求时生成，按成员记录及其封面文件名计算的键缓存，成员变化后自动换成新的拼图。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageOps
+
+from backend.utils.image_compressor import _to_rgb
+
+logger = logging.getLogger(__name__)
+
+# 拼图键格式（sha256 十六进制）
+SPRITE_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ThumbnailSpriteService:
+    """缩略图拼图生成和缓存"""
+
+    # 每张卡片的尺寸（与历史记录卡片 3:4 的比例一致）
+    CELL_WIDTH = 240
+    CELL_HEIGHT = 320
+    COLUMNS = 5
+    QUALITY = 80
+
+    # 最多保留的拼图文件数（超出时删除最早生成的）
+    MAX_SPRITES = 100
+
+    # 生成拼图的锁的数量（按拼图键选择，不同页面的拼图可以同时生成）
+    LOCK_STRIPES = 16
+
+    def __init__(self, root_dir: Optional[str] = None):
+        """
+        初始化
+
+        Args:
+            root_dir: 拼图存储目录，默认为 history/.sprites
+        """
+        self.history_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "history"
+        )
+        self.root_dir = root_dir or os.path.join(self.history_dir, ".sprites")
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._render_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._prune_lock = threading.Lock()
+
+    def build_key(self, records: List[Dict]) -> str:
+        """
+        计算拼图键（成员记录、顺序、封面文件名或卡片尺寸变化时改变）
+
+        Args:
+            records: 记录列表（包含 id、thumbnail）
+
+        Returns:
+            拼图键
+        """
+        members = [[r['id'], r.get('thumbnail')] for r in records]
+        raw = json.dumps([self.CELL_WIDTH, self.CELL_HEIGHT, self.COLUMNS, members])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        """
+        拼图文件路径
+
+        Args:
+            key: 拼图键
+
+        Returns:
+            文件路径
+
+        Raises:
+            ValueError: 键格式错误
+        """
+        if not SPRITE_KEY_PATTERN.match(key or ''):
+            raise ValueError(f"拼图键格式错误: {key}")
+        return os.path.join(self.root_dir, f"{key}.jpg")
+
+    def get_or_create(self, records: List[Dict]) -> Dict:
+        """
+        获取一页记录的拼图（不存在时生成）
+
+        Args:
+            records: 记录列表（包含 id、thumbnail）
+
+        Returns:
+            拼图信息：key、width、height、cell_width、cell_height、
+            cells（record_id -> x、y、width、height，没有封面的记录不在其中）
+        """
+        members = [r for r in records if r.get('thumbnail')]
+        key = self.build_key(members)
+
+        cells = {}
+        for i, record in enumerate(members):
+            row, column = divmod(i, self.COLUMNS)
+            cells[record['id']] = {
+                'x': column * self.CELL_WIDTH,
+                'y': row * self.CELL_HEIGHT,
+                'width': self.CELL_WIDTH,
+                'height': self.CELL_HEIGHT,
+            }
+
+        columns = min(len(members), self.COLUMNS)
+        rows = (len(members) + self.COLUMNS - 1) // self.COLUMNS
+        info = {
+            'key': key,
+            'width': columns * self.CELL_WIDTH,
+            'height': rows * self.CELL_HEIGHT,
+            'cell_width': self.CELL_WIDTH,
+            'cell_height': self.CELL_HEIGHT,
+            'cells': cells,
+        }
+
+        if members:
+            path = self.get_path(key)
+            # 已生成的拼图不加锁直接返回；生成时按键加锁（同一拼图只生成一次），不阻塞其他页面的请求
+            if not os.path.exists(path):
+                with self._render_locks[int(key[:8], 16) % self.LOCK_STRIPES]:
+                    if not os.path.exists(path):
+                        self._render(members, info, path)
+                with self._prune_lock:
+                    self._prune()
+        return info
+
+    def _load_cell(self, record: Dict) -> Optional[Image.Image]:
+        """读取一条记录的封面缩略图并裁剪为卡片尺寸（缩略图不存在时使用原图）"""
+        task_dir = os.path.join(self.history_dir, record['id'])
+        for filename in (f"thumb_{record['thumbnail']}", record['thumbnail']):
+            path = os.path.join(task_dir, filename)
+            if not os.path.exists(path):
+                continue
+            with Image.open(path) as img:
+                img.draft('RGB', (self.CELL_WIDTH, self.CELL_HEIGHT))
+                img.load()
+                if img.mode == 'P':
+                    img = img.convert('RGBA')
+                return ImageOps.fit(_to_rgb(img), (self.CELL_WIDTH, self.CELL_HEIGHT), Image.Resampling.LANCZOS)
+        return None
+
+    def _render(self, members: List[Dict], info: Dict, path: str) -> None:
+        """生成拼图并写入文件（单张读取失败时该格留白）"""
+        sprite = Image.new('RGB', (info['width'], info['height']), (245, 245, 245))
+        for record in members:
+            cell = info['cells'][record['id']]
+            try:
+                image = self._load_cell(record)
+            except Exception as e:
+                logger.warning(f"读取缩略图失败: record_id={record['id']}, {e}")
+                image = None
+            if image is not None:
+                sprite.paste(image, (cell['x'], cell['y']))
+
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        sprite.save(tmp_path, format='JPEG', quality=self.QUALITY, optimize=True)
+        os.replace(tmp_path, path)
+        logger.info(f"生成缩略图拼图: {len(members)} 张, key={info['key'][:12]}")
+
+    def _prune(self) -> None:
+        """删除超出数量上限的旧拼图"""
+        sprites = [
+            os.path.join(self.root_dir, name)
+            for name in os.listdir(self.root_dir)
+            if name.endswith('.jpg')
+        ]
+        if len(sprites) <= self.MAX_SPRITES:
+            return
+        sprites.sort(key=os.path.getmtime)
+        for path in sprites[:len(sprites) - self.MAX_SPRITES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_service_instance = None
+
+
+def get_thumbnail_sprite_service() -> ThumbnailSpriteService:
+    """获取全局缩略图拼图服务实例"""
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = ThumbnailSpriteService()
+    return _service_instance
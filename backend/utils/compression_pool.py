@@ -0,0 +1,103 @@
+"""
+批量图片压缩（进程池）
+
+用户一次上传多张手机照片时，逐张压缩会让请求线程依次等待每一张；
+压缩的缩放和编码主要是 CPU 计算，放到进程池中并行执行，
+多张图片的总耗时接近单张图片的耗时。
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import List, Optional
+
+from .image_compressor import compress_image
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionPool:
+    """图片压缩进程池（首次使用时启动，进程数默认等于 CPU 核数）"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        初始化
+
+        Args:
+            max_workers: 进程数（默认 CPU 核数）
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn：Flask 已启动多个线程，fork 可能复制到被其他线程持有的锁
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def compress_many(self, images: List[bytes], max_size_kb: int = 200) -> List[bytes]:
+        """
+        并行压缩多张图片
+
+        已经小于目标大小的图片直接返回，不发送到子进程；
+        只有一张需要压缩或只有一个进程时在当前线程压缩；
+        进程池不可用时退回逐张压缩。
+
+        Args:
+            images: 图片数据列表
+            max_size_kb: 最大文件大小（KB）
+
+        Returns:
+            与输入顺序一致的压缩后图片数据列表
+        """
+        results = list(images)
+        pending = [i for i, img in enumerate(images) if len(img) > max_size_kb * 1024]
+        if not pending:
+            return results
+
+        compress = partial(compress_image, max_size_kb=max_size_kb)
+        if len(pending) == 1 or self.max_workers <= 1:
+            for i in pending:
+                results[i] = compress(images[i])
+            return results
+
+        try:
+            compressed = self._get_executor().map(compress, [images[i] for i in pending])
+            for i, data in zip(pending, compressed):
+                results[i] = data
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning(f"压缩进程池不可用，改为逐张压缩: {e}")
+            self.shutdown()
+            for i in pending:
+                results[i] = compress(images[i])
+
+        return results
+
+    def shutdown(self) -> None:
+        """关闭进程池（之后再次使用时重新启动）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool_instance: Optional[CompressionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_compression_pool() -> CompressionPool:
+    """获取全局图片压缩进程池"""
+    global _pool_instance
+    if _pool_instance is None:
+        with _pool_lock:
+            if _pool_instance is None:
+                _pool_instance = CompressionPool()
+    return _pool_instance
@@ -0,0 +1,200 @@
+"""
+history 目录文件列表索引
+
+scan_all_tasks 每次都列出 history 下所有目录的所有文件，
+继续生成 / 查询状态时 scan_generated_images 也会重新列出任务目录，记录多了以后非常慢。
+这里按目录缓存文件列表，并持久化到 SQLite（dir_index 表），重启后仍然有效：
+- 添加、删除、重命名文件都会改变目录的修改时间（mtime），
+  修改时间不变的目录直接使用缓存，只重新读取发生变化的目录
+- 修改时间精度有限，列出目录时距最近一次修改不足 1 秒的结果不视为可靠，下次仍会重新读取
+- 目录被删除后自动移除对应索引
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 目录修改后多久以内列出的结果不可靠（纳秒）
+_RACY_WINDOW_NS = 1_000_000_000
+
+# 目录项：(名称, 是否为目录)
+Entry = Tuple[str, bool]
+
+
+class DirectoryIndex:
+    """按目录修改时间缓存的文件列表（线程安全）"""
+
+    def __init__(self, root_dir: Optional[str] = None, persist: bool = True):
+        """
+        初始化
+
+        Args:
+            root_dir: 索引的根目录，默认为 history 目录
+            persist: 是否持久化到数据库
+        """
+        self.root_dir = os.path.abspath(root_dir or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "history"
+        ))
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._reused = 0
+        self._listed = 0
+
+    def _key(self, path: str) -> str:
+        """目录相对于根目录的路径（作为索引键）"""
+        return os.path.relpath(os.path.abspath(path), self.root_dir).replace(os.sep, '/')
+
+    def _load(self) -> Dict[str, Dict]:
+        """首次使用时从数据库加载索引"""
+        if self._entries is None:
+            entries = {}
+            if self.persist:
+                from backend.models import DirIndexModel
+                try:
+                    for row in DirIndexModel.get_all():
+                        entries[row['path']] = {
+                            'mtime_ns': row['mtime_ns'],
+                            'stable': bool(row['stable']),
+                            'entries': [tuple(item) for item in json.loads(row['entries_json'])],
+                        }
+                except Exception as e:
+                    logger.warning(f"加载目录索引失败，将重新扫描: {e}")
+            self._entries = entries
+        return self._entries
+
+    def scandir_many(self, paths: Iterable[str]) -> Dict[str, Optional[List[Entry]]]:
+        """
+        获取多个目录的目录项（只重新读取修改时间变化的目录，结果在一个事务中写入数据库）
+
+        Args:
+            paths: 目录路径列表
+
+        Returns:
+            路径 -> [(名称, 是否为目录)]，目录不存在时为 None
+        """
+        results: Dict[str, Optional[List[Entry]]] = {}
+        changed: List[tuple] = []
+        removed: List[str] = []
+
+        with self._lock:
+            cache = self._load()
+
+        for path in paths:
+            key = self._key(path)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except (FileNotFoundError, NotADirectoryError):
+                results[path] = None
+                with self._lock:
+                    if cache.pop(key, None) is not None:
+                        removed.append(key)
+                continue
+
+            with self._lock:
+                cached = cache.get(key)
+            if cached and cached['stable'] and cached['mtime_ns'] == mtime_ns:
+                results[path] = cached['entries']
+                with self._lock:
+                    self._reused += 1
+                continue
+
+            try:
+                now_ns = time.time_ns()
+                with os.scandir(path) as it:
+                    entries = sorted((entry.name, entry.is_dir()) for entry in it)
+            except (FileNotFoundError, NotADirectoryError):
+                results[path] = None
+                with self._lock:
+                    if cache.pop(key, None) is not None:
+                        removed.append(key)
+                continue
+
+            stable = now_ns - mtime_ns > _RACY_WINDOW_NS
+            with self._lock:
+                if cached:
+                    removed.extend(self._drop_removed_subdirs(cache, key, cached['entries'], entries))
+                cache[key] = {'mtime_ns': mtime_ns, 'stable': stable, 'entries': entries}
+                self._listed += 1
+            results[path] = entries
+            changed.append((key, mtime_ns, int(stable), json.dumps(entries)))
+
+        if self.persist and (changed or removed):
+            from backend.models import DirIndexModel
+            try:
+                DirIndexModel.put_many(changed)
+                DirIndexModel.delete_many(removed)
+            except Exception as e:
+                logger.warning(f"保存目录索引失败: {e}")
+
+        return results
+
+    @staticmethod
+    def _drop_removed_subdirs(cache: Dict[str, Dict], key: str, old: List[Entry], new: List[Entry]) -> List[str]:
+        """移除已删除子目录（及其下各级目录）的索引，返回被移除的键"""
+        gone = {name for name, is_dir in old if is_dir} - {name for name, is_dir in new if is_dir}
+        if not gone:
+            return []
+        prefixes = [name if key == '.' else f"{key}/{name}" for name in gone]
+        nested = tuple(f"{prefix}/" for prefix in prefixes)
+        dropped = [k for k in cache if k in prefixes or k.startswith(nested)]
+        for k in dropped:
+            del cache[k]
+        return dropped
+
+    def scandir(self, path: str) -> Optional[List[Entry]]:
+        """
+        获取一个目录的目录项
+
+        Args:
+            path: 目录路径
+
+        Returns:
+            [(名称, 是否为目录)]，目录不存在时为 None
+        """
+        return self.scandir_many([path])[path]
+
+    def listdir(self, path: str) -> List[str]:
+        """
+        获取目录中的文件和子目录名称（与 os.listdir 相同，目录不存在时返回空列表）
+
+        Args:
+            path: 目录路径
+
+        Returns:
+            名称列表（已排序）
+        """
+        return [name for name, _ in self.scandir(path) or []]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        索引统计
+
+        Returns:
+            directories（已索引目录数）、reused（使用缓存次数）、listed（重新读取次数）
+        """
+        with self._lock:
+            return {
+                'directories': len(self._entries or {}),
+                'reused': self._reused,
+                'listed': self._listed,
+            }
+
+
+_index_instance: Optional[DirectoryIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_directory_index() -> DirectoryIndex:
+    """获取全局 history 目录索引"""
+    global _index_instance
+    if _index_instance is None:
+        with _index_lock:
+            if _index_instance is None:
+                _index_instance = DirectoryIndex()
+    return _index_instance
@@ -2,6 +2,7 @@
 import time
 import random
 from functools import wraps
+from typing import Iterator
 from google import genai
 from google.genai import types
 
@@ -125,6 +126,38 @@ class GenAIClient:
         Returns:
             生成的文本
         """
+        result = ""
+        for text in self.generate_text_stream(
+            prompt=prompt,
+            model=model,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            use_search=use_search,
+            use_thinking=use_thinking,
+            images=images,
+        ):
+            result += text
+
+        return result
+
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本（参数与 generate_text 相同，不自动重试）
+
+        Yields:
+            逐段生成的文本
+        """
         parts = [types.Part(text=prompt)]
 
         if images:
@@ -161,7 +194,6 @@ class GenAIClient:
 
         generate_content_config = types.GenerateContentConfig(**config_kwargs)
 
-        result = ""
         for chunk in self.client.models.generate_content_stream(
             model=model,
             contents=contents,
@@ -169,9 +201,8 @@ class GenAIClient:
         ):
             if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
                 continue
-            result += chunk.text
-
-        return result
+            if chunk.text:
+                yield chunk.text
 
     @retry_on_429(max_retries=5, base_delay=3)  # 图片生成重试更多次
     def generate_image(
@@ -1,7 +1,334 @@
 """图片压缩工具"""
 import io
-from PIL import Image
-from typing import Optional
+import math
+from PIL import Image, features
+from typing import Dict, Optional, Tuple
+
+# 质量每降低多少，JPEG 体积大约减半（经验值，用于预测起始质量）。
+# WebP / AVIF 的体积随质量变化的曲线差异很大，不使用预测，直接在完整范围内二分
+QUALITY_POINTS_PER_HALVING = 30
+
+# 预测质量附近的二分查找范围
+QUALITY_BRACKET = 6
+
+# 缩小尺寸时的最小边长（像素）
+MIN_DIMENSION = 512
+
+# 缩放时以目标大小的该比例为目标，留出余量，尽量一次缩放就满足大小要求
+RESIZE_SAFETY = 0.92
+
+# 缩放后体积不到目标大小的该比例时，再放大一些，充分利用目标大小
+RESIZE_FILL = 0.85
+
+# 满足大小要求后最多再尝试放大的次数
+MAX_RESIZE_STEPS = 3
+
+# 输出 JPEG 时每像素字节数的保守下限，用于按目标大小估算最多需要解码的像素数。
+# 纯色图片在任何质量下约为 0.0158（每个 8x8 块的最小编码），这里取更低的值；
+# WebP / AVIF 没有这样的下限（纯色可低到 0.0002），只按 max_dimension 限制解码尺寸
+MIN_BYTES_PER_PIXEL = 0.012
+
+# 两段式缩放：先按整数倍盒式缩小到目标尺寸的 REDUCING_GAP 倍以内，再用 LANCZOS 缩放
+REDUCING_GAP = 3.0
+
+# 输出格式对应的扩展名和 MIME 类型
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'AVIF': 'avif'}
+FORMAT_MIMETYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'AVIF': 'image/avif'}
+
+
+def is_format_supported(image_format: str) -> bool:
+    """
+    当前 Pillow 是否支持编码该格式
+
+    Args:
+        image_format: 'JPEG' / 'WEBP' / 'AVIF'
+
+    Returns:
+        是否支持
+    """
+    if image_format == 'JPEG':
+        return True
+    if image_format in ('WEBP', 'AVIF'):
+        return bool(features.check(image_format.lower()))
+    return False
+
+
+def guess_image_mimetype(header: bytes) -> str:
+    """
+    根据文件头判断图片 MIME 类型
+
+    Args:
+        header: 文件开头至少 12 字节
+
+    Returns:
+        MIME 类型（无法识别时为 application/octet-stream）
+    """
+    if header.startswith(b"\x89PNG"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if header.startswith(b"GIF8"):
+        return "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+def variant_filename(filename: str, image_format: str) -> str:
+    """
+    其他格式副本的文件名（如 thumb_x.png -> thumb_x.png.webp）
+
+    Args:
+        filename: 原文件名
+        image_format: 'WEBP' / 'AVIF'
+
+    Returns:
+        副本文件名
+    """
+    return f"{filename}.{FORMAT_EXTENSIONS[image_format]}"
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """转换为 RGB（透明背景填充为白色）"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _load_image(
+    image_data: bytes,
+    max_dimension: int,
+    max_size_bytes: int,
+    output_format: str = 'JPEG'
+) -> Image.Image:
+    """
+    按需要的尺寸解码图片
+
+    目标大小放不下更多像素时不必按原始分辨率解码：
+    JPEG 使用 draft() 直接按 1/2、1/4、1/8 解码；其他格式先盒式缩小再 LANCZOS 缩放。
+
+    Args:
+        image_data: 原始图片数据
+        max_dimension: 最大边长（像素）
+        max_size_bytes: 目标大小（字节）
+        output_format: 输出格式（只有 JPEG 按目标大小限制解码尺寸，为 None 时只按 max_dimension 限制）
+
+    Returns:
+        RGB 图片
+    """
+    img = Image.open(io.BytesIO(image_data))
+    width, height = img.size
+
+    limit = max_dimension
+    if output_format == 'JPEG':
+        # 目标大小最多能容纳的边长（按保守的每像素字节数估算）
+        budget_pixels = max_size_bytes / MIN_BYTES_PER_PIXEL
+        budget_dimension = math.sqrt(budget_pixels * max(width, height) / min(width, height))
+        limit = min(max_dimension, budget_dimension)
+
+    ratio = min(limit / width, limit / height, 1.0)
+    target = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+
+    if ratio < 1.0 and img.format == 'JPEG':
+        # 解码时直接缩小（尺寸不小于 target）
+        img.draft('RGB', target)
+
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+
+    if ratio < 1.0 and img.size != target:
+        img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+    return _to_rgb(img)
+
+
+def _encode(img: Image.Image, quality: int, image_format: str = 'JPEG', optimize: bool = True) -> bytes:
+    """
+    按指定格式编码
+
+    JPEG 默认 optimize=True（优化霍夫曼表，体积小 5%~10%，编码稍慢）：
+    查找质量时也使用同样的设置，同样的目标大小下才能选到与最终输出一致的最高质量
+    """
+    output = io.BytesIO()
+    if image_format == 'WEBP':
+        img.save(output, format='WEBP', quality=quality, method=4)
+    elif image_format == 'AVIF':
+        img.save(output, format='AVIF', quality=quality, speed=8)
+    else:
+        img.save(output, format='JPEG', quality=quality, optimize=optimize)
+    return output.getvalue()
+
+
+def _predict_quality(size: int, target: int, quality: int) -> float:
+    """根据当前质量下的体积，预测满足目标体积的质量"""
+    return quality - QUALITY_POINTS_PER_HALVING * math.log2(size / target)
+
+
+def _search_quality(
+    img: Image.Image,
+    max_size_bytes: int,
+    quality_start: int,
+    quality_min: int,
+    image_format: str,
+    stats: dict
+) -> Tuple[Optional[bytes], int]:
+    """
+    查找满足大小要求的最高质量
+
+    JPEG 第一次编码后根据体积预测目标质量，只在预测值附近的小范围内二分，
+    预测偏差过大时再扩展到完整范围；其他格式直接在完整范围内二分。
+    找不到时一定已经按 quality_min 编码过。
+
+    Returns:
+        (满足要求的编码结果，找不到时为 None；quality_min 下的体积，找到结果时为 0)
+    """
+    sizes = {}
+
+    def encode(quality: int) -> bytes:
+        stats['encodes'] += 1
+        data = _encode(img, quality, image_format)
+        sizes[quality] = len(data)
+        return data
+
+    first = encode(quality_start)
+    if len(first) <= max_size_bytes:
+        stats['quality'] = quality_start
+        return first, 0
+
+    best = None
+    if image_format == 'JPEG':
+        predicted = _predict_quality(len(first), max_size_bytes, quality_start)
+        probe = int(min(max(round(predicted), quality_min), quality_start - 1))
+        data = encode(probe)
+        if len(data) <= max_size_bytes:
+            best = (probe, data)
+            ranges = [(probe + 1, min(quality_start - 1, probe + QUALITY_BRACKET)),
+                      (probe + QUALITY_BRACKET + 1, quality_start - 1)]
+        else:
+            ranges = [(max(quality_min, probe - QUALITY_BRACKET), probe - 1),
+                      (quality_min, probe - QUALITY_BRACKET - 1)]
+    else:
+        ranges = [(quality_min, quality_start - 1)]
+
+    for low, high in ranges:
+        # 上一个范围内已找到结果，且不在范围上限（更高的质量一定超出）时不再扩展
+        if best is not None and best[0] != low - 1:
+            break
+        while low <= high:
+            quality = (low + high + 1) // 2
+            data = encode(quality)
+            if len(data) <= max_size_bytes:
+                best = (quality, data)
+                low = quality + 1
+            else:
+                high = quality - 1
+
+    if best is None:
+        return None, sizes.get(quality_min, min(sizes.values()))
+
+    stats['quality'] = best[0]
+    return best[1], 0
+
+
+def _search_scale(
+    img: Image.Image,
+    max_size_bytes: int,
+    quality: int,
+    full_size: int,
+    image_format: str,
+    stats: dict
+) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    查找满足大小要求的最大尺寸（按 quality 编码）
+
+    体积随缩放比例近似按幂函数变化（像素数的平方关系只是近似，噪点多的图片缩小后体积下降更快）：
+    每次用最接近目标的两次实际体积（对数坐标下）插值出下一个比例；
+    结果明显小于目标大小时再放大一些。
+
+    Args:
+        img: 图片
+        max_size_bytes: 目标大小（字节）
+        quality: 编码质量
+        full_size: 原尺寸下按 quality 编码的体积
+        image_format: 输出格式
+        stats: 统计信息
+
+    Returns:
+        (编码结果, 尺寸)；缩小到 MIN_DIMENSION 仍超出时返回该尺寸的结果
+    """
+    target = max_size_bytes * RESIZE_SAFETY
+    min_scale = min(MIN_DIMENSION / max(img.size), 1.0)
+    fit = None                 # (比例, 体积, 编码结果, 尺寸)：满足要求的最大比例
+    over = [(1.0, full_size)]  # 超出目标大小的比例，从大到小
+    steps = 0
+    scale = math.sqrt(target / full_size)
+
+    while True:
+        scale = min(max(scale, min_scale), 1.0)
+        new_size = (max(1, int(img.size[0] * scale)), max(1, int(img.size[1] * scale)))
+        resized = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+        data = _encode(resized, quality, image_format)
+        stats['encodes'] += 1
+
+        if len(data) <= max_size_bytes:
+            fit = (scale, len(data), data, new_size)
+            if len(data) >= max_size_bytes * RESIZE_FILL:
+                break
+        else:
+            over.append((scale, len(data)))
+            if fit is None and scale <= min_scale:
+                return data, new_size
+
+        if fit is not None:
+            steps += 1
+            if steps > MAX_RESIZE_STEPS or over[-1][0] - fit[0] < 0.01:
+                break
+            (s0, b0), (s1, b1) = (fit[0], fit[1]), over[-1]
+        else:
+            (s1, b1), (s0, b0) = over[-2], over[-1]
+
+        # 对数坐标下线性插值（外推）：log(体积) = k * log(比例) + c
+        k = math.log(b1 / b0) / math.log(s1 / s0) if s1 != s0 and b1 != b0 else 2.0
+        k = min(max(k, 1.0), 4.0)
+        scale = s0 * (target / b0) ** (1 / k)
+        if fit is not None and not fit[0] < scale < over[-1][0]:
+            scale = (fit[0] + over[-1][0]) / 2
+
+    return fit[2], fit[3]
+
+
+def _compress_decoded(
+    img: Image.Image,
+    max_size_bytes: int,
+    quality_start: int,
+    quality_min: int,
+    image_format: str,
+    stats: dict
+) -> bytes:
+    """压缩已解码的图片：先找最高质量，最低质量仍超出时再缩放"""
+    compressed_data, min_size = _search_quality(
+        img, max_size_bytes, quality_start, quality_min, image_format, stats
+    )
+
+    if compressed_data is None:
+        # 最低质量仍然太大：按最低质量下的实际体积预测尺寸并缩放
+        stats['quality'] = quality_min
+        compressed_data, new_size = _search_scale(
+            img, max_size_bytes, quality_min, min_size, image_format, stats
+        )
+        stats['size'] = new_size
+    else:
+        stats['size'] = img.size
+
+    return compressed_data
 
 
 def compress_image(
@@ -9,74 +336,48 @@ def compress_image(
     max_size_kb: int = 200,  # 默认200KB
     quality_start: int = 85,
     quality_min: int = 20,
-    max_dimension: int = 2048
+    max_dimension: int = 2048,
+    stats: Optional[dict] = None,
+    output_format: str = 'JPEG'
 ) -> bytes:
     """
     压缩图片到指定大小以内
 
+    只按目标大小需要的分辨率解码，再查找满足大小要求的最高编码质量；
+    最低质量仍超出时，按最低质量下的每像素字节数预测目标尺寸缩放，结果明显偏小时再放大。
+
     Args:
         image_data: 原始图片数据
         max_size_kb: 最大文件大小（KB）
         quality_start: 起始压缩质量（1-100）
         quality_min: 最低压缩质量（1-100）
         max_dimension: 最大边长（像素）
+        stats: 统计信息（可选，传入字典时写入 encodes、quality、decoded_size、size）
+        output_format: 输出格式 'JPEG' / 'WEBP' / 'AVIF'（不支持时使用 JPEG）
 
     Returns:
         压缩后的图片数据
     """
     max_size_bytes = max_size_kb * 1024
+    if stats is None:
+        stats = {}
+    stats['encodes'] = 0
+
+    if not is_format_supported(output_format):
+        output_format = 'JPEG'
 
     # 如果原图已经小于目标大小，直接返回
     if len(image_data) <= max_size_bytes:
         return image_data
 
     try:
-        # 打开图片
-        img = Image.open(io.BytesIO(image_data))
-
-        # 转换为 RGB（处理 RGBA 等格式）
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # 如果图片尺寸过大，先缩小
-        width, height = img.size
-        if width > max_dimension or height > max_dimension:
-            ratio = min(max_dimension / width, max_dimension / height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        # 逐步降低质量直到满足大小要求
-        quality = quality_start
-        compressed_data = None
-
-        while quality >= quality_min:
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=quality, optimize=True)
-            compressed_data = output.getvalue()
-
-            if len(compressed_data) <= max_size_bytes:
-                break
-
-            quality -= 5
-
-        # 如果还是太大，进一步缩小尺寸
-        if len(compressed_data) > max_size_bytes:
-            width, height = img.size
-            while len(compressed_data) > max_size_bytes and max(width, height) > 512:
-                width = int(width * 0.9)
-                height = int(height * 0.9)
-                img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
+        # 按需要的尺寸解码并转换为 RGB（处理 RGBA 等格式）
+        img = _load_image(image_data, max_dimension, max_size_bytes, output_format)
+        stats['decoded_size'] = img.size
 
-                output = io.BytesIO()
-                img_resized.save(output, format='JPEG', quality=quality_min, optimize=True)
-                compressed_data = output.getvalue()
+        compressed_data = _compress_decoded(
+            img, max_size_bytes, quality_start, quality_min, output_format, stats
+        )
 
         original_size_kb = len(image_data) / 1024
         compressed_size_kb = len(compressed_data) / 1024
@@ -91,9 +392,60 @@ def compress_image(
         return image_data
 
 
+def compress_image_formats(
+    image_data: bytes,
+    max_size_kb: int,
+    max_dimension: int,
+    variant_budgets: Dict[str, float],
+    quality_start: int = 85,
+    quality_min: int = 20
+) -> Dict[str, bytes]:
+    """
+    压缩为 JPEG，同时生成其他格式的副本（原图只解码一次）
+
+    Args:
+        image_data: 原始图片数据
+        max_size_kb: JPEG 的最大文件大小（KB）
+        max_dimension: 最大边长（像素）
+        variant_budgets: 其他格式 -> 目标大小相对 JPEG 结果的比例（不支持的格式跳过）
+        quality_start: 起始压缩质量（1-100）
+        quality_min: 最低压缩质量（1-100）
+
+    Returns:
+        格式 -> 压缩后的数据；原图已经小于目标大小时只有 'JPEG'（即原图本身），
+        某个格式压缩失败时不包含该格式
+    """
+    max_size_bytes = max_size_kb * 1024
+    if len(image_data) <= max_size_bytes:
+        return {'JPEG': image_data}
+
+    try:
+        # 各格式共用同一次解码（只按 max_dimension 限制尺寸）
+        img = _load_image(image_data, max_dimension, max_size_bytes, output_format=None)
+        jpeg_data = _compress_decoded(img, max_size_bytes, quality_start, quality_min, 'JPEG', {'encodes': 0})
+    except Exception as e:
+        print(f"[图片压缩] 压缩失败，返回原图: {e}")
+        return {'JPEG': image_data}
+
+    print(f"[图片压缩] {len(image_data) / 1024:.1f}KB → {len(jpeg_data) / 1024:.1f}KB")
+    results = {'JPEG': jpeg_data}
+    for image_format, budget in variant_budgets.items():
+        if not is_format_supported(image_format):
+            continue
+        try:
+            results[image_format] = _compress_decoded(
+                img, max(1024, int(len(jpeg_data) * budget)),
+                quality_start, quality_min, image_format, {'encodes': 0}
+            )
+        except Exception as e:
+            print(f"[图片压缩] 生成 {image_format} 失败: {e}")
+
+    return results
+
+
 def compress_images(images: list[bytes], max_size_kb: int = 200) -> list[bytes]:
     """
-    批量压缩图片
+    批量压缩图片（多张图片在进程池中并行压缩）
 
     Args:
         images: 图片数据列表
@@ -102,4 +454,5 @@ def compress_images(images: list[bytes], max_size_kb: int = 200) -> list[bytes]:
     Returns:
         压缩后的图片数据列表
     """
-    return [compress_image(img, max_size_kb) for img in images]
+    from .compression_pool import get_compression_pool
+    return get_compression_pool().compress_many(images, max_size_kb)
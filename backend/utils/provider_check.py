@@ -0,0 +1,161 @@
+"""
+服务商连接测试
+
+供设置页面的「测试连接」接口和图片服务商熔断器的半开探测共用
+"""
+
+
+def check_provider_connection(provider_type: str, config: dict) -> dict:
+    """
+    测试服务商连接
+
+    Args:
+        provider_type: 服务商类型
+        config: 服务商配置
+
+    Returns:
+        dict: 测试结果
+    """
+    test_prompt = "请回复'你好，红墨'"
+
+    if provider_type == 'google_genai':
+        return _test_google_genai(config)
+
+    elif provider_type == 'google_gemini':
+        return _test_google_gemini(config, test_prompt)
+
+    elif provider_type == 'openai_compatible':
+        return _test_openai_compatible(config, test_prompt)
+
+    elif provider_type == 'image_api':
+        return _test_image_api(config)
+
+    else:
+        raise ValueError(f"不支持的类型: {provider_type}")
+
+
+def _test_google_genai(config: dict) -> dict:
+    """测试 Google GenAI 图片生成服务"""
+    from google import genai
+
+    # 与图片生成器一致：使用 Gemini API（API Key 认证），有 base_url 时通过代理地址访问
+    client_kwargs = {
+        "api_key": config['api_key'],
+        "vertexai": False
+    }
+    if config.get('base_url'):
+        client_kwargs["http_options"] = {
+            'base_url': config['base_url'],
+            'api_version': 'v1beta'
+        }
+    client = genai.Client(**client_kwargs)
+
+    # 查询模型信息（不生成内容，不消耗额度）；未配置模型时列出模型
+    try:
+        if config.get('model'):
+            client.models.get(model=config['model'])
+        else:
+            next(iter(client.models.list()), None)
+        return {
+            "success": True,
+            "message": "连接成功！仅代表连接稳定，不确定是否可以稳定支持图片生成"
+        }
+    except Exception as e:
+        raise Exception(f"连接测试失败: {str(e)}")
+
+
+def _test_google_gemini(config: dict, test_prompt: str) -> dict:
+    """测试 Google Gemini 文本生成服务"""
+    from google import genai
+
+    if config.get('base_url'):
+        client = genai.Client(
+            api_key=config['api_key'],
+            http_options={
+                'base_url': config['base_url'],
+                'api_version': 'v1beta'
+            },
+            vertexai=False
+        )
+    else:
+        client = genai.Client(
+            api_key=config['api_key'],
+            vertexai=True
+        )
+
+    model = config.get('model') or 'gemini-2.0-flash-exp'
+    response = client.models.generate_content(
+        model=model,
+        contents=test_prompt
+    )
+    result_text = response.text if hasattr(response, 'text') else str(response)
+
+    return _check_response(result_text)
+
+
+def _test_openai_compatible(config: dict, test_prompt: str) -> dict:
+    """测试 OpenAI 兼容接口"""
+    import requests
+
+    base_url = config['base_url'].rstrip('/').rstrip('/v1') if config.get('base_url') else 'https://api.openai.com'
+    url = f"{base_url}/v1/chat/completions"
+
+    payload = {
+        "model": config.get('model') or 'gpt-3.5-turbo',
+        "messages": [{"role": "user", "content": test_prompt}],
+        "max_tokens": 50
+    }
+
+    response = requests.post(
+        url,
+        headers={
+            'Authorization': f"Bearer {config['api_key']}",
+            'Content-Type': 'application/json'
+        },
+        json=payload,
+        timeout=30
+    )
+
+    if response.status_code != 200:
+        raise Exception(f"HTTP {response.status_code}: {response.text[:200]}")
+
+    result = response.json()
+    result_text = result['choices'][0]['message']['content']
+
+    return _check_response(result_text)
+
+
+def _test_image_api(config: dict) -> dict:
+    """测试图片 API 连接"""
+    import requests
+
+    base_url = config['base_url'].rstrip('/').rstrip('/v1') if config.get('base_url') else 'https://api.openai.com'
+    url = f"{base_url}/v1/models"
+
+    response = requests.get(
+        url,
+        headers={'Authorization': f"Bearer {config['api_key']}"},
+        timeout=30
+    )
+
+    if response.status_code == 200:
+        return {
+            "success": True,
+            "message": "连接成功！仅代表连接稳定，不确定是否可以稳定支持图片生成"
+        }
+    else:
+        raise Exception(f"HTTP {response.status_code}: {response.text[:200]}")
+
+
+def _check_response(result_text: str) -> dict:
+    """检查响应是否符合预期"""
+    if "你好" in result_text and "红墨" in result_text:
+        return {
+            "success": True,
+            "message": f"连接成功！响应: {result_text[:100]}"
+        }
+    else:
+        return {
+            "success": True,
+            "message": f"连接成功，但响应内容不符合预期: {result_text[:100]}"
+        }
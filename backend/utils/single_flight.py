@@ -0,0 +1,133 @@
+"""
+重复请求合并（single-flight）
+
+双击、前端重连等场景会同时发出多个完全相同的生成请求，
+每个请求都会调用一次付费的生成服务并写入重复的图片记录。
+相同键的并发请求只执行一次，其余请求等待并共享同一结果；
+执行完成后的短时间内到达的重复请求直接返回该结果。
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 完成后结果的保留时间（秒），覆盖双击和前端重连的时间窗口
+DEFAULT_RESULT_TTL = 10.0
+
+
+def _json_default(value: Any) -> str:
+    """bytes（如参考图片）取 sha256 摘要参与计算"""
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    return str(value)
+
+
+def build_flight_key(record_id: Optional[str], page_id: Any, payload: Dict[str, Any]) -> Tuple[str, str, str]:
+    """
+    构建请求键
+
+    Args:
+        record_id: 记录ID
+        page_id: 页面ID（无页面时为 None）
+        payload: 影响生成结果的其余请求参数（提示词相关内容、参考图等）
+
+    Returns:
+        (record_id, page_id, 请求内容哈希)
+    """
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=_json_default)
+    digest = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    return (str(record_id or ''), str(page_id if page_id is not None else ''), digest)
+
+
+class SingleFlight:
+    """相同键的请求只执行一次"""
+
+    def __init__(self, result_ttl: float = DEFAULT_RESULT_TTL):
+        """
+        初始化
+
+        Args:
+            result_ttl: 执行完成后结果保留的秒数
+        """
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._finished: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [key for key, (expires_at, _) in self._finished.items() if expires_at <= now]
+        for key in expired:
+            del self._finished[key]
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        keep_if: Optional[Callable[[Any], bool]] = None
+    ) -> Tuple[Any, bool]:
+        """
+        执行函数，相同键的并发调用共享结果
+
+        Args:
+            key: 请求键
+            fn: 实际执行的函数
+            keep_if: 判断结果是否保留给之后的重复请求（默认全部保留；抛出异常时从不保留）
+
+        Returns:
+            (结果, 是否为共享的结果)
+        """
+        with self._lock:
+            now = time.time()
+            self._purge_expired(now)
+
+            if key in self._finished:
+                return self._finished[key][1], True
+
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_leader:
+            logger.info(f"合并重复请求，等待进行中的请求完成: key={key}")
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            if keep_if is None or keep_if(result):
+                self._finished[key] = (time.time() + self.result_ttl, result)
+        future.set_result(result)
+        return result, False
+
+    def inflight_count(self) -> int:
+        """进行中的请求数"""
+        with self._lock:
+            return len(self._inflight)
+
+
+_single_flight_instance: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """获取全局 SingleFlight 实例"""
+    global _single_flight_instance
+    if _single_flight_instance is None:
+        with _single_flight_lock:
+            if _single_flight_instance is None:
+                _single_flight_instance = SingleFlight()
+    return _single_flight_instance
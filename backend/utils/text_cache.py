@@ -0,0 +1,223 @@
+"""
+文本生成结果缓存
+
+按请求内容（提示词、模型参数、图片摘要）计算哈希作为缓存键，
+相同请求直接返回 SQLite 中缓存的结果，避免重复调用文本生成 API。
+默认关闭，在 text_providers.yaml 中通过 cache.enabled 开启。
+"""
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存配置
+DEFAULT_CACHE_CONFIG = {
+    'enabled': False,
+    'ttl_seconds': 86400,
+    'max_entries': 500,
+}
+
+# 进程内命中率统计
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'bypassed': 0}
+
+
+def _record_stat(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_text_cache_stats() -> Dict[str, Any]:
+    """
+    获取缓存统计信息
+
+    Returns:
+        命中/未命中/跳过次数、命中率，以及数据库中的条目统计
+    """
+    from backend.models import TextCacheModel
+
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    stats.update(TextCacheModel.stats())
+    return stats
+
+
+def clear_text_cache() -> None:
+    """清空缓存条目并重置统计"""
+    from backend.models import TextCacheModel
+
+    TextCacheModel.clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+    logger.info("文本生成缓存已清空")
+
+
+def _digest_image(image: Union[bytes, str]) -> str:
+    """图片取 sha256 摘要，URL 等字符串原样参与计算"""
+    if isinstance(image, bytes):
+        return hashlib.sha256(image).hexdigest()
+    return str(image)
+
+
+class CachedTextClient:
+    """
+    带缓存的文本生成客户端（包装 TextChatClient 或 GenAIClient）
+
+    generate_text / generate_text_stream 的参数与被包装的客户端相同，
+    额外支持 bypass_cache=True 跳过缓存读取（结果仍会写入缓存）。
+    """
+
+    def __init__(self, client, provider_config: Dict[str, Any], cache_config: Dict[str, Any]):
+        """
+        初始化
+
+        Args:
+            client: 被包装的文本客户端
+            provider_config: 服务商配置（type、base_url 参与缓存键计算）
+            cache_config: 缓存配置（ttl_seconds、max_entries）
+        """
+        self.client = client
+        self.provider_type = provider_config.get('type', 'openai_compatible')
+        self.base_url = provider_config.get('base_url') or ''
+        self.ttl_seconds = float(cache_config.get('ttl_seconds', DEFAULT_CACHE_CONFIG['ttl_seconds']))
+        self.max_entries = int(cache_config.get('max_entries', DEFAULT_CACHE_CONFIG['max_entries']))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _make_key(
+        self,
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_output_tokens: int,
+        images: Optional[List[Union[bytes, str]]],
+        system_prompt: Optional[str],
+        extra: Dict[str, Any]
+    ) -> str:
+        """根据请求内容计算缓存键"""
+        material = {
+            'provider': self.provider_type,
+            'base_url': self.base_url,
+            'model': model,
+            'temperature': temperature,
+            'max_output_tokens': max_output_tokens,
+            'system_prompt': system_prompt,
+            'prompt': prompt,
+            'images': [_digest_image(img) for img in images] if images else [],
+            'extra': extra,
+        }
+        raw = json.dumps(material, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key: str, bypass_cache: bool) -> Optional[str]:
+        from backend.models import TextCacheModel
+
+        if bypass_cache:
+            _record_stat('bypassed')
+            return None
+
+        try:
+            cached = TextCacheModel.get(key, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"读取文本缓存失败，直接调用 API: {e}")
+            cached = None
+
+        _record_stat('hits' if cached is not None else 'misses')
+        return cached
+
+    def _store(self, key: str, model: str, text: str) -> None:
+        from backend.models import TextCacheModel
+
+        if not text:
+            return
+        try:
+            TextCacheModel.put(key, model, text, self.ttl_seconds, self.max_entries)
+        except Exception as e:
+            logger.warning(f"写入文本缓存失败: {e}")
+
+    def generate_text(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        bypass_cache: bool = False,
+        **kwargs
+    ) -> str:
+        """
+        生成文本（优先读取缓存）
+
+        Args:
+            bypass_cache: 是否跳过缓存读取
+            其余参数与被包装客户端的 generate_text 相同
+
+        Returns:
+            生成的文本
+        """
+        key = self._make_key(prompt, model, temperature, max_output_tokens, images, system_prompt, kwargs)
+        cached = self._lookup(key, bypass_cache)
+        if cached is not None:
+            logger.info(f"文本缓存命中: model={model}, key={key[:12]}")
+            return cached
+
+        text = self.client.generate_text(
+            prompt=prompt,
+            model=model,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            images=images,
+            system_prompt=system_prompt,
+            **kwargs
+        )
+        self._store(key, model, text)
+        return text
+
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        bypass_cache: bool = False,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本（命中缓存时一次性返回完整文本，未命中时完整结束后写入缓存）
+
+        Yields:
+            逐段生成的文本
+        """
+        key = self._make_key(prompt, model, temperature, max_output_tokens, images, system_prompt, kwargs)
+        cached = self._lookup(key, bypass_cache)
+        if cached is not None:
+            logger.info(f"文本缓存命中（流式）: model={model}, key={key[:12]}")
+            yield cached
+            return
+
+        chunks = []
+        for delta in self.client.generate_text_stream(
+            prompt=prompt,
+            model=model,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            images=images,
+            system_prompt=system_prompt,
+            **kwargs
+        ):
+            chunks.append(delta)
+            yield delta
+
+        # 只缓存完整结束的流，中途断开不写入
+        self._store(key, model, ''.join(chunks))
@@ -1,10 +1,11 @@
 """Text API 客户端封装"""
 import time
 import random
+import json
 import base64
 import requests
 from functools import wraps
-from typing import List, Optional, Union
+from typing import Iterator, List, Optional, Union
 from .image_compressor import compress_image
 
 
@@ -99,6 +100,39 @@ class TextChatClient:
 
         return content
 
+    def _build_payload(
+        self,
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_output_tokens: int,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None
+    ) -> dict:
+        """构建 chat/completions 请求体（不含 stream 字段）"""
+        messages = []
+
+        # 添加系统提示词
+        if system_prompt:
+            messages.append({
+                "role": "system",
+                "content": system_prompt
+            })
+
+        # 构建用户消息内容
+        content = self._build_content_with_images(prompt, images)
+        messages.append({
+            "role": "user",
+            "content": content
+        })
+
+        return {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_output_tokens,
+        }
+
     @retry_on_429(max_retries=3, base_delay=2)
     def generate_text(
         self,
@@ -124,29 +158,8 @@ class TextChatClient:
         Returns:
             生成的文本
         """
-        messages = []
-
-        # 添加系统提示词
-        if system_prompt:
-            messages.append({
-                "role": "system",
-                "content": system_prompt
-            })
-
-        # 构建用户消息内容
-        content = self._build_content_with_images(prompt, images)
-        messages.append({
-            "role": "user",
-            "content": content
-        })
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_output_tokens,
-            "stream": False
-        }
+        payload = self._build_payload(prompt, model, temperature, max_output_tokens, images, system_prompt)
+        payload["stream"] = False
 
         headers = {
             "Content-Type": "application/json",
@@ -161,6 +174,32 @@ class TextChatClient:
             timeout=300  # 5分钟超时
         )
 
+        self._check_response_status(response, model)
+
+        result = response.json()
+
+        # 提取生成的文本
+        if "choices" in result and len(result["choices"]) > 0:
+            return result["choices"][0]["message"]["content"]
+        else:
+            raise Exception(
+                f"Text API 响应格式异常：未找到生成的文本。\n"
+                f"响应数据: {str(result)[:500]}\n"
+                "可能原因：\n"
+                "1. API返回格式与OpenAI标准不一致\n"
+                "2. 请求被拒绝或过滤\n"
+                "3. 模型输出为空\n"
+                "建议：检查API文档确认响应格式"
+            )
+
+    def _check_response_status(self, response: requests.Response, model: str):
+        """
+        检查响应状态码，非 200 时抛出带解决方案的异常
+
+        Args:
+            response: 响应对象
+            model: 模型名称（用于错误信息）
+        """
         if response.status_code != 200:
             error_detail = response.text[:500]
             status_code = response.status_code
@@ -232,24 +271,69 @@ class TextChatClient:
                     "3. 检查模型名称是否正确"
                 )
 
-        result = response.json()
+    @retry_on_429(max_retries=3, base_delay=2)
+    def _open_stream(self, payload: dict) -> requests.Response:
+        """发起流式请求（只在建立连接阶段重试，开始输出后不再重试）"""
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {self.api_key}"
+        }
 
-        # 提取生成的文本
-        if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"]["content"]
-        else:
-            raise Exception(
-                f"Text API 响应格式异常：未找到生成的文本。\n"
-                f"响应数据: {str(result)[:500]}\n"
-                "可能原因：\n"
-                "1. API返回格式与OpenAI标准不一致\n"
-                "2. 请求被拒绝或过滤\n"
-                "3. 模型输出为空\n"
-                "建议：检查API文档确认响应格式"
-            )
+        response = requests.post(
+            self.chat_endpoint,
+            json=payload,
+            headers=headers,
+            timeout=300,  # 5分钟超时（两次数据之间的最长等待）
+            stream=True
+        )
+        self._check_response_status(response, payload.get("model"))
+        return response
 
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本（参数与 generate_text 相同）
 
-def get_text_chat_client(provider_config: dict):
+        Yields:
+            逐段生成的文本
+        """
+        payload = self._build_payload(prompt, model, temperature, max_output_tokens, images, system_prompt)
+        payload["stream"] = True
+
+        response = self._open_stream(payload)
+        # text/event-stream 未声明 charset 时 requests 会按 ISO-8859-1 解码
+        response.encoding = 'utf-8'
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+        finally:
+            response.close()
+
+
+def get_text_chat_client(provider_config: dict, cache_config: dict = None):
     """
     获取 Text Chat 客户端实例（根据 type 返回对应客户端）
 
@@ -259,9 +343,10 @@ def get_text_chat_client(provider_config: dict):
             - api_key: API密钥
             - base_url: API基础URL（可选）
             - endpoint_type: 自定义端点路径（可选）
+        cache_config: 结果缓存配置（可选，enabled 为 True 时返回带缓存的客户端）
 
     Returns:
-        GenAIClient 或 TextChatClient
+        GenAIClient 或 TextChatClient（开启缓存时为 CachedTextClient）
     """
     provider_type = provider_config.get('type', 'openai_compatible')
     api_key = provider_config.get('api_key')
@@ -270,6 +355,12 @@ def get_text_chat_client(provider_config: dict):
 
     if provider_type == 'google_gemini':
         from .genai_client import GenAIClient
-        return GenAIClient(api_key=api_key, base_url=base_url)
+        client = GenAIClient(api_key=api_key, base_url=base_url)
     else:
-        return TextChatClient(api_key=api_key, base_url=base_url, endpoint_type=endpoint_type)
+        client = TextChatClient(api_key=api_key, base_url=base_url, endpoint_type=endpoint_type)
+
+    if cache_config and cache_config.get('enabled'):
+        from .text_cache import CachedTextClient
+        return CachedTextClient(client, provider_config, cache_config)
+
+    return client
@@ -0,0 +1,142 @@
+"""
+缩略图内存缓存
+
+历史记录页一次请求 20 多张缩略图，每张都要检查文件是否存在再从磁盘读取。
+最近返回过的缩略图连同 ETag 按总字节数上限做 LRU 缓存，
+命中时直接从内存返回，不访问文件系统。
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Hashable, Optional
+from zlib import adler32
+
+from .image_compressor import guess_image_mimetype
+
+
+class ThumbnailCache:
+    """按总字节数限制大小的 LRU 缓存（线程安全）"""
+
+    def __init__(self, max_bytes: int):
+        """
+        初始化
+
+        Args:
+            max_bytes: 缓存的图片数据总字节数上限（0 表示不缓存）
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键（第一个元素为 record_id）
+
+        Returns:
+            缓存条目（data、mimetype、etag、last_modified），未命中时为 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def load(self, key: Hashable, path: str) -> Dict:
+        """
+        从磁盘读取文件并放入缓存
+
+        ETag 与 send_file 生成的一致，内存和磁盘返回的响应可以互相验证
+
+        Args:
+            key: 缓存键
+            path: 文件路径
+
+        Returns:
+            缓存条目
+        """
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+
+        entry = {
+            'data': data,
+            'mimetype': guess_image_mimetype(data[:12]),
+            'etag': f"{stat.st_mtime}-{stat.st_size}-{adler32(path.encode()) & 0xFFFFFFFF}",
+            'last_modified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+        self.put(key, entry)
+        return entry
+
+    def put(self, key: Hashable, entry: Dict) -> None:
+        """
+        写入缓存，超出字节上限时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            entry: 缓存条目
+        """
+        size = len(entry['data'])
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old['data'])
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted['data'])
+
+    def invalidate_record(self, record_id: str) -> int:
+        """
+        删除某条记录的所有缓存
+
+        Args:
+            record_id: 记录 ID
+
+        Returns:
+            删除的条目数
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == record_id]
+            for key in keys:
+                self._size -= len(self._entries.pop(key)['data'])
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+
+
+_cache_instance: Optional[ThumbnailCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """获取全局缩略图缓存（大小由 Config.THUMBNAIL_CACHE_MB 决定）"""
+    global _cache_instance
+    if _cache_instance is None:
+        with _cache_lock:
+            if _cache_instance is None:
+                from backend.config import Config
+                _cache_instance = ThumbnailCache(int(Config.THUMBNAIL_CACHE_MB * 1024 * 1024))
+    return _cache_instance
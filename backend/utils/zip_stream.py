@@ -0,0 +1,224 @@
+"""
+流式 ZIP 打包
+
+打包下载的都是已经压缩过的 PNG / JPEG，再用 DEFLATE 压缩几乎不会变小，
+而先在内存中生成整个 ZIP 再发送，内存占用和首字节时间都随图片数量增长。
+这里以 STORED（不压缩）方式边读文件边输出 ZIP 数据：
+- 每个文件先计算 CRC，再输出带完整大小和 CRC 的本地文件头和文件内容，不需要数据描述符，
+  Java ZipInputStream 等流式解压工具也能读取
+- 内存占用只有一个读取块，与图片数量和大小无关
+- 文件大小在打包前已知，可以提前算出 ZIP 总大小（Content-Length）
+- 超过 4GB 或 65535 个文件时自动使用 ZIP64 扩展（只有超出上限的字段使用）
+"""
+import os
+import struct
+import time
+import zipfile
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 每次读取的块大小
+CHUNK_SIZE = 256 * 1024
+
+# 文件名使用 UTF-8 编码（通用标志位 bit 11）
+_FLAG_UTF8 = 0x0800
+_VERSION = 20
+_ZIP64_VERSION = 45
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_ZIP64_EXTRA_HEADER = struct.Struct('<2H')
+_ZIP64_END_RECORD = struct.Struct('<4sQ2H2L4Q')
+_ZIP64_END_LOCATOR = struct.Struct('<4sLQL')
+_ZIP64_EXTRA_ID = 0x0001
+
+# 不使用 ZIP64 时的上限（达到上限的字段写入该值，实际值放在 ZIP64 扩展中）
+_MAX_SIZE = 0xFFFFFFFF
+_MAX_ENTRIES = 0xFFFF
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    """转换为 ZIP 使用的 DOS 日期和时间"""
+    t = time.localtime(timestamp)
+    year = max(t.tm_year, 1980)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _zip64_extra(values: List[int]) -> bytes:
+    """ZIP64 扩展字段（values 按 原始大小、压缩后大小、本地文件头偏移量 的顺序，只包含超出上限的字段）"""
+    if not values:
+        return b''
+    return _ZIP64_EXTRA_HEADER.pack(_ZIP64_EXTRA_ID, 8 * len(values)) + struct.pack(f'<{len(values)}Q', *values)
+
+
+def _local_zip64_values(size: int) -> List[int]:
+    """本地文件头需要放入 ZIP64 扩展的字段"""
+    return [size, size] if size >= _MAX_SIZE else []
+
+
+def _central_zip64_values(size: int, offset: int) -> List[int]:
+    """中央目录需要放入 ZIP64 扩展的字段"""
+    values = _local_zip64_values(size)
+    if offset >= _MAX_SIZE:
+        values.append(offset)
+    return values
+
+
+def _needs_zip64_end(entry_count: int, directory_size: int, directory_offset: int) -> bool:
+    """是否需要 ZIP64 结束记录"""
+    return entry_count >= _MAX_ENTRIES or directory_size >= _MAX_SIZE or directory_offset >= _MAX_SIZE
+
+
+class ZipStreamWriter:
+    """
+    逐个文件输出 ZIP 数据（STORED，不压缩）
+
+    已写入的文件信息（entries）和当前偏移量（offset）可以保存下来，
+    之后从同一位置继续写入（打包任务中断后恢复）。
+    """
+
+    def __init__(self, entries: Optional[List[Dict]] = None, offset: int = 0):
+        """
+        初始化
+
+        Args:
+            entries: 已写入的文件信息（恢复时传入之前保存的 entries）
+            offset: 已写入的字节数
+        """
+        self.entries = list(entries or [])
+        self.offset = offset
+
+    def _local_header(self, archive_name: str, crc: int, size: int, mtime: float) -> bytes:
+        name = archive_name.encode('utf-8')
+        dos_time, dos_date = _dos_datetime(mtime)
+        extra = _zip64_extra(_local_zip64_values(size))
+        header = _LOCAL_HEADER.pack(
+            b'PK\x03\x04', _ZIP64_VERSION if extra else _VERSION, _FLAG_UTF8, zipfile.ZIP_STORED,
+            dos_time, dos_date, crc, min(size, _MAX_SIZE), min(size, _MAX_SIZE), len(name), len(extra)
+        ) + name + extra
+        self.entries.append({
+            'name': archive_name,
+            'crc': crc,
+            'size': size,
+            'offset': self.offset,
+            'time': dos_time,
+            'date': dos_date,
+        })
+        self.offset += len(header) + size
+        return header
+
+    def add_file(self, path: str, archive_name: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        添加文件（先读一遍计算 CRC，再逐块输出）
+
+        Args:
+            path: 文件路径
+            archive_name: 压缩包内文件名
+            chunk_size: 每次读取的字节数
+
+        Yields:
+            ZIP 数据块
+        """
+        stat = os.stat(path)
+        crc = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                crc = zlib.crc32(chunk, crc)
+
+        yield self._local_header(archive_name, crc, stat.st_size, stat.st_mtime)
+
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+    def add_bytes(self, data: bytes, archive_name: str) -> bytes:
+        """
+        添加内存中的数据（如清单文件）
+
+        Args:
+            data: 文件内容
+            archive_name: 压缩包内文件名
+
+        Returns:
+            ZIP 数据
+        """
+        return self._local_header(archive_name, zlib.crc32(data), len(data), time.time()) + data
+
+    def finish(self) -> bytes:
+        """
+        输出中央目录和结束记录（超出上限时先输出 ZIP64 结束记录和定位符）
+
+        Returns:
+            ZIP 数据
+        """
+        headers = []
+        for entry in self.entries:
+            name = entry['name'].encode('utf-8')
+            extra = _zip64_extra(_central_zip64_values(entry['size'], entry['offset']))
+            version = _ZIP64_VERSION if extra else _VERSION
+            headers.append(_CENTRAL_HEADER.pack(
+                b'PK\x01\x02', (3 << 8) | version, version, _FLAG_UTF8, zipfile.ZIP_STORED,
+                entry['time'], entry['date'], entry['crc'],
+                min(entry['size'], _MAX_SIZE), min(entry['size'], _MAX_SIZE),
+                len(name), len(extra), 0, 0, 0, 0o100644 << 16, min(entry['offset'], _MAX_SIZE)
+            ) + name + extra)
+        directory = b''.join(headers)
+
+        count = len(self.entries)
+        zip64_end = b''
+        if _needs_zip64_end(count, len(directory), self.offset):
+            end_offset = self.offset + len(directory)
+            zip64_end = _ZIP64_END_RECORD.pack(
+                b'PK\x06\x06', _ZIP64_END_RECORD.size - 12, (3 << 8) | _ZIP64_VERSION, _ZIP64_VERSION,
+                0, 0, count, count, len(directory), self.offset
+            ) + _ZIP64_END_LOCATOR.pack(b'PK\x06\x07', 0, end_offset, 1)
+
+        return directory + zip64_end + _END_RECORD.pack(
+            b'PK\x05\x06', 0, 0, min(count, _MAX_ENTRIES), min(count, _MAX_ENTRIES),
+            min(len(directory), _MAX_SIZE), min(self.offset, _MAX_SIZE), 0
+        )
+
+
+def zip_size(entries: List[Tuple[str, str]]) -> int:
+    """
+    计算 iter_zip 输出的 ZIP 总字节数
+
+    Args:
+        entries: (文件路径, 压缩包内文件名) 列表
+
+    Returns:
+        字节数
+    """
+    offset = 0
+    directory_size = 0
+    for path, archive_name in entries:
+        name_length = len(archive_name.encode('utf-8'))
+        size = os.path.getsize(path)
+        local_extra = len(_zip64_extra(_local_zip64_values(size)))
+        central_extra = len(_zip64_extra(_central_zip64_values(size, offset)))
+        directory_size += _CENTRAL_HEADER.size + name_length + central_extra
+        offset += _LOCAL_HEADER.size + name_length + local_extra + size
+
+    total = offset + directory_size + _END_RECORD.size
+    if _needs_zip64_end(len(entries), directory_size, offset):
+        total += _ZIP64_END_RECORD.size + _ZIP64_END_LOCATOR.size
+    return total
+
+
+def iter_zip(entries: List[Tuple[str, str]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    逐块生成 ZIP 数据（STORED，不压缩）
+
+    Args:
+        entries: (文件路径, 压缩包内文件名) 列表
+        chunk_size: 每次读取的字节数
+
+    Yields:
+        ZIP 数据块
+    """
+    writer = ZipStreamWriter()
+    for path, archive_name in entries:
+        yield from writer.add_file(path, archive_name, chunk_size)
+    yield writer.finish()
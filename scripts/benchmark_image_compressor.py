@@ -0,0 +1,198 @@
+"""
+图片压缩基准测试
+
+对比旧版（全分辨率解码、质量每次降 5、尺寸每次缩 10%）和当前 compress_image 的
+编码次数、工作图像素数（解码并缩小后参与编码的图片）、耗时，以及输出体积、选中的质量和 PSNR
+（与按 max_dimension 缩小的原图比较，输出尺寸更小时放大回同样尺寸再比较）。
+JPEG 另外给出查找和输出都不使用 optimize 时的结果（nooptim），用于对比霍夫曼表优化的影响。
+
+用法：
+    python scripts/benchmark_image_compressor.py [图片目录] [--sizes 50,200] [--limit 50] [--max-dimension 1080] [--format WEBP]
+
+不指定目录时使用 history/ 下已生成的图片（跳过 thumb_ 缩略图）；
+没有可用图片时生成一组合成图片。
+"""
+import argparse
+import functools
+import io
+import math
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.utils import image_compressor  # noqa: E402
+from backend.utils.image_compressor import compress_image  # noqa: E402
+
+
+def legacy_compress_image(image_data: bytes, max_size_kb: int = 200, max_dimension: int = 2048,
+                          stats: dict = None) -> bytes:
+    """旧版压缩算法（用于对比），参数与旧版默认值相同"""
+    quality_start, quality_min = 85, 20
+    max_size_bytes = max_size_kb * 1024
+    stats['encodes'] = 0
+    if len(image_data) <= max_size_bytes:
+        return image_data
+
+    img = image_compressor._to_rgb(Image.open(io.BytesIO(image_data)))
+    stats['decoded_size'] = img.size
+    width, height = img.size
+    if width > max_dimension or height > max_dimension:
+        ratio = min(max_dimension / width, max_dimension / height)
+        img = img.resize((int(width * ratio), int(height * ratio)), Image.Resampling.LANCZOS)
+
+    quality = quality_start
+    compressed_data = None
+    while quality >= quality_min:
+        compressed_data = image_compressor._encode(img, quality, 'JPEG')
+        stats['encodes'] += 1
+        if len(compressed_data) <= max_size_bytes:
+            break
+        quality -= 5
+    stats['quality'] = max(quality, quality_min)
+
+    if len(compressed_data) > max_size_bytes:
+        width, height = img.size
+        while len(compressed_data) > max_size_bytes and max(width, height) > 512:
+            width = int(width * 0.9)
+            height = int(height * 0.9)
+            img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
+            compressed_data = image_compressor._encode(img_resized, quality_min, 'JPEG')
+            stats['encodes'] += 1
+
+    return compressed_data
+
+
+def without_optimize(func):
+    """JPEG 查找和输出都不使用 optimize 的版本（用于对比）"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        encode = image_compressor._encode
+        image_compressor._encode = functools.partial(encode, optimize=False)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            image_compressor._encode = encode
+    return wrapper
+
+
+def psnr(reference: Image.Image, data: bytes) -> float:
+    """输出图片相对参考图的 PSNR（dB）"""
+    img = image_compressor._to_rgb(Image.open(io.BytesIO(data)))
+    if img.size != reference.size:
+        img = img.resize(reference.size, Image.Resampling.BICUBIC)
+    histogram = ImageChops.difference(reference, img).histogram()
+    squared = sum((i % 256) ** 2 * count for i, count in enumerate(histogram))
+    mse = squared / (reference.size[0] * reference.size[1] * 3)
+    return 10 * math.log10(255 ** 2 / mse) if mse else 99.0
+
+
+def load_corpus(directory: str, limit: int) -> list:
+    """读取图片目录（递归），返回 (名称, 数据) 列表"""
+    corpus = []
+    for root, _, files in os.walk(directory):
+        if os.path.basename(root).startswith('.'):
+            continue
+        for filename in sorted(files):
+            if filename.startswith('thumb_') or not filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+                continue
+            with open(os.path.join(root, filename), 'rb') as f:
+                corpus.append((os.path.relpath(os.path.join(root, filename), directory), f.read()))
+            if len(corpus) >= limit:
+                return corpus
+    return corpus
+
+
+def synthetic_corpus(count: int) -> list:
+    """生成接近小红书配图的合成图片（渐变背景 + 色块 + 噪点）"""
+    corpus = []
+    for i in range(count):
+        width, height = (1080, 1440) if i % 2 == 0 else (1536, 2048)
+        img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+        draw = ImageDraw.Draw(img)
+        for j in range(12):
+            x, y = (j * 97 + i * 31) % width, (j * 151 + i * 17) % height
+            draw.rectangle([x, y, x + width // 5, y + height // 8], fill=((j * 40) % 255, (i * 60) % 255, 128))
+        noise = Image.effect_noise((width, height), 20 + i * 5).convert('RGB')
+        img = Image.blend(img, noise, 0.15 + 0.05 * (i % 4)).filter(ImageFilter.SMOOTH)
+        # 一半 PNG（生成结果）一半 JPEG（用户上传的参考图）
+        image_format = 'PNG' if i % 4 < 2 else 'JPEG'
+        output = io.BytesIO()
+        img.save(output, format=image_format, quality=95)
+        corpus.append((f"synthetic_{i}.{image_format.lower()}", output.getvalue()))
+    return corpus
+
+
+def run(name: str, func, corpus: list, max_size_kb: int, max_dimension: int) -> dict:
+    """对整个语料跑一遍，返回统计"""
+    encodes, decoded, durations, oversize = [], [], [], 0
+    sizes, qualities, psnrs = [], [], []
+    for _, data in corpus:
+        stats = {}
+        start = time.perf_counter()
+        result = func(data, max_size_kb=max_size_kb, max_dimension=max_dimension, stats=stats)
+        durations.append((time.perf_counter() - start) * 1000)
+        encodes.append(stats.get('encodes', 0))
+        width, height = stats.get('decoded_size', (0, 0))
+        decoded.append(width * height / 1e6)
+        if len(result) > max_size_kb * 1024:
+            oversize += 1
+        if result is not data:
+            reference = image_compressor._load_image(data, max_dimension, 1 << 62, output_format=None)
+            sizes.append(len(result) / 1024)
+            qualities.append(stats.get('quality', 0))
+            psnrs.append(psnr(reference, result))
+    return {
+        "name": name,
+        "encodes_mean": statistics.mean(encodes),
+        "encodes_max": max(encodes),
+        "decoded_mp": statistics.mean(decoded),
+        "ms_mean": statistics.mean(durations),
+        "ms_p95": sorted(durations)[int(len(durations) * 0.95) - 1 if len(durations) > 1 else 0],
+        "oversize": oversize,
+        "kb_mean": statistics.mean(sizes) if sizes else 0.0,
+        "quality_mean": statistics.mean(qualities) if qualities else 0.0,
+        "psnr_mean": statistics.mean(psnrs) if psnrs else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片压缩基准测试")
+    parser.add_argument('directory', nargs='?', default=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'history'
+    ))
+    parser.add_argument('--sizes', default='50,200', help='目标大小（KB），逗号分隔')
+    parser.add_argument('--limit', type=int, default=50, help='最多使用多少张图片')
+    parser.add_argument('--max-dimension', type=int, default=2048, help='最大边长（缩略图为 1080）')
+    parser.add_argument('--format', default='JPEG', help='当前算法的输出格式：JPEG / WEBP / AVIF')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.directory, args.limit) if os.path.isdir(args.directory) else []
+    if not corpus:
+        print(f"{args.directory} 中没有可用图片，使用合成图片")
+        corpus = synthetic_corpus(min(args.limit, 8))
+    print(f"语料: {len(corpus)} 张图片，平均 {statistics.mean(len(d) for _, d in corpus) / 1024:.0f}KB\n")
+
+    # 压缩函数内部的逐张日志对基准测试没有意义
+    image_compressor.print = lambda *a, **k: None
+
+    print(f"{'目标':>6} {'算法':<8} {'平均编码次数':>10} {'最多编码次数':>10} {'工作图百万像素':>9} "
+          f"{'平均耗时ms':>10} {'p95耗时ms':>10} {'超出目标':>8} {'平均KB':>8} {'平均质量':>6} {'PSNR':>7}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        current = functools.partial(compress_image, output_format=args.format.upper())
+        algorithms = [("legacy", legacy_compress_image), ("current", current)]
+        if args.format.upper() == 'JPEG':
+            algorithms.append(("nooptim", without_optimize(current)))
+        for name, func in algorithms:
+            r = run(name, func, corpus, size, args.max_dimension)
+            print(f"{size:>4}KB {r['name']:<8} {r['encodes_mean']:>14.1f} {r['encodes_max']:>14} "
+                  f"{r['decoded_mp']:>14.2f} {r['ms_mean']:>13.1f} {r['ms_p95']:>12.1f} {r['oversize']:>10} "
+                  f"{r['kb_mean']:>10.1f} {r['quality_mean']:>10.1f} {r['psnr_mean']:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()